@@ -15,19 +15,17 @@
 import os
 import redis
 import secrets
-from json import load
 from flask import Flask
 from flask_login import LoginManager
 from flask_session import Session
-from logging.config import dictConfig
 
 
 sess = Session()
 
 def create_app(test_config=None):
     # Logging 設定ファイル読み込み
-    with open("logging.json", "r", encoding="utf-8") as f:
-        dictConfig(load(f))
+    from .log_config import configure_logging
+    configure_logging("logging.json")
 
     app = Flask(__name__, instance_relative_config=True)
 
@@ -41,23 +39,70 @@ def create_app(test_config=None):
         # テスト用設定を上書き
         app.config.from_mapping(test_config)
 
+    # 信頼するプロキシの X-Forwarded-For から接続元 IP (request.remote_addr) を求める
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     # session data
     env_secret_key = os.environ.get('SECRET_KEY', default=None)
     app.secret_key = env_secret_key if env_secret_key else secrets.token_hex(16)
-    app.config['SESSION_TYPE'] = 'redis'
+    app.config.setdefault('SESSION_TYPE', 'redis')
     # app.config['SESSION_COOKIE_SECURE'] = True
     # app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['PERMANENT_SESSION_LIFETIME'] = 1800 # (s) = 30 min
     app.config['SESSION_USE_SIGNER'] = True
-    app.config['SESSION_REDIS'] = redis.from_url(os.environ.get('REDIS_URL'))
-    sess.init_app(app)
+    if app.config.get('SESSION_REDIS') is None and app.config['SESSION_REDIS_URL']:
+        app.config['SESSION_REDIS'] = create_session_redis(app.config)
+
+    if app.config['SESSION_BACKEND'] == 'cookie':
+        # 署名付き Cookie (Flask 標準)。Redis 無しで動かす場合 (ベンチマークなど) 用
+        pass
+    elif app.config['SESSION_BACKEND'] == 'redis':
+        from .redis_session import RedisSessionInterface
+        app.session_interface = RedisSessionInterface(
+            app.config['SESSION_REDIS'],
+            key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+            refresh_interval=app.config['SESSION_REFRESH_INTERVAL'],
+        )
+    else:
+        sess.init_app(app)
+
+    # Prometheus メトリクス (ルート毎の応答時間など)
+    from . import metrics
+    metrics_enabled = metrics.init_app(app)
+
+    # バックエンド応答キャッシュ
+    from .models import cache
+    cache.init_app(app)
+
+    # id_token の検証・更新 (JWKS キャッシュ)
+    from .models import token
+    token.init_app(app)
+
+    # バックエンド接続プールなどプロセス毎の資源
+    # gunicorn (preload_app) では fork 前にスレッドを作らないよう post_fork で呼び出す (gunicorn.conf.py)
+    if not app.config['DEFER_WORKER_INIT']:
+        init_worker(app)
+
+    # 応答の動的圧縮
+    from . import compress
+    compress.init_app(app)
+
+    # ビルド済み静的ファイル (static/dist) と asset_urls()
+    from . import assets
+    assets.init_app(app)
+
+    # view の流量制限 (Redis)
+    from .views import ratelimit
+    ratelimit.init_app(app)
 
     login_manager = LoginManager()
     login_manager.init_app(app)
 
     preset_login_type = ['basic', 'keycloak']
     login_type = 'basic' # default
-    env_login_type = os.environ.get('LOGIN_TYPE', 'basic')
+    env_login_type = app.config['LOGIN_TYPE']
 
     if env_login_type in preset_login_type:
         login_type = env_login_type
@@ -74,12 +119,19 @@ def create_app(test_config=None):
         # workaround
         return User()
 
-    from .views.event import event_app
+    if app.config['ASYNC_VIEWS']:
+        # async view + 共有イベントループ上のモデル層
+        from .views.event_async import event_app
+        from .views.speaker_async import speaker_app
+    else:
+        from .views.event import event_app
+        from .views.speaker import speaker_app
+
     from .views.seminar import seminar_app
     from .views.mst_seminar import mst_seminar_app
-    from .views.speaker import speaker_app
     from .views.participant import participant_app
     from .views.admin_login import admin_login_app
+    from .views.health import health_app
 
     app.register_blueprint(event_app, url_prefix="/event")
     app.register_blueprint(seminar_app, url_prefix="/seminar")
@@ -87,5 +139,53 @@ def create_app(test_config=None):
     app.register_blueprint(speaker_app, url_prefix="/speaker")
     app.register_blueprint(participant_app, url_prefix="/participant")
     app.register_blueprint(admin_login_app, url_prefix="/")
+    app.register_blueprint(health_app, url_prefix="/")
+
+    if metrics_enabled:
+        from .views.metrics import metrics_app
+        app.register_blueprint(metrics_app, url_prefix="/")
 
     return app
+
+def create_session_redis(config):
+    # 接続数の上限付きプール (上限到達時は SESSION_REDIS_POOL_TIMEOUT 秒まで空きを待つ)
+    pool = redis.BlockingConnectionPool.from_url(
+        config['SESSION_REDIS_URL'],
+        max_connections=config['SESSION_REDIS_MAX_CONNECTIONS'],
+        timeout=config['SESSION_REDIS_POOL_TIMEOUT'],
+    )
+
+    return redis.Redis(connection_pool=pool)
+
+def init_worker(app):
+    # プロセス毎に持つ資源 (バックエンド接続プール・スレッド・Redis 接続) を構築する
+    # gunicorn で preload_app = True の場合は create_app では呼ばず fork 後に各ワーカーで呼び出す (gunicorn.conf.py の post_fork)
+
+    # バックエンドサービスクライアント
+    from .models import client
+    client.init_app(app)
+
+    # バックエンド並列呼び出し用スレッドプール
+    from .models import fanout
+    fanout.init_app(app)
+
+    # async view 用イベントループ
+    if app.config['ASYNC_VIEWS']:
+        from .models import aio
+        aio.init_app(app)
+
+    # 親プロセスから引き継いだ Redis 接続は使わない
+    if app.config.get('SESSION_REDIS') is not None:
+        app.config['SESSION_REDIS'].connection_pool.reset()
+
+    # 応答キャッシュの L2 (Redis) と他のレプリカからの無効化通知の購読
+    from .models import cache
+    cache.init_shared(app)
+
+    # マスタデータ (GET /api/v1/master) の保持
+    from .models import master
+    master.init_app(app)
+
+    # 起動時の共通データ (JWKS・マスタ、basic ログインでは一覧も) の事前取得と /healthz のバックエンド疎通確認
+    from .models import health
+    health.init_app(app)
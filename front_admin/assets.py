@@ -0,0 +1,188 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 静的ファイルのビルド (ページ毎に結合・圧縮し、内容のハッシュを付けたファイル名で static/dist へ出力)
+#   $ python3 -m front_admin.assets
+# テンプレートからは asset_urls('event.js') で参照する (未ビルド時は元のファイルを個別に返す)
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from logging import getLogger
+
+try:
+    import rjsmin
+    import rcssmin
+except ImportError: # 未導入時は結合のみ
+    rjsmin = None
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError: # 未導入時は .br を作らない
+    brotli = None
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'assets'
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+
+# ページ毎の束ね方 (static/ からの相対パス)
+BUNDLES = {
+    'base.css': ['css/common.css'],
+    'base.js': ['js/jquery-3.5.1.min.js', 'js/common.js'],
+    'event.css': ['css/event.css', 'css/datepicker.css'],
+    'event.js': ['js/event.js', 'js/datepicker.js'],
+    'speaker.css': ['css/speaker.css', 'css/datepicker.css'],
+    'speaker.js': ['js/speaker.js', 'js/datepicker.js'],
+    'login.css': ['css/event.css'],
+}
+
+# 圧縮対象と最小サイズ
+COMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.json')
+COMPRESS_MIN_SIZE = 512
+
+# 事前圧縮済みファイルの拡張子
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# CSS 内の相対参照 url(...)
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+assets_app = Blueprint('assets', __name__)
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+
+    if rjsmin is None:
+        logger.warning("rjsmin/rcssmin not installed, assets are bundled without minification.")
+
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        if name.endswith('.css'):
+            text = '\n'.join(_read_css(static_dir, dist_dir, x, manifest) for x in sources)
+            text = rcssmin.cssmin(text) if rcssmin else text
+        else:
+            # 末尾にセミコロンの無いファイルを結合しても壊れないよう区切る
+            text = ';\n'.join(_read(static_dir, x) for x in sources)
+            text = rjsmin.jsmin(text) if rjsmin else text
+
+        manifest[name] = _write(dist_dir, name, text.encode('utf-8'))
+
+    with open(os.path.join(dist_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+def _read(static_dir, path):
+
+    with open(os.path.join(static_dir, path), encoding='utf-8') as f:
+        return f.read()
+
+def _read_css(static_dir, dist_dir, path, manifest):
+    # url() の参照先 (画像など) もハッシュ付きで dist へ出力し、参照を書き換える
+    base = os.path.dirname(path)
+
+    def replace(match):
+        url = match.group(2)
+        if re.match(r'^(data:|https?:|//|/)', url):
+            return match.group(0)
+
+        target = os.path.normpath(os.path.join(base, url))
+        if target not in manifest:
+            with open(os.path.join(static_dir, target), 'rb') as f:
+                manifest[target] = _write(dist_dir, os.path.basename(target), f.read())
+
+        return 'url("{}")'.format(manifest[target])
+
+    return _CSS_URL.sub(replace, _read(static_dir, path))
+
+def _write(dist_dir, name, data):
+
+    stem, ext = os.path.splitext(name)
+    hashed = '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+    path = os.path.join(dist_dir, hashed)
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    if ext in COMPRESS_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, 9))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+    logger.info("asset written: {} ({} bytes)".format(hashed, len(data)))
+
+    return hashed
+
+
+def init_app(app):
+
+    manifest = None
+    path = os.path.join(DIST_DIR, MANIFEST)
+    if app.config['ASSETS_USE_BUNDLES'] and os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+    elif app.config['ASSETS_USE_BUNDLES']:
+        logger.info("asset manifest not found, serving source files.")
+
+    app.extensions[EXTENSION_KEY] = manifest
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.register_blueprint(assets_app, url_prefix=app.static_url_path + '/dist')
+
+def asset_urls(name):
+    # ビルド済みならハッシュ付きの1ファイル、未ビルドなら元のファイル群の URL を返す
+    manifest = current_app.extensions[EXTENSION_KEY]
+    if manifest is not None and name in manifest:
+        return [url_for('assets.dist', filename=manifest[name])]
+
+    return [url_for('static', filename=x) for x in BUNDLES[name]]
+
+@assets_app.route('/<path:filename>')
+def dist(filename):
+    # 事前圧縮済みファイルがあればそれを返す (ファイル名は内容のハッシュ付きのため無期限にキャッシュ可)
+    # 圧縮形式は用意のあるものから q 値の高いものを選ぶ (同じ場合は br を優先)
+    mimetype = mimetypes.guess_type(filename)[0]
+    available = [x for x in ('br', 'gzip') if os.path.exists(os.path.join(DIST_DIR, filename + ENCODING_SUFFIXES[x]))]
+    encoding = request.accept_encodings.best_match(available)
+    if encoding:
+        filename += ENCODING_SUFFIXES[encoding]
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype, max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+
+    return response
+
+
+if __name__ == '__main__':
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    build()
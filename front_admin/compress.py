@@ -0,0 +1,123 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 応答の動的圧縮 (Accept-Encoding に応じて br / gzip)
+
+import zlib
+
+from flask import request
+from logging import getLogger
+
+try:
+    import brotli
+except ImportError: # 未導入時は gzip のみ
+    brotli = None
+
+logger = getLogger(__name__)
+
+
+class _BrotliCompressor:
+    # zlib の compressobj と同じ呼び出し方にそろえる
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=None):
+        if mode == zlib.Z_SYNC_FLUSH:
+            return self._compressor.flush()
+        return self._compressor.finish()
+
+
+def init_app(app):
+
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        return compress(app.config, response)
+
+def compress(config, response):
+
+    if not _should_compress(config, response):
+        return response
+
+    encoding = _negotiate()
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # 逐次送信の応答はチャンク毎に圧縮して送り出す (最小サイズは判定できないため対象外)
+        response.response = _compress_stream(response.response, response.iter_encoded(), _compressor(config, encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        compressor = _compressor(config, encoding)
+        response.set_data(compressor.compress(data) + compressor.flush())
+
+    response.content_encoding = encoding
+    # 圧縮後はバイト列が変わるため弱い ETag とする (If-None-Match の比較は弱い比較のため 304 は維持)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+def _should_compress(config, response):
+
+    if request.blueprint in config['COMPRESS_EXCLUDE_BLUEPRINTS']:
+        return False
+
+    if response.status_code < 200 or response.status_code in (204, 304) or request.method == 'HEAD':
+        return False
+
+    # ファイル送信 (事前圧縮済みの静的ファイルなど) と圧縮済みの応答は対象外
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+
+    return response.mimetype in config['COMPRESS_MIMETYPES']
+
+def _negotiate():
+    # q 値の高いものを選ぶ (同じ場合は br を優先、q=0 は拒否として扱う)
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    return request.accept_encodings.best_match(encodings)
+
+def _compressor(config, encoding):
+
+    if encoding == 'br':
+        return _BrotliCompressor(config['COMPRESS_BR_QUALITY'])
+
+    # wbits=31: gzip 形式
+    return zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+
+def _compress_stream(source, chunks, compressor):
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # 受信側がすぐに表示できるよう各チャンクの終わりで flush
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
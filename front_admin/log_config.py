@@ -0,0 +1,110 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import atexit
+import logging
+import os
+import queue
+import random
+
+from json import load
+from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    # max_level 以下 (既定: DEBUG) のレコードを rate の割合だけ通す
+
+    def __init__(self, rate=1.0, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    # 書式化 (例外のトレースバック含む) はリスナースレッド側で行う
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+
+def configure_logging(path):
+    global _listener
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = load(f)
+
+    # LOG_LEVEL=INFO などでルートのレベルを上書き
+    level = os.environ.get('LOG_LEVEL')
+    if level:
+        config.setdefault('root', {})['level'] = level.upper()
+
+    stop_listener()
+    dictConfig(config)
+
+    root = logging.getLogger()
+    sampling = SamplingFilter(float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0')))
+
+    if os.environ.get('LOG_QUEUE', 'true').lower() != 'true':
+        for handler in root.handlers:
+            handler.addFilter(sampling)
+        return
+
+    # リクエスト処理スレッドはキューへの追加のみ、出力はバックグラウンドのリスナーで行う
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(sampling)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def restart_listener():
+    global _listener
+
+    # fork 後の子プロセスではリスナースレッドが存在しないため、新しいキューで作り直す
+    if _listener is None:
+        return
+
+    log_queue = queue.Queue(-1)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DeferredQueueHandler):
+            handler.queue = log_queue
+
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_listener():
+    global _listener
+
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+    _listener = None
+
+atexit.register(stop_listener)
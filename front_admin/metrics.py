@@ -0,0 +1,186 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import time
+
+from flask import g, request
+from logging import getLogger
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    from prometheus_client import CONTENT_TYPE_LATEST
+except ImportError: # METRICS_ENABLED = True の場合のみ必要
+    Counter = None
+
+logger = getLogger(__name__)
+
+# /api/v1/event/12/timetable -> /api/v1/event/{id}/timetable
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+_enabled = False
+
+
+def init_app(app):
+    global _enabled
+
+    if not app.config['METRICS_ENABLED']:
+        return False
+
+    if Counter is None:
+        logger.warning("METRICS_ENABLED requires prometheus_client, metrics disabled.")
+        return False
+
+    _create_metrics()
+    _enabled = True
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+
+        # ストリーミング応答は送信完了時点までを計測
+        response.call_on_close(_request_observer(start, response.status_code))
+
+        return response
+
+    @app.teardown_request
+    def record_error(exc):
+        # 未処理例外で after_request が呼ばれなかった場合
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            _request_observer(start, 500)()
+
+    return True
+
+def _request_observer(start, status):
+
+    blueprint = request.blueprint or ''
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    method = request.method
+
+    def observe():
+        REQUEST_LATENCY.labels(blueprint, endpoint, method).observe(time.perf_counter() - start)
+        REQUEST_COUNT.labels(blueprint, endpoint, method, str(status)).inc()
+
+    return observe
+
+def render():
+    # 複数ワーカープロセス構成では PROMETHEUS_MULTIPROC_DIR 配下の値を集計して返す
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def observe_backend(service, method, api_path, status, seconds=None):
+
+    if not _enabled:
+        return
+
+    path = path_template(api_path)
+    if seconds is not None:
+        BACKEND_LATENCY.labels(service, method, path).observe(seconds)
+    BACKEND_COUNT.labels(service, method, path, str(status)).inc()
+
+def backend_coalesced(service):
+
+    if _enabled:
+        BACKEND_COALESCED.labels(service).inc()
+
+def cache_hit(service):
+
+    if _enabled:
+        CACHE_HITS.labels(service).inc()
+
+def cache_shared_hit(service):
+
+    if _enabled:
+        CACHE_SHARED_HITS.labels(service).inc()
+
+def cache_stale(service, reason):
+
+    if _enabled:
+        CACHE_STALE.labels(service, reason).inc()
+
+def cache_miss(service):
+
+    if _enabled:
+        CACHE_MISSES.labels(service).inc()
+
+def cache_size(size):
+
+    if _enabled:
+        CACHE_ENTRIES.set(size)
+
+def path_template(api_path):
+
+    return _ID_SEGMENT.sub('/{id}', api_path.split('?', 1)[0])
+
+def _create_metrics():
+    global REQUEST_LATENCY, REQUEST_COUNT, BACKEND_LATENCY, BACKEND_COUNT, BACKEND_COALESCED
+    global CACHE_HITS, CACHE_MISSES, CACHE_STALE, CACHE_SHARED_HITS, CACHE_ENTRIES
+
+    # create_app を複数回呼んでも二重登録しない
+    if 'REQUEST_LATENCY' in globals():
+        return
+
+    REQUEST_LATENCY = Histogram(
+        'front_admin_request_duration_seconds', 'Route latency.',
+        ['blueprint', 'endpoint', 'method'],
+    )
+    REQUEST_COUNT = Counter(
+        'front_admin_requests_total', 'Responses by status code.',
+        ['blueprint', 'endpoint', 'method', 'status'],
+    )
+    BACKEND_LATENCY = Histogram(
+        'front_admin_backend_request_duration_seconds', 'Backend call latency.',
+        ['service', 'method', 'path'],
+    )
+    BACKEND_COUNT = Counter(
+        'front_admin_backend_requests_total', 'Backend calls by status code or error.',
+        ['service', 'method', 'path', 'status'],
+    )
+    BACKEND_COALESCED = Counter(
+        'front_admin_backend_coalesced_total', 'Backend GETs served by an identical in-flight call.',
+        ['service'],
+    )
+    CACHE_HITS = Gauge(
+        'front_admin_cache_hits', 'Response cache hits.',
+        ['service'], multiprocess_mode='sum',
+    )
+    CACHE_MISSES = Gauge(
+        'front_admin_cache_misses', 'Response cache misses.',
+        ['service'], multiprocess_mode='sum',
+    )
+    CACHE_STALE = Counter(
+        'front_admin_cache_stale_served_total', 'Stale cache entries served (revalidate / error).',
+        ['service', 'reason'],
+    )
+    CACHE_SHARED_HITS = Counter(
+        'front_admin_cache_shared_hits_total', 'Cache hits served from the shared (Redis) tier.',
+        ['service'],
+    )
+    CACHE_ENTRIES = Gauge(
+        'front_admin_cache_entries', 'Response cache entries.',
+        multiprocess_mode='livesum',
+    )
@@ -0,0 +1,259 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import asyncio
+import atexit
+import contextvars
+import random
+import threading
+import time
+
+from flask import current_app
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from logging import getLogger
+
+from .. import metrics
+from . import cache
+from . import client
+from .client import RETRY_METHODS, RETRY_STATUSES, CircuitOpenError, _create_base_url, _service_config, flight_key
+
+try:
+    import httpx
+except ImportError: # ASYNC_VIEWS = True の場合のみ必要
+    httpx = None
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'aio_runner'
+SERVICES = ('event', 'speaker')
+
+_current_runner = contextvars.ContextVar('aio_runner')
+
+
+class AsyncSingleFlight:
+    # client.SingleFlight のイベントループ版 (ループのスレッドからのみ使うためロック不要)
+
+    def __init__(self, name):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, coro_fn):
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            metrics.backend_coalesced(self.name)
+            # 待っている側のキャンセルで共有中の呼び出しを止めない
+            return await asyncio.shield(future)
+
+        self.leaders += 1
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # 待ち手がいない場合の "exception was never retrieved" を抑止
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def snapshot(self):
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+        }
+
+
+class AsyncServiceClient:
+
+    def __init__(self, name, base_url, max_connections=10, max_keepalive_connections=10, headers=None,
+                 timeout=None, retries=0, backoff=0.1, backoff_max=1.0, breaker=None, singleflight=False):
+        self.name = name
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        # 同期クライアントとサービス単位で共有
+        self.breaker = breaker
+        self.singleflight = AsyncSingleFlight(name) if singleflight else None
+
+        self.client = httpx.AsyncClient(
+            headers=headers or {},
+            timeout=timeout,
+            # 利用者間でCookieを共有しないよう保持しない
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    def url(self, api_path):
+        if self.base_url is None:
+            raise RuntimeError("service not configured: {}".format(self.name))
+
+        return self.base_url + api_path
+
+    async def request(self, method, api_path, **kwargs):
+        url = self.url(api_path)
+        attempts = self.retries + 1 if method in RETRY_METHODS else 1
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                metrics.observe_backend(self.name, method, api_path, 'circuit_open')
+                raise CircuitOpenError("circuit open: {}".format(self.name))
+
+            last = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                metrics.observe_backend(self.name, method, api_path, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure()
+                if last:
+                    raise
+                await self._sleep(attempt)
+                continue
+            except Exception as e:
+                # DecodingError など再試行しない失敗も記録し、half_open の試行枠を必ず戻す
+                metrics.observe_backend(self.name, method, api_path, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # キャンセルはバックエンドの失敗として数えない
+                self.breaker.release()
+                raise
+
+            metrics.observe_backend(self.name, method, api_path, response.status_code, time.perf_counter() - start)
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and not last:
+                    await self._sleep(attempt)
+                    continue
+            else:
+                self.breaker.record_success()
+
+            return response
+
+    async def _sleep(self, attempt):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+        logger.debug("retry backend call: service={}, attempt={}, delay={:.3f}".format(self.name, attempt + 1, delay))
+        await asyncio.sleep(delay)
+
+    async def get(self, api_path, **kwargs):
+        if self.singleflight is None:
+            return await self.request('GET', api_path, **kwargs)
+
+        return await self.singleflight.do(flight_key(api_path, kwargs), lambda: self.request('GET', api_path, **kwargs))
+
+    async def post(self, api_path, **kwargs):
+        return await self.request('POST', api_path, **kwargs)
+
+    async def put(self, api_path, **kwargs):
+        return await self.request('PUT', api_path, **kwargs)
+
+    async def delete(self, api_path, **kwargs):
+        return await self.request('DELETE', api_path, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class AsyncRunner:
+    # 1つのイベントループを専用スレッドで動かし、全リクエストのバックエンドI/Oをここで多重化する
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        breakers = {name: x.breaker for name, x in app.extensions[client.EXTENSION_KEY].items()}
+        self.clients = {name: create_client(app.config, name, breakers[name]) for name in SERVICES}
+
+        self._thread = threading.Thread(target=self._run, name='aio-loop', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro_fn, *args, **kwargs):
+        # 呼び出し側のスレッド/ループから使える concurrent.futures.Future を返す
+
+        async def run():
+            _current_runner.set(self)
+            with self.app.app_context():
+                return await coro_fn(*args, **kwargs)
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop)
+
+    def close(self):
+        for x in self.clients.values():
+            asyncio.run_coroutine_threadsafe(x.close(), self.loop).result()
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def init_app(app):
+
+    if httpx is None:
+        raise RuntimeError("ASYNC_VIEWS requires httpx.")
+
+    runner = AsyncRunner(app)
+    app.extensions[EXTENSION_KEY] = runner
+    atexit.register(runner.close)
+
+def create_client(config, name, breaker):
+
+    return AsyncServiceClient(
+        name,
+        _create_base_url(config, name),
+        max_connections=_service_config(config, name, 'POOL_MAXSIZE'),
+        max_keepalive_connections=_service_config(config, name, 'POOL_MAXSIZE'),
+        headers={
+            'Content-Type': 'application/json',
+        },
+        timeout=httpx.Timeout(
+            _service_config(config, name, 'READ_TIMEOUT'),
+            connect=_service_config(config, name, 'CONNECT_TIMEOUT'),
+        ),
+        retries=_service_config(config, name, 'RETRIES'),
+        backoff=_service_config(config, name, 'RETRY_BACKOFF'),
+        backoff_max=_service_config(config, name, 'RETRY_BACKOFF_MAX'),
+        breaker=breaker,
+        singleflight=_service_config(config, name, 'SINGLEFLIGHT'),
+    )
+
+async def run(coro_fn, *args, **kwargs):
+    # async view から await する: await aio.run(event_async.get_events, id_token)
+
+    stale = set()
+    future = current_app.extensions[EXTENSION_KEY].submit(cache.collect_stale, stale, coro_fn, *args, **kwargs)
+    result = await asyncio.wrap_future(future)
+
+    # ループ上で古い保持分を返した場合は呼び出し元の要求に記録
+    for service in stale:
+        cache.mark_stale(service)
+
+    return result
+
+def get_client(name):
+    # イベントループ上のコルーチンからのみ呼び出し可
+
+    return _current_runner.get().clients[name]
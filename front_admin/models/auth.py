@@ -12,6 +12,10 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import base64
+import hashlib
+import json
+
 from flask_login import UserMixin
 from logging import getLogger
 
@@ -20,3 +24,19 @@ logger = getLogger(__name__)
 class User(UserMixin):
 
     id = 1
+
+def get_token_subject(id_token):
+
+    if not id_token:
+        return 'anonymous'
+
+    # キャッシュキー用途のため署名検証はしない
+    try:
+        payload = id_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+
+        return claims['sub']
+
+    except Exception:
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
@@ -0,0 +1,576 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import asyncio
+import contextvars
+import copy
+import json
+import threading
+import time
+
+from collections import OrderedDict
+from flask import current_app, has_request_context, request
+from logging import getLogger
+from types import MappingProxyType
+
+from .. import metrics
+from . import fanout
+from . import shared_cache
+from .auth import get_token_subject
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'response_cache'
+HOOKS_EXTENSION_KEY = 'response_cache_hooks'
+MISSING = object()
+
+# 古い保持分を返した (再取得中/取得失敗) サービス名を記録する先
+STALE_ENVIRON_KEY = 'front_admin.cache_stale'
+_stale_sink = contextvars.ContextVar('cache_stale_sink')
+
+# バックグラウンド再取得中のタスク (参照を保持しないと途中で回収される)
+_tasks = set()
+
+
+class TTLCache:
+    # 項目: (鮮度期限, 保持期限, 値)。鮮度期限後も保持期限までは stale-while-revalidate / stale-if-error 用に残す
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        # サービス毎に invalidate の度に進め (clear は全体の _epoch)、それ以前に始まった取得結果を書き込まないようにする
+        self._generations = {}
+        self._epoch = 0
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        item = self.lookup(key)
+        if item is MISSING or item[1] > 0:
+            self._count(False)
+            return default
+
+        self._count(True)
+        return item[0]
+
+    def lookup(self, key):
+        # (値, 鮮度期限からの経過秒) を返す (負の値は新鮮)。未登録・保持期限切れは MISSING
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            now = time.monotonic()
+            if item is MISSING or item[1] <= now:
+                if item is not MISSING:
+                    del self._data[key]
+                return MISSING
+
+            self._data.move_to_end(key)
+            return item[2], now - item[0]
+
+    def set(self, key, value, ttl=None, keep=0, generation=None):
+        fresh_until = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation(key[0]):
+                logger.debug("cache set skipped (invalidated while loading): {}".format(key[:3]))
+                return
+
+            self._data[key] = (fresh_until, fresh_until + keep, value)
+            self._data.move_to_end(key)
+            # LRU: 上限を超えた分は古いものから破棄
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, service, api_path=''):
+        with self._lock:
+            self._generations[service] = self._generations.get(service, 0) + 1
+            keys = [x for x in self._data if x[0] == service and x[1].startswith(api_path)]
+            for key in keys:
+                del self._data[key]
+
+        logger.debug("cache invalidated: service={}, api_path={}, count={}".format(service, api_path, len(keys)))
+
+    def generation(self, service):
+        with self._lock:
+            return self._generation(service)
+
+    def begin_refresh(self, key):
+        # 同じキーの再取得は1件だけ走らせる
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+    def _generation(self, service):
+        return self._epoch, self._generations.get(service, 0)
+
+    def _count(self, hit, stale=False):
+        with self._lock:
+            if stale:
+                self.stale += 1
+            elif hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+def init_app(app):
+
+    app.extensions[EXTENSION_KEY] = TTLCache(app.config['CACHE_TTL'], app.config['CACHE_MAXSIZE'])
+    app.extensions[HOOKS_EXTENSION_KEY] = {}
+
+    @app.context_processor
+    def inject_stale():
+        return {'data_stale': bool(get_stale_services())}
+
+    @app.after_request
+    def add_stale_header(response):
+        services = get_stale_services()
+        if services:
+            response.headers['X-Data-Stale'] = ','.join(sorted(services))
+
+        return response
+
+def init_shared(app):
+    # L2 (Redis) と無効化通知の購読はプロセス毎に構築する (init_worker から呼び出し)
+    config = app.config
+
+    listener = app.extensions.pop(shared_cache.EXTENSION_KEY + '_listener', None)
+    if listener is not None:
+        listener.stop()
+
+    app.extensions[shared_cache.EXTENSION_KEY] = None
+    if not (config['CACHE_ENABLED'] and config['CACHE_SHARED_ENABLED']):
+        return
+
+    if config.get('SESSION_REDIS') is None:
+        logger.warning("CACHE_SHARED_ENABLED requires Redis (REDIS_URL), shared cache disabled.")
+        return
+
+    shared = shared_cache.SharedCache(
+        config['SESSION_REDIS'],
+        config['CACHE_SHARED_PREFIX'],
+        config['CACHE_TTL'],
+        retry_interval=config['CACHE_SHARED_RETRY_INTERVAL'],
+    )
+    local = app.extensions[EXTENSION_KEY]
+    hooks = app.extensions[HOOKS_EXTENSION_KEY]
+
+    def on_invalidate(service, api_path):
+        local.invalidate(service, api_path)
+        _run_hooks(hooks, service, api_path)
+
+    listener = shared_cache.InvalidationListener(
+        shared,
+        on_invalidate=on_invalidate,
+        on_subscribe=local.clear,
+        retry_interval=config['CACHE_SHARED_RETRY_INTERVAL'],
+    )
+    listener.start()
+
+    app.extensions[shared_cache.EXTENSION_KEY] = shared
+    app.extensions[shared_cache.EXTENSION_KEY + '_listener'] = listener
+
+def get_cache():
+
+    return current_app.extensions[EXTENSION_KEY]
+
+def get_shared_cache():
+
+    return current_app.extensions.get(shared_cache.EXTENSION_KEY)
+
+def make_key(service, api_path, id_token, params=None):
+
+    params_str = json.dumps(params, sort_keys=True) if params else ''
+
+    return (service, api_path, params_str, get_token_subject(id_token))
+
+def read_through(service, api_path, id_token, loader, params=None):
+    # CACHE_TTL 内: 保持分 / その後 CACHE_STALE_WHILE_REVALIDATE 内: 保持分を返し裏で再取得
+    # それ以降: 取得し、失敗した場合は CACHE_STALE_IF_ERROR 内なら保持分を返す
+    # 保持分は L1 (プロセス内) に無ければ L2 (Redis、レプリカ間で共有) を参照する
+    # 値は全ての要求で共有するため参照専用 (freeze) で返す
+
+    if not current_app.config['CACHE_ENABLED']:
+        return freeze(loader())
+
+    cache = get_cache()
+    key = make_key(service, api_path, id_token, params)
+
+    item, shared_generation = _cached_item(cache, service, key)
+    if item is not MISSING:
+        if item[1] <= 0:
+            return item[0]
+        if item[1] < current_app.config['CACHE_STALE_WHILE_REVALIDATE']:
+            _serve_stale(cache, service, key, 'revalidate')
+            _refresh(cache, key, loader, shared_generation)
+            return item[0]
+
+    metrics.cache_miss(service)
+    cache._count(False)
+    generation = cache.generation(key[0])
+    try:
+        value = loader()
+    except Exception:
+        if _within_stale_if_error(item):
+            _serve_stale(cache, service, key, 'error')
+            return item[0]
+        raise
+
+    return _store(cache, key, value, generation, shared_generation)
+
+async def read_through_async(service, api_path, id_token, loader, params=None):
+
+    if not current_app.config['CACHE_ENABLED']:
+        return freeze(await loader())
+
+    cache = get_cache()
+    key = make_key(service, api_path, id_token, params)
+
+    item, shared_generation = await _cached_item_async(cache, service, key)
+    if item is not MISSING:
+        if item[1] <= 0:
+            return item[0]
+        if item[1] < current_app.config['CACHE_STALE_WHILE_REVALIDATE']:
+            _serve_stale(cache, service, key, 'revalidate')
+            _refresh_async(cache, key, loader, shared_generation)
+            return item[0]
+
+    metrics.cache_miss(service)
+    cache._count(False)
+    generation = cache.generation(key[0])
+    try:
+        value = await loader()
+    except Exception:
+        if _within_stale_if_error(item):
+            _serve_stale(cache, service, key, 'error')
+            return item[0]
+        raise
+
+    return await _off_loop(_store, cache, key, value, generation, shared_generation)
+
+def _cached_item(cache, service, key):
+    # ((値, 鮮度期限からの経過秒) または MISSING, L2 の世代) を返す
+
+    item = cache.lookup(key)
+    if _is_fresh(item) or get_shared_cache() is None:
+        return _count_hit(cache, service, key, item), None
+
+    return _shared_item(cache, service, key, item)
+
+async def _cached_item_async(cache, service, key):
+
+    item = cache.lookup(key)
+    if _is_fresh(item) or get_shared_cache() is None:
+        return _count_hit(cache, service, key, item), None
+
+    return await _off_loop(_shared_item, cache, service, key, item)
+
+def _shared_item(cache, service, key, item):
+    # L1 に新鮮な値が無い場合に L2 を参照する
+
+    shared_item, shared_generation = get_shared_cache().lookup(key)
+    if shared_item is not None and (item is MISSING or shared_item[1] < item[1]):
+        # 他のレプリカが取得した値を L1 にも残りの期限で保持
+        item = (freeze(shared_item[0]), shared_item[1])
+        cache.set(key, item[0], ttl=-item[1], keep=_stale_keep())
+        if _is_fresh(item):
+            metrics.cache_shared_hit(service)
+
+    return _count_hit(cache, service, key, item), shared_generation
+
+def _is_fresh(item):
+
+    return item is not MISSING and item[1] <= 0
+
+def _count_hit(cache, service, key, item):
+
+    if _is_fresh(item):
+        logger.debug("cache hit: {}".format(key[:3]))
+        metrics.cache_hit(service)
+        cache._count(True)
+
+    return item
+
+async def _off_loop(fn, *args):
+    # L2 (同期の redis-py) を使う処理は aio のイベントループを止めないよう別スレッドで実行
+
+    if get_shared_cache() is None:
+        return fn(*args)
+
+    context = contextvars.copy_context()
+
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, fn, *args)
+
+def _within_stale_if_error(item):
+
+    return item is not MISSING and item[1] < current_app.config['CACHE_STALE_IF_ERROR']
+
+def _serve_stale(cache, service, key, reason):
+
+    logger.warning("serving stale cache: reason={}, key={}".format(reason, key[:3]))
+    metrics.cache_stale(service, reason)
+    cache._count(False, stale=True)
+    mark_stale(service)
+
+def _store(cache, key, value, generation, shared_generation=None):
+    # L1 には参照専用にした値、L2 には JSON のまま保存し、L1 の値を返す
+
+    keep = _stale_keep()
+    frozen = freeze(value)
+    cache.set(key, frozen, keep=keep, generation=generation)
+    metrics.cache_size(len(cache))
+
+    shared = get_shared_cache()
+    if shared is not None and shared_generation is not None:
+        shared.set(key, value, shared_generation, keep=keep)
+
+    return frozen
+
+def _stale_keep():
+    # 鮮度期限後も stale-while-revalidate / stale-if-error 用に保持する時間
+
+    config = current_app.config
+
+    return max(config['CACHE_STALE_WHILE_REVALIDATE'], config['CACHE_STALE_IF_ERROR'])
+
+def _refresh(cache, key, loader, shared_generation):
+
+    if not cache.begin_refresh(key):
+        return
+
+    generation = cache.generation(key[0])
+    app = current_app._get_current_object()
+
+    def refresh():
+        # 要求の終了後も動くためアプリケーションコンテキストのみで実行
+        with app.app_context():
+            try:
+                _store(cache, key, loader(), generation, shared_generation)
+            except Exception as e:
+                logger.warning("background refresh failed: key={}, error={}".format(key[:3], e))
+            finally:
+                cache.end_refresh(key)
+
+    fanout.get_executor().submit(refresh)
+
+def _refresh_async(cache, key, loader, shared_generation):
+
+    if not cache.begin_refresh(key):
+        return
+
+    generation = cache.generation(key[0])
+    app = current_app._get_current_object()
+
+    async def refresh():
+        with app.app_context():
+            try:
+                await _off_loop(_store, cache, key, await loader(), generation, shared_generation)
+            except Exception as e:
+                logger.warning("background refresh failed: key={}, error={}".format(key[:3], e))
+            finally:
+                cache.end_refresh(key)
+
+    task = asyncio.get_running_loop().create_task(refresh())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+def mark_stale(service):
+    # 要求の request.environ に記録 (fanout のワーカー・aio のループ上では呼び出し元から渡された集合へ)
+    sink = stale_sink()
+    if sink is not None:
+        sink.add(service)
+
+def stale_sink():
+    # 古い保持分を返したサービスの記録先 (要求・ワーカーの外では None)
+    sink = _stale_sink.get(None)
+    if sink is None and has_request_context():
+        sink = request.environ.setdefault(STALE_ENVIRON_KEY, set())
+
+    return sink
+
+def run_with_stale_sink(sink, fn, *args, **kwargs):
+    # fanout のワーカーで fn 内の mark_stale を呼び出し元の要求の集合 (stale_sink) に記録する
+    token = _stale_sink.set(sink)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _stale_sink.reset(token)
+
+def get_stale_services():
+
+    if not has_request_context():
+        return set()
+
+    return request.environ.get(STALE_ENVIRON_KEY, set())
+
+async def collect_stale(stale, coro_fn, *args, **kwargs):
+    # aio のループ上で実行する coro_fn 内の mark_stale を stale (set) に集める
+    _stale_sink.set(stale)
+
+    return await coro_fn(*args, **kwargs)
+
+def freeze(value):
+    # dict -> MappingProxyType, list -> tuple (共有する値を呼び出し側で書き換えられないようにする)
+
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(x) for x in value)
+
+    return value
+
+def derive(service, api_path, id_token, name, value, build):
+    # read_through の値から作るデータ (索引など) を値と組で L1 に保持し、同じ値 (同一オブジェクト) の間は使い回す
+    # 値が変わった場合は build(値, 前回のデータ または None) で作り直す。元の値と同じく invalidate で破棄される
+
+    if not current_app.config['CACHE_ENABLED']:
+        return build(value, None)
+
+    cache = get_cache()
+    key = make_key(service, api_path, id_token, {'derived': name})
+    previous = None
+    item = cache.lookup(key)
+    if item is not MISSING:
+        source, data = item[0]
+        if source is value:
+            return data
+        previous = data
+
+    data = build(value, previous)
+    cache.set(key, (value, data), keep=_stale_keep())
+
+    return data
+
+def invalidate(service, api_path=''):
+
+    cache = get_cache()
+    cache.invalidate(service, api_path)
+    metrics.cache_size(len(cache))
+    _run_hooks(current_app.extensions[HOOKS_EXTENSION_KEY], service, api_path)
+
+    # L2 の世代を進め、他のレプリカの L1 にも通知
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.invalidate(service, api_path)
+
+async def invalidate_async(service, api_path=''):
+
+    await _off_loop(invalidate, service, api_path)
+
+def set_invalidation_hook(app, name, fn):
+    # fn(service, api_path): invalidate 時 (他のレプリカからの通知を含む) に呼び出す
+
+    app.extensions[HOOKS_EXTENSION_KEY][name] = fn
+
+def _run_hooks(hooks, service, api_path):
+
+    for name, fn in list(hooks.items()):
+        try:
+            fn(service, api_path)
+        except Exception as e:
+            logger.warning("invalidation hook failed: name={}, error={}".format(name, e))
+
+def conditional_get(service, client, api_path, id_token, headers, **kwargs):
+    # バックエンドが ETag を返す場合は応答を保持し、次回は If-None-Match で再検証 (304 なら保持分を返す)
+    cache = get_cache()
+    key = make_key(service, api_path, id_token, {'validator': True})
+    item = _cached_validator(cache, key)
+    if item is not MISSING:
+        headers = dict(headers, **{'If-None-Match': item[0]})
+
+    response = client.get(api_path, headers=headers, **kwargs)
+    if response.status_code == 304 and item is MISSING:
+        # 保持分が無いのに 304 (中継キャッシュ・呼び出し側の条件ヘッダなど) の場合は条件無しで取り直す
+        logger.debug("not modified without cached body, refetching: {}".format(key[:2]))
+        response = client.get(api_path, headers=_unconditional(headers), **kwargs)
+
+    return _validated_body(cache, key, item, response)
+
+async def conditional_get_async(service, client, api_path, id_token, headers, **kwargs):
+
+    cache = get_cache()
+    key = make_key(service, api_path, id_token, {'validator': True})
+    item = _cached_validator(cache, key)
+    if item is not MISSING:
+        headers = dict(headers, **{'If-None-Match': item[0]})
+
+    response = await client.get(api_path, headers=headers, **kwargs)
+    if response.status_code == 304 and item is MISSING:
+        logger.debug("not modified without cached body, refetching: {}".format(key[:2]))
+        response = await client.get(api_path, headers=_unconditional(headers), **kwargs)
+
+    return _validated_body(cache, key, item, response)
+
+def _cached_validator(cache, key):
+    # 再検証用に保持した (ETag, 本文) を返す (一覧キャッシュのヒット率に含めないよう統計には数えない)
+    if not current_app.config['CACHE_ENABLED']:
+        return MISSING
+
+    item = cache.lookup(key)
+
+    return item if item is MISSING else item[0]
+
+def _unconditional(headers):
+
+    headers = {k: v for k, v in (headers or {}).items() if k.lower() not in ('if-none-match', 'if-modified-since')}
+    headers['Cache-Control'] = 'no-cache'
+
+    return headers
+
+def _validated_body(cache, key, item, response):
+
+    if response.status_code == 304 and item is not MISSING:
+        logger.debug("not modified: {}".format(key[:2]))
+        # 呼び出し側で書き換えられても保持分に影響しないよう複製を返す
+        return copy.deepcopy(item[1])
+
+    response.raise_for_status()
+    if response.status_code == 304:
+        # 取り直しても 304 の場合は本文が無いため失敗とする
+        raise ValueError("not modified without cached body: {}".format(key[:2]))
+
+    body = response.json()
+
+    etag = response.headers.get('ETag')
+    if etag and current_app.config['CACHE_ENABLED']:
+        cache.set(key, (etag, copy.deepcopy(body)))
+        metrics.cache_size(len(cache))
+
+    return body
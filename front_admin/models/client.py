@@ -0,0 +1,447 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import math
+import random
+import requests
+import threading
+import time
+import uuid
+
+from flask import current_app
+from http.cookiejar import DefaultCookiePolicy
+from logging import getLogger
+from requests.adapters import HTTPAdapter
+
+from .. import metrics
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'service_clients'
+SERVICES = ('event', 'speaker', 'oidc')
+
+# リトライ対象 (冪等な参照のみ)
+RETRY_METHODS = ('GET', 'HEAD')
+RETRY_STATUSES = (502, 503, 504)
+
+# KEYS[1]: 実行中の一覧 (sorted set、score = 期限) ARGV: 現在時刻, 上限, 期限, ID, キーの有効期間(s)
+# 戻り値: 1 = 取得 / 0 = 上限
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+class ConcurrencyLimitError(requests.exceptions.RequestException):
+
+    def __init__(self, *args, retry_after=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # closed: 通常 / open: 即時失敗 / half_open: reset_timeout 経過後に1件だけ試行
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state('half_open')
+
+            if self.state == 'half_open':
+                if self._probing:
+                    return False
+                self._probing = True
+
+            return self.state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != 'closed':
+                self._set_state('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != 'open':
+                    self._set_state('open')
+
+    def release(self):
+        # 結果を判定できずに終わった試行 (中断など) の half_open 試行枠を戻す
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+            }
+
+    def _set_state(self, state):
+        logger.warning("circuit breaker state changed: service={}, {} -> {}".format(self.name, self.state, state))
+        self.state = state
+
+
+class ConcurrencyLimiter:
+    # サービスへの同時実行数の上限。Redis があれば全ワーカー・レプリカ合計、無ければプロセス毎
+    # 空きが無ければ wait 秒だけ待って ConcurrencyLimitError (終了できなかった分は lease 秒で自動的に解放)
+
+    def __init__(self, name, limit, redis=None, wait=0.1, lease=30):
+        self.name = name
+        self.limit = limit
+        self.wait = wait
+        self.lease = lease
+        self.key = 'concurrency:{}'.format(name)
+        self._script = redis.register_script(ACQUIRE_SCRIPT) if redis is not None else None
+        self._redis = redis
+        self._local = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        if self._script is not None:
+            try:
+                return self._acquire_shared()
+            except ConcurrencyLimitError:
+                raise
+            except Exception as e:
+                # Redis 障害時はプロセス毎の上限で続行
+                logger.warning("shared concurrency limit unavailable: {}".format(e))
+
+        if not self._local.acquire(timeout=self.wait):
+            raise ConcurrencyLimitError("concurrency limit: {}".format(self.name))
+
+        return None
+
+    def release(self, token):
+        if token is None:
+            self._local.release()
+            return
+
+        try:
+            self._redis.zrem(self.key, token)
+        except Exception as e:
+            logger.warning("concurrency release failed (expires in {}s): {}".format(self.lease, e))
+
+    def _acquire_shared(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = time.time()
+            args = [now, self.limit, now + self.lease, token, math.ceil(self.lease)]
+            if self._script(keys=[self.key], args=args):
+                return token
+
+            if time.monotonic() >= deadline:
+                raise ConcurrencyLimitError("concurrency limit: {}".format(self.name))
+            time.sleep(min(0.02, self.wait))
+
+
+class SingleFlight:
+    # 同じキーの呼び出しが実行中なら完了を待って結果 (例外) を共有する
+
+    def __init__(self, name):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            metrics.backend_coalesced(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ServiceClient:
+
+    def __init__(self, name, base_url, pool_connections=10, pool_maxsize=10, headers=None,
+                 timeout=None, retries=0, backoff=0.1, backoff_max=1.0, breaker=None, singleflight=False,
+                 limiter=None):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(name)
+        # 同一内容の GET の同時実行を1回にまとめる
+        self.singleflight = SingleFlight(name) if singleflight else None
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # 利用者間でCookieを共有しないよう保持しない
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, api_path):
+        if self.base_url is None:
+            raise RuntimeError("service not configured: {}".format(self.name))
+
+        return self.base_url + api_path
+
+    def request(self, method, api_path, **kwargs):
+        if self.limiter is None:
+            return self._request(method, api_path, **kwargs)
+
+        token = self.limiter.acquire()
+        try:
+            return self._request(method, api_path, **kwargs)
+        finally:
+            self.limiter.release(token)
+
+    def _request(self, method, api_path, **kwargs):
+        url = self.url(api_path)
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = self.retries + 1 if method in RETRY_METHODS else 1
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                metrics.observe_backend(self.name, method, api_path, 'circuit_open')
+                raise CircuitOpenError("circuit open: {}".format(self.name))
+
+            last = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe_backend(self.name, method, api_path, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure()
+                if last:
+                    raise
+                self._sleep(attempt)
+                continue
+            except Exception as e:
+                # ChunkedEncodingError など再試行しない失敗も記録し、half_open の試行枠を必ず戻す
+                metrics.observe_backend(self.name, method, api_path, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            metrics.observe_backend(self.name, method, api_path, response.status_code, time.perf_counter() - start)
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and not last:
+                    self._sleep(attempt)
+                    continue
+            else:
+                self.breaker.record_success()
+
+            return response
+
+    def retry_delay(self, attempt):
+        # full jitter: 0 ～ min(backoff_max, backoff * 2^attempt)
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _sleep(self, attempt):
+        delay = self.retry_delay(attempt)
+        logger.debug("retry backend call: service={}, attempt={}, delay={:.3f}".format(self.name, attempt + 1, delay))
+        time.sleep(delay)
+
+    def get(self, api_path, **kwargs):
+        if self.singleflight is None or kwargs.get('stream'):
+            return self.request('GET', api_path, **kwargs)
+
+        # 応答は読み込み済みの Response を共有する (呼び出し側は参照のみ)
+        return self.singleflight.do(flight_key(api_path, kwargs), lambda: self.request('GET', api_path, **kwargs))
+
+    def post(self, api_path, **kwargs):
+        return self.request('POST', api_path, **kwargs)
+
+    def put(self, api_path, **kwargs):
+        return self.request('PUT', api_path, **kwargs)
+
+    def delete(self, api_path, **kwargs):
+        return self.request('DELETE', api_path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def init_app(app):
+    clients = {}
+    for name in SERVICES:
+        clients[name] = create_client(app.config, name)
+
+    app.extensions[EXTENSION_KEY] = clients
+
+def create_client(config, name):
+
+    return ServiceClient(
+        name,
+        _create_base_url(config, name),
+        pool_connections=_service_config(config, name, 'POOL_CONNECTIONS'),
+        pool_maxsize=_service_config(config, name, 'POOL_MAXSIZE'),
+        headers=_default_headers(name),
+        timeout=(
+            _service_config(config, name, 'CONNECT_TIMEOUT'),
+            _service_config(config, name, 'READ_TIMEOUT'),
+        ),
+        retries=_service_config(config, name, 'RETRIES'),
+        backoff=_service_config(config, name, 'RETRY_BACKOFF'),
+        backoff_max=_service_config(config, name, 'RETRY_BACKOFF_MAX'),
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=_service_config(config, name, 'BREAKER_FAILURES'),
+            reset_timeout=_service_config(config, name, 'BREAKER_RESET_TIMEOUT'),
+        ),
+        singleflight=_service_config(config, name, 'SINGLEFLIGHT'),
+        limiter=_create_limiter(config, name),
+    )
+
+def _create_limiter(config, name):
+    # CONCURRENCY_<NAME> が設定されたサービスのみ (Keycloak: CONCURRENCY_OIDC)
+    limit = config.get('CONCURRENCY_{}'.format(name.upper()))
+    if not limit:
+        return None
+
+    return ConcurrencyLimiter(
+        name,
+        limit,
+        redis=config.get('SESSION_REDIS'),
+        wait=config['CONCURRENCY_WAIT'],
+        lease=config['CONCURRENCY_LEASE'],
+    )
+
+def get_client(name):
+
+    return current_app.extensions[EXTENSION_KEY][name]
+
+def get_breaker_states():
+
+    return {name: x.breaker.snapshot() for name, x in current_app.extensions[EXTENSION_KEY].items()}
+
+def get_singleflight_stats():
+
+    return {
+        name: x.singleflight.snapshot()
+        for name, x in current_app.extensions[EXTENSION_KEY].items() if x.singleflight is not None
+    }
+
+def flight_key(api_path, kwargs):
+    # パス・クエリ・ヘッダ (Authorization = 認可の範囲を含む)・本文が同じ要求を同一とみなす
+    headers = sorted((kwargs.get('headers') or {}).items())
+    params = kwargs.get('params')
+    if isinstance(params, dict):
+        params = sorted(params.items())
+
+    return json.dumps([api_path, params, headers, kwargs.get('data')], default=str)
+
+def read_json(response):
+    # requests / httpx (aio) 共通: 失敗応答は例外、成功時は本文 (JSON) を返す
+    response.raise_for_status()
+
+    return response.json()
+
+def _default_headers(name):
+
+    headers = {
+        'Connection': 'keep-alive',
+    }
+    # OIDC (トークン取得) はフォーム送信のため JSON を既定にしない
+    if name != 'oidc':
+        headers['Content-Type'] = 'application/json'
+
+    return headers
+
+def _service_config(config, name, key):
+    # サービス個別設定 (SERVICE_EVENT_POOL_MAXSIZE など) が無ければ共通設定を使用
+    service_key = 'SERVICE_{}_{}'.format(name.upper(), key)
+    if config.get(service_key) is not None:
+        return config[service_key]
+
+    return config['SERVICE_{}'.format(key)]
+
+def _create_base_url(config, name):
+
+    prefix = 'SERVICE_{}_'.format(name.upper())
+    protocol = config[prefix + 'PROTOCOL']
+    host = config[prefix + 'HOST']
+    port = config[prefix + 'PORT']
+
+    if not host:
+        logger.warning("service host not configured: {}".format(name))
+        return None
+
+    return '{}://{}:{}'.format(protocol, host, port)
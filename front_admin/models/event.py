@@ -13,35 +13,41 @@
 #   limitations under the License.
 
 import json
-import os
-import requests
-import traceback
 
+from functools import partial
 from logging import getLogger
 
+from . import cache
+from . import fanout
+from . import master
+from .client import get_client, read_json
+from .event_index import EventIndex
+
 logger = getLogger(__name__)
 
+# 要求の組み立て (_*_path, _*_params) は async 版 (models.event_async) と共有する
+LIST_PATH = '/api/v1/event'
 
 def get_events(id_token):
     logger.debug("models.event.get_events called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/event'
+    client = _get_client()
+    api_path = LIST_PATH
     header = _create_header(id_token)
     body = {}
 
+    def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(client.get(api_path, headers=header, data=json.dumps(body)))
+
     event_list = []
     try:
-        # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.get(base_url + api_path, headers=header, data=json.dumps(body))
-        response.raise_for_status()
-
-        event_list = response.json()
+        # 取得 (キャッシュ経由)
+        event_list = cache.read_through('event', api_path, id_token, load)
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         # todo
 
@@ -50,23 +56,20 @@ def get_events(id_token):
 def get_event_detail(event_id, id_token):
     logger.debug("models.event.get_event_detail called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/event/{}'.format(event_id)
+    client = _get_client()
+    api_path = _detail_path(event_id)
     header = _create_header(id_token)
     body = {}
 
     event_detail = {}
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.get(base_url + api_path, headers=header, data=json.dumps(body))
-        response.raise_for_status()
-
-        event_detail = response.json()
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        event_detail = cache.conditional_get('event', client, api_path, id_token, header, data=json.dumps(body))
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
@@ -75,153 +78,173 @@ def get_event_detail(event_id, id_token):
 def get_timetable(event_id, user_id = None, kind_of_sso = None, id_token = None):
     logger.debug("models.event.get_timetable called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/event/{}/timetable'.format(event_id)
+    client = _get_client()
+    api_path = _timetable_path(event_id)
     header = _create_header(id_token)
-    params = {}
+    params = _timetable_params(user_id, kind_of_sso)
 
-    if user_id:
-        params['user_id'] = user_id
-    if kind_of_sso:
-        params['kind_of_sso'] = kind_of_sso
+    def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(client.get(api_path, headers=header, params=params))
 
     event_timetable = {}
     try:
-        # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.get(base_url + api_path, headers=header, params=params)
-        response.raise_for_status()
-
-        event_timetable = response.json()
+        # 取得 (キャッシュ経由)
+        event_timetable = cache.read_through('event', api_path, id_token, load, params=params)
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         # todo
 
     return event_timetable
 
-def get_master(id_token):
-    logger.debug("models.event.get_master called.")
+def get_event_index(events, id_token):
+    logger.debug("models.event.get_event_index called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/master'
-    header = _create_header(id_token)
-    body = {}
+    # キャッシュの一覧と組で保持し、同じ一覧の間は使い回す (一覧が変わった時は前回の索引から差分で再構築)
+    def build(events, previous):
+        return previous.rebuild(events) if previous is not None else EventIndex(events)
 
-    master = {}
-    try:
-        # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        # response = requests.get(base_url + api_path, headers=header, data=json.dumps(body))
-        # if response.status_code != 200:
-        #     raise Exception(response)
+    return cache.derive('event', LIST_PATH, id_token, 'index', events, build)
 
-        # master = response.json()
-
-        master = {
-            "block": ['A', 'B', 'C', 'D', ],
-            "class": ['9', '10', '11', '12', '13', '14', '15', '16', '17', ],
-        }
+def get_master(id_token):
+    logger.debug("models.event.get_master called.")
 
-    except Exception as e:
-        logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+    # プロセス内に保持している版を返す (MASTER_SOURCE = backend の場合も取得は初回と定期更新時のみ)
+    return master.get_master_store().get(id_token).data
 
-        # todo
+def refresh_master():
+    logger.debug("models.event.refresh_master called.")
 
-    return master
+    # 全レプリカで次の参照時に再取得 (バックエンドのマスタ更新後に呼び出す)
+    master.signal_refresh()
 
-def create_event(event_info, id_token):
+def create_event(event_info, id_token, invalidate=True):
     logger.debug("models.event.create_event called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/event/'
+    client = _get_client()
+    api_path = LIST_PATH + '/'
     header = _create_header(id_token)
     body = event_info
 
     #event_detail = {}
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.post(base_url + api_path, headers=header, data=json.dumps(body))
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.post(api_path, headers=header, data=json.dumps(body))
         response.raise_for_status()
+        if invalidate:
+            cache.invalidate('event', LIST_PATH)
 
         #event_detail = response.json()
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return None
 
-def update_event(event_info, id_token):
+def update_event(event_info, id_token, invalidate=True):
     logger.debug("models.event.update_event called.")
 
     event_id = event_info['event_id']
-    base_url = _create_base_url()
-    api_path = '/api/v1/event/{}'.format(event_id)
+    client = _get_client()
+    api_path = _detail_path(event_id)
     header = _create_header(id_token)
     body = event_info
 
     #event_detail = {}
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.put(base_url + api_path, headers=header, data=json.dumps(body))
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.put(api_path, headers=header, data=json.dumps(body))
         response.raise_for_status()
+        if invalidate:
+            cache.invalidate('event', LIST_PATH)
 
         #event_detail = response.json()
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return None
 
+def bulk_write_events(event_infos, id_token, max_concurrency=None):
+    logger.debug("models.event.bulk_write_events called.")
+
+    # event_id の有るものは更新、無いものは登録。結果は入力順に None (成功) または例外
+    calls = {}
+    for index, event_info in enumerate(event_infos):
+        write = update_event if event_info.get('event_id') is not None else create_event
+        calls[index] = partial(write, event_info, id_token, invalidate=False)
+
+    results = fanout.gather(calls, return_exceptions=True, max_concurrency=max_concurrency)
+
+    # キャッシュの破棄は一括で1回 (失敗した書き込みも反映済みの可能性があるため常に)
+    if results:
+        cache.invalidate('event', LIST_PATH)
+
+    return [results[index] for index in range(len(event_infos))]
+
 def delete_event(event_id, id_token):
     logger.debug("models.event.delete_event called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/event/{}'.format(event_id)
+    client = _get_client()
+    api_path = _detail_path(event_id)
     header = _create_header(id_token)
     body = {}
 
     #event_detail = {}
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.delete(base_url + api_path, headers=header, data=json.dumps(body))
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.delete(api_path, headers=header, data=json.dumps(body))
         response.raise_for_status()
+        cache.invalidate('event', LIST_PATH)
 
         #event_detail = response.json()
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return None
 
+def _detail_path(event_id):
+
+    return '{}/{}'.format(LIST_PATH, event_id)
+
+def _timetable_path(event_id):
+
+    return '{}/{}/timetable'.format(LIST_PATH, event_id)
+
+def _timetable_params(user_id=None, kind_of_sso=None):
+
+    params = {}
+    if user_id:
+        params['user_id'] = user_id
+    if kind_of_sso:
+        params['kind_of_sso'] = kind_of_sso
+
+    return params
+
 def _create_header(id_token):
     # ヘッダ情報
     header = {
-        'Content-Type': 'application/json',
         'Authorization': 'Bearer {}'.format(id_token),
     }
 
     return header
 
-def _create_base_url():
-
-    protocol = os.environ['SERVICE_EVENT_PROTOCOL']
-    host = os.environ['SERVICE_EVENT_HOST']
-    port = os.environ['SERVICE_EVENT_PORT']
+def _get_client():
 
-    return protocol + '://' + host + ':' + port
+    return get_client('event')
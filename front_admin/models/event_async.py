@@ -0,0 +1,137 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+
+from logging import getLogger
+
+from . import aio
+from . import cache
+from .client import read_json
+from .event import LIST_PATH, _create_header, _detail_path, _timetable_params, _timetable_path
+
+logger = getLogger(__name__)
+
+# models.event の async 版 (ASYNC_VIEWS = True のとき aio.run() 経由で呼び出す)
+
+
+async def get_events(id_token):
+    logger.debug("models.event_async.get_events called.")
+
+    client = _get_client()
+    api_path = LIST_PATH
+    header = _create_header(id_token)
+
+    async def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(await client.get(api_path, headers=header))
+
+    event_list = []
+    try:
+        # 取得 (キャッシュ経由)
+        event_list = await cache.read_through_async('event', api_path, id_token, load)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+    return event_list
+
+async def get_event_detail(event_id, id_token):
+    logger.debug("models.event_async.get_event_detail called.")
+
+    client = _get_client()
+    api_path = _detail_path(event_id)
+    header = _create_header(id_token)
+
+    event_detail = {}
+    try:
+        # 取得
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        event_detail = await cache.conditional_get_async('event', client, api_path, id_token, header)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        raise
+
+    return event_detail
+
+async def get_timetable(event_id, user_id = None, kind_of_sso = None, id_token = None):
+    logger.debug("models.event_async.get_timetable called.")
+
+    client = _get_client()
+    api_path = _timetable_path(event_id)
+    header = _create_header(id_token)
+    params = _timetable_params(user_id, kind_of_sso)
+
+    async def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(await client.get(api_path, headers=header, params=params))
+
+    event_timetable = {}
+    try:
+        # 取得 (キャッシュ経由)
+        event_timetable = await cache.read_through_async('event', api_path, id_token, load, params=params)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+    return event_timetable
+
+async def create_event(event_info, id_token):
+    logger.debug("models.event_async.create_event called.")
+
+    await _write('POST', LIST_PATH + '/', event_info, id_token)
+
+    return None
+
+async def update_event(event_info, id_token):
+    logger.debug("models.event_async.update_event called.")
+
+    event_id = event_info['event_id']
+    await _write('PUT', _detail_path(event_id), event_info, id_token)
+
+    return None
+
+async def delete_event(event_id, id_token):
+    logger.debug("models.event_async.delete_event called.")
+
+    await _write('DELETE', _detail_path(event_id), {}, id_token)
+
+    return None
+
+async def _write(method, api_path, body, id_token):
+
+    client = _get_client()
+    header = _create_header(id_token)
+
+    try:
+        # 更新
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = await client.request(method, api_path, headers=header, content=json.dumps(body))
+        response.raise_for_status()
+        await cache.invalidate_async('event', LIST_PATH)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        raise
+
+def _get_client():
+
+    return aio.get_client('event')
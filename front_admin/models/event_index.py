@@ -0,0 +1,93 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# 再構築時にこれより多く追加・変更されていれば全体を並べ直す
+REBUILD_MAX_INSERTS = 64
+
+
+class EventIndex:
+    # イベント一覧を日付の昇順に並べた索引 (models.event.get_event_index でキャッシュの一覧と組で保持)
+
+    def __init__(self, events, parsed=None):
+        # parsed: 前回の索引の {(event_id, event_date): datetime}、変更の無いイベントは再解析しない
+        parsed = parsed or {}
+
+        entries = []
+        for x in events:
+            key = (x['event_id'], x['event_date'])
+            date = parsed.get(key)
+            if date is None:
+                date = server_str_to_datetime(x['event_date'])
+
+            entries.append((date, key, x))
+
+        entries.sort(key=lambda x: x[0])
+        self._assign([x[0] for x in entries], [x[1] for x in entries], [x[2] for x in entries])
+
+    def __len__(self):
+        return len(self._events)
+
+    def rebuild(self, events):
+        # 前回の並びを引き継ぎ、削除分を除いて追加分 (日付が変わったものを含む) だけを二分探索で挿入する
+        current = {(x['event_id'], x['event_date']): x for x in events}
+        added = [x for x in current if x not in self._parsed]
+        if len(current) != len(events) or len(added) > REBUILD_MAX_INSERTS:
+            # 重複がある場合・変更が多い場合は全体を並べ直す
+            return EventIndex(events, self._parsed)
+
+        dates = []
+        keys = []
+        for date, key in zip(self._dates, self._keys):
+            if key in current:
+                dates.append(date)
+                keys.append(key)
+
+        for key in added:
+            date = server_str_to_datetime(key[1])
+            position = bisect_right(dates, date)
+            dates.insert(position, date)
+            keys.insert(position, key)
+
+        # 内容 (イベント名など) は新しい一覧の値を使う
+        index = EventIndex(())
+        index._assign(dates, keys, [current[x] for x in keys])
+
+        return index
+
+    def split(self, now):
+        # now 以前 (<=) のイベント数 = アーカイブの件数
+        return bisect_right(self._dates, now)
+
+    def upcomings(self, now, offset=0, limit=None):
+        return self._desc(self.split(now), len(self._events), offset, limit)
+
+    def archives(self, now, offset=0, limit=None):
+        return self._desc(0, self.split(now), offset, limit)
+
+    def range(self, start, end):
+        # start <= event_date < end を日付の昇順で返す
+        return self._events[bisect_left(self._dates, start):bisect_left(self._dates, end)]
+
+    def _assign(self, dates, keys, events):
+        self._dates = dates
+        self._keys = keys
+        self._events = events
+        self._parsed = dict(zip(keys, dates))
+
+    def _desc(self, lo, hi, offset, limit):
+        # [lo, hi) を日付の降順で offset から limit 件返す
+        stop = hi - offset
+        start = lo if limit is None else max(lo, stop - limit)
+        if stop <= start:
+            return []
+
+        return self._events[start:stop][::-1]
+
+
+def server_str_to_datetime(datetime_str):
+
+    # return datetime.fromisoformat(datetime_str.replace('Z', '+00:00')) # python3.7~
+    return datetime.strptime(datetime_str, '%Y-%m-%dT%H:%M:%S.%fZ') # not %z, because https://bugs.python.org/issue15873
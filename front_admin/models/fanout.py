@@ -0,0 +1,100 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from flask import current_app
+from logging import getLogger
+
+from . import cache
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'fanout_executor'
+
+_local = threading.local()
+
+
+def init_app(app):
+
+    app.extensions[EXTENSION_KEY] = ThreadPoolExecutor(
+        max_workers=app.config['FANOUT_MAX_WORKERS'],
+        thread_name_prefix='fanout',
+    )
+
+def get_executor():
+
+    return current_app.extensions[EXTENSION_KEY]
+
+def submit(fn, *args, **kwargs):
+
+    return get_executor().submit(_with_context(fn), *args, **kwargs)
+
+def gather(calls, return_exceptions=False, max_concurrency=None):
+    # calls: {名前: 引数なしの callable}
+    # 戻り値: {名前: 結果}、return_exceptions=True の場合は失敗した呼び出しの例外を結果として返す
+    # max_concurrency: 同時に実行する数の上限 (大量の呼び出しで共有プールを占有しないよう制限する場合)
+
+    if getattr(_local, 'in_worker', False):
+        # ワーカー内からの入れ子呼び出しはプール枯渇を避けるため逐次実行
+        futures = {name: _run_inline(fn) for name, fn in calls.items()}
+    elif max_concurrency:
+        semaphore = threading.Semaphore(max_concurrency)
+        futures = {}
+        for name, fn in calls.items():
+            semaphore.acquire()
+            futures[name] = submit(fn)
+            futures[name].add_done_callback(lambda _: semaphore.release())
+        wait(futures.values())
+    else:
+        futures = {name: submit(fn) for name, fn in calls.items()}
+        wait(futures.values())
+
+    results = {}
+    for name, future in futures.items():
+        e = future.exception()
+        if e is not None and not return_exceptions:
+            raise e
+
+        results[name] = e if e is not None else future.result()
+
+    return results
+
+def _with_context(fn):
+    # 要求コンテキストは複製しない (要求の終了時に閉じられる Request をワーカーと共有しない)
+    # ワーカーにはアプリケーションコンテキストのみを積み、要求の値 (id_token など) は呼び出し側が引数で渡す
+    # 古い保持分を返した記録 (cache.mark_stale) のみ、呼び出し元の要求の集合をここで引き渡す
+    app = current_app._get_current_object()
+    stale = cache.stale_sink()
+
+    def run(*args, **kwargs):
+        _local.in_worker = True
+        try:
+            with app.app_context():
+                return cache.run_with_stale_sink(stale, fn, *args, **kwargs)
+        finally:
+            _local.in_worker = False
+
+    return run
+
+def _run_inline(fn):
+
+    future = Future()
+    try:
+        future.set_result(fn())
+    except Exception as e:
+        future.set_exception(e)
+
+    return future
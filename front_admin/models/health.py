@@ -0,0 +1,189 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+import time
+
+from flask import current_app
+from functools import partial
+from logging import getLogger
+
+from . import client
+from . import fanout
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'health'
+
+
+class BackendProbe:
+    # バックエンドの疎通確認。結果を ttl 秒再利用し、/healthz への問い合わせ毎にはバックエンドを呼ばない
+    # 期限切れのサービスはロック外で並列に確認し、確認中に来た問い合わせは前回の結果を返す
+
+    def __init__(self, services, path='/', timeout=2, ttl=10):
+        self.services = services
+        self.path = path
+        self.timeout = timeout
+        self.ttl = ttl
+        self._results = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def check(self):
+        # {サービス名: {'ok': bool, 'detail': str, 'age': 確認からの秒数}} (未確認のサービスは ok = False)
+        with self._lock:
+            now = time.monotonic()
+            due = [
+                name for name in self.services
+                if name not in self._probing and (name not in self._results or now - self._results[name][0] >= self.ttl)
+            ]
+            self._probing.update(due)
+
+        if due:
+            try:
+                results = fanout.gather({name: partial(self._probe, name) for name in due}, return_exceptions=True)
+            finally:
+                with self._lock:
+                    self._probing.difference_update(due)
+
+            with self._lock:
+                for name, result in results.items():
+                    ok, detail = (False, type(result).__name__) if isinstance(result, Exception) else result
+                    self._results[name] = (time.monotonic(), ok, detail)
+
+        with self._lock:
+            now = time.monotonic()
+            return {
+                name: (
+                    {'ok': x[1], 'detail': x[2], 'age': round(now - x[0], 1)} if x is not None
+                    else {'ok': False, 'detail': 'probing', 'age': None}
+                )
+                for name, x in ((name, self._results.get(name)) for name in self.services)
+            }
+
+    def _probe(self, name):
+        # 500 未満の応答があれば疎通ありとみなす (認証エラーや 404 でもサービスは動作している)
+        service = client.get_client(name)
+        if service.base_url is None:
+            return False, 'not configured'
+        if service.breaker.snapshot()['state'] == 'open':
+            return False, 'circuit open'
+
+        try:
+            response = service.session.get(service.url(self.path), timeout=self.timeout)
+        except Exception as e:
+            logger.info("backend probe failed: service={}, error={}".format(name, e))
+            return False, type(e).__name__
+
+        return response.status_code < 500, str(response.status_code)
+
+
+class WarmUp:
+    # ワーカー起動時にバックグラウンドで全利用者共通のデータ (JWKS・マスタ・basic ログインでは一覧も) を取得する
+
+    def __init__(self, app, probe):
+        self.app = app
+        self.probe = probe
+        self.state = 'pending'
+        self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def done(self):
+        return self.state in ('done', 'disabled', 'timeout', 'failed')
+
+    def _run(self):
+        config = self.app.config
+        with self.app.app_context():
+            self.state = 'running'
+            start = time.monotonic()
+
+            # バックエンドが応答するまで待つ (上限を超えた場合は取得せずに終了し、/healthz は疎通確認のみで判定)
+            while not all(x['ok'] for x in self.probe.check().values()):
+                if time.monotonic() - start >= config['WARMUP_TIMEOUT']:
+                    logger.warning("warm-up timed out waiting for backends.")
+                    self.state = 'timeout'
+                    return
+                time.sleep(config['WARMUP_RETRY_INTERVAL'])
+
+            try:
+                self._prefetch(config)
+            except Exception as e:
+                logger.warning("warm-up failed: {}".format(e))
+                logger.debug("traceback:", exc_info=True)
+                self.state = 'failed'
+                return
+
+            logger.info("warm-up finished in {:.2f}s".format(time.monotonic() - start))
+            self.state = 'done'
+
+    def _prefetch(self, config):
+        from . import event, master, speaker, token
+
+        # keycloak: トークンの検証で JWKS を取得
+        id_token = token.get_service_token()
+
+        # preload 中であれば完了を待つ
+        master.get_master_store().get(id_token)
+
+        # 一覧の応答キャッシュは利用者 (id_token の sub) 毎のため、keycloak ではサービス用アカウントで温めても使われない
+        # basic ログインでは全員が同じ利用者 (anonymous) として共有するため、画面の初期表示分を取得しておく
+        if config['LOGIN_TYPE'] == 'keycloak':
+            logger.info("warm-up skipped catalog prefetch (cached per keycloak user).")
+            return
+
+        events = event.get_events(id_token)
+        event.get_event_index(events, id_token)
+        speaker.get_speaker_page(id_token, config['LIST_PAGE_SIZE'])
+
+
+def init_app(app):
+    # init_worker から呼び出し (ワーカー毎に疎通確認の結果と事前取得の状態を持つ)
+    config = app.config
+
+    services = ['event', 'speaker']
+    if config['LOGIN_TYPE'] == 'keycloak':
+        services.append('oidc')
+
+    probe = BackendProbe(
+        services,
+        path=config['HEALTH_PROBE_PATH'],
+        timeout=config['HEALTH_PROBE_TIMEOUT'],
+        ttl=config['HEALTH_PROBE_TTL'],
+    )
+    warmup = WarmUp(app, probe)
+
+    if not config['WARMUP_ENABLED']:
+        warmup.state = 'disabled'
+    elif config['LOGIN_TYPE'] == 'keycloak' and not config['WARMUP_USERNAME']:
+        logger.warning("WARMUP_ENABLED with LOGIN_TYPE = keycloak requires WARMUP_USERNAME, warm-up disabled.")
+        warmup.state = 'disabled'
+    else:
+        warmup.start()
+
+    app.extensions[EXTENSION_KEY] = warmup
+
+def get_readiness():
+    # 事前取得が終わり、全バックエンドが応答する場合に ready
+
+    warmup = current_app.extensions[EXTENSION_KEY]
+    backends = warmup.probe.check() if warmup.done else {}
+
+    return {
+        'ready': warmup.done and all(x['ok'] for x in backends.values()),
+        'warmup': warmup.state,
+        'backends': backends,
+    }
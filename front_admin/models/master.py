@@ -0,0 +1,197 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import threading
+import time
+
+from collections import namedtuple
+from flask import current_app
+from logging import getLogger
+
+from . import cache
+from . import fanout
+from . import token
+from .client import get_client
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'master_store'
+API_PATH = '/api/v1/master'
+
+# MASTER_SOURCE = static の場合、および backend から取得できるまでの値
+DEFAULT_MASTER = {
+    "block": ['A', 'B', 'C', 'D', ],
+    "class": ['9', '10', '11', '12', '13', '14', '15', '16', '17', ],
+}
+
+# data: 参照専用 (dict -> MappingProxyType, list -> tuple) / version: 内容のハッシュ (変更の判定用)
+# etag: バックエンドの ETag (再検証の If-None-Match 用、返さないバックエンドでは None)
+MasterSnapshot = namedtuple('MasterSnapshot', ['data', 'version', 'etag', 'loaded_at'])
+
+
+class MasterStore:
+    # /api/v1/master を取得してプロセス内に保持し、参照時は保持している版をそのまま返す
+    # 初回はワーカー起動時 (preload) に取得し、再取得は refresh_interval 経過後または request_refresh() 後の参照時にバックグラウンドで行う
+
+    def __init__(self, source='static', refresh_interval=3600, retry_interval=30):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._snapshot = MasterSnapshot(cache.freeze(DEFAULT_MASTER), 'static', None, None)
+        self._checked_at = None
+        self._due = False
+        self._loading = False
+        self._initial_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def get(self, id_token):
+        if self.source != 'backend':
+            return self._snapshot
+
+        if self._checked_at is None:
+            # 初回のみ取得を待つ (同時に来た要求は1回の取得を共有)
+            with self._initial_lock:
+                if self._checked_at is None:
+                    self.refresh(id_token)
+        elif self._start_refresh():
+            self._refresh_later(id_token)
+
+        return self._snapshot
+
+    def preload(self, app):
+        # 初回の参照で取得を待たないよう、サービス用アカウントでバックグラウンドで取得 (取得中の参照は完了を待つ)
+        if self.source != 'backend':
+            return
+
+        def run():
+            with app.app_context(), self._initial_lock:
+                if self._checked_at is not None:
+                    return
+
+                try:
+                    id_token = token.get_service_token()
+                except Exception as e:
+                    logger.warning("master data preload skipped, loading on first request: {}".format(e))
+                    return
+
+                self.refresh(id_token)
+
+        app.extensions[fanout.EXTENSION_KEY].submit(run)
+
+    def request_refresh(self):
+        # 次の参照時に再取得する (cache.invalidate('master') で全レプリカに通知される)
+        with self._lock:
+            self._due = True
+
+    def refresh(self, id_token):
+        # 取得して版が変わっていれば差し替える。失敗時は保持している版を使い続け retry_interval 後に再試行
+        with self._lock:
+            self._due = False
+            etag = self._snapshot.etag if self._snapshot.loaded_at is not None else None
+
+        client = get_client('event')
+        headers = {
+            'Authorization': 'Bearer {}'.format(id_token),
+        }
+        if etag is not None:
+            headers['If-None-Match'] = etag
+
+        try:
+            logger.debug("request_url: {}".format(client.url(API_PATH)))
+            response = client.get(API_PATH, headers=headers)
+            if response.status_code == 304:
+                self._checked(self._snapshot._replace(loaded_at=time.time()))
+                return False
+
+            response.raise_for_status()
+            data = response.json()
+
+        except Exception as e:
+            logger.warning("master data refresh failed: {}".format(e))
+            logger.debug("traceback:", exc_info=True)
+            if self._snapshot.loaded_at is None:
+                logger.warning("master data not loaded, serving DEFAULT_MASTER (retry in {}s)".format(self.retry_interval))
+            self._checked(None)
+            return False
+
+        # ETag は再検証にのみ使い、変更の有無は内容で判定する (ETag だけが変わった場合は同じ版のまま)
+        version = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+        changed = version != self._snapshot.version
+        if changed:
+            logger.info("master data updated: version={}".format(version))
+        frozen = cache.freeze(data) if changed else self._snapshot.data
+        self._checked(MasterSnapshot(frozen, version, response.headers.get('ETag'), time.time()))
+
+        return changed
+
+    def _checked(self, snapshot):
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._loading:
+                return False
+
+            interval = self.refresh_interval if self._snapshot.loaded_at is not None else self.retry_interval
+            if not self._due and time.monotonic() - self._checked_at < interval:
+                return False
+
+            self._loading = True
+            return True
+
+    def _refresh_later(self, id_token):
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    self.refresh(id_token)
+                finally:
+                    with self._lock:
+                        self._loading = False
+
+        fanout.get_executor().submit(run)
+
+
+def init_app(app):
+
+    store = MasterStore(
+        app.config['MASTER_SOURCE'],
+        refresh_interval=app.config['MASTER_REFRESH_INTERVAL'],
+        retry_interval=app.config['MASTER_RETRY_INTERVAL'],
+    )
+    app.extensions[EXTENSION_KEY] = store
+
+    def on_invalidate(service, api_path):
+        if service == 'master':
+            store.request_refresh()
+
+    # 他のレプリカ (または自身) からの cache.invalidate('master') で再取得
+    cache.set_invalidation_hook(app, 'master', on_invalidate)
+
+    store.preload(app)
+
+def get_master_store():
+
+    return current_app.extensions[EXTENSION_KEY]
+
+def signal_refresh():
+    # 全レプリカのマスタデータを次の参照時に再取得させる (POST /event/master/refresh)
+
+    cache.invalidate('master')
@@ -13,28 +13,23 @@
 #   limitations under the License.
 
 import json
-import os
-import requests
 import traceback
 
 from logging import getLogger
 
+from .client import get_client
+
 logger = getLogger(__name__)
 
 
 def _create_header(id_token):
     # ヘッダ情報
     header = {
-        'Content-Type': 'application/json',
         'Authorization': 'Bearer {}'.format(id_token),
     }
 
     return header
 
-def _create_base_url():
-
-    protocol = os.environ['SERVICE_EVENT_PROTOCOL']
-    host = os.environ['SERVICE_EVENT_HOST']
-    port = os.environ['SERVICE_EVENT_PORT']
+def _get_client():
 
-    return protocol + '://' + host + ':' + port
+    return get_client('event')
@@ -0,0 +1,153 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import redis
+import threading
+import time
+import uuid
+
+from logging import getLogger
+
+from .client import CircuitBreaker
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'shared_cache'
+
+
+class SharedCache:
+    # L2: レプリカ間で共有する Redis 上の応答キャッシュ
+    # 値は {"g": 世代, "t": 取得時刻, "v": 値}。invalidate はサービス毎の世代を進めて一括で無効にする
+
+    def __init__(self, client, prefix, ttl, retry_interval=30):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.channel = prefix + 'invalidate'
+        # 自身が送った無効化通知を区別するためのプロセス毎の ID
+        self.origin = uuid.uuid4().hex
+        # Redis 障害時は retry_interval の間 L2 を使わずに L1 / バックエンドのみで動作
+        self.breaker = CircuitBreaker('cache_redis', failure_threshold=1, reset_timeout=retry_interval)
+
+    def lookup(self, key):
+        # ((値, 鮮度期限からの経過秒) または None, 現在の世代) を返す。世代が None の場合は L2 を使えない
+        if not self.breaker.allow():
+            return None, None
+
+        try:
+            generation, raw = self.client.mget(self._generation_key(key[0]), self._key(key))
+        except redis.RedisError as e:
+            self._failed(e)
+            return None, None
+
+        self.breaker.record_success()
+        generation = int(generation or 0)
+        if raw is None:
+            return None, generation
+
+        item = json.loads(raw)
+        if item['g'] != generation:
+            return None, generation
+
+        return (item['v'], time.time() - item['t'] - self.ttl), generation
+
+    def set(self, key, value, generation, keep=0):
+        # generation: 取得開始時点の世代 (その後に invalidate されていれば読み出し時に無視される)
+        if not self.breaker.allow():
+            return
+
+        raw = json.dumps({'g': generation, 't': time.time(), 'v': value})
+        try:
+            self.client.set(self._key(key), raw, ex=max(1, int(self.ttl + keep)))
+        except redis.RedisError as e:
+            self._failed(e)
+            return
+
+        self.breaker.record_success()
+
+    def invalidate(self, service, api_path=''):
+        if not self.breaker.allow():
+            return
+
+        message = json.dumps({'origin': self.origin, 'service': service, 'api_path': api_path})
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.incr(self._generation_key(service))
+            pipe.publish(self.channel, message)
+            pipe.execute()
+        except redis.RedisError as e:
+            self._failed(e)
+            return
+
+        self.breaker.record_success()
+
+    def _key(self, key):
+        service, api_path, params_str, subject = key
+        digest = hashlib.sha1(json.dumps([params_str, subject]).encode()).hexdigest()
+
+        return '{}{}:{}:{}'.format(self.prefix, service, api_path, digest)
+
+    def _generation_key(self, service):
+        return '{}{}:generation'.format(self.prefix, service)
+
+    def _failed(self, e):
+        logger.warning("shared cache unavailable: {}".format(e))
+        self.breaker.record_failure()
+
+
+class InvalidationListener(threading.Thread):
+    # 他のレプリカからの無効化通知を購読し L1 に反映する
+
+    def __init__(self, shared, on_invalidate, on_subscribe, retry_interval=30):
+        super().__init__(name='cache-invalidation', daemon=True)
+        self.shared = shared
+        self.on_invalidate = on_invalidate
+        # (再) 購読時: 未購読の間の通知を取りこぼしている可能性があるため L1 を破棄する
+        self.on_subscribe = on_subscribe
+        self.retry_interval = retry_interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            pubsub = self.shared.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.shared.channel)
+                self.on_subscribe()
+
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._handle(message)
+
+            except redis.RedisError as e:
+                logger.warning("cache invalidation subscriber disconnected: {}".format(e))
+                self._stopped.wait(self.retry_interval)
+
+            finally:
+                pubsub.close()
+
+    def _handle(self, message):
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logger.warning("invalid cache invalidation message: {}".format(message['data']))
+            return
+
+        if data.get('origin') != self.shared.origin:
+            self.on_invalidate(data['service'], data.get('api_path', ''))
+
+    def stop(self):
+        self._stopped.set()
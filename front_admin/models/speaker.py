@@ -13,126 +13,266 @@
 #   limitations under the License.
 
 import json
-import os
-import requests
-import traceback
 
+from collections.abc import Mapping
+from flask import current_app, g
+from functools import partial
 from logging import getLogger
 
+from . import cache
+from . import fanout
+from .client import get_client, read_json
+
 logger = getLogger(__name__)
 
+# 要求の組み立て (_*_path, _*_params) と応答の解釈 (_page_from, _slice_page, _pick_speakers) は
+# async 版 (models.speaker_async) と共有する
+LIST_PATH = '/api/v1/speaker'
+
 
-def get_speakers(id_token):
+def get_speakers(id_token, limit=None, cursor=None):
     logger.debug("Method called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/speaker'
+    client = _get_client()
+    api_path = LIST_PATH
     header = _create_header(id_token)
+    params = _list_params(limit, cursor)
+
+    def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(client.get(api_path, headers=header, params=params))
 
     speakers = {}
     try:
-        # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.get(base_url + api_path, headers=header)
-        response.raise_for_status()
-
-        speakers = response.json()
+        # 取得 (キャッシュ経由)
+        speakers = cache.read_through('speaker', api_path, id_token, load, params=params)
         #logger.debug("speakers: {}".format(json.dumps(speakers)))
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         # todo
 
     return speakers
 
+def get_speaker_page(id_token, limit, cursor=None):
+    logger.debug("models.speaker.get_speaker_page called.")
+
+    if current_app.config['SPEAKER_PAGINATION']:
+        return _page_from(get_speakers(id_token, limit=limit, cursor=cursor))
+
+    return _slice_page(get_speakers(id_token), limit, cursor)
+
 def get_speaker_detail(speaker_id, id_token):
     logger.debug("models.speaker.get_speaker_detail called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/speaker/{}'.format(speaker_id)
+    client = _get_client()
+    api_path = _detail_path(speaker_id)
     header = _create_header(id_token)
     body = {}
 
     event_detail = {}
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.get(base_url + api_path, headers=header, data=json.dumps(body))
-        response.raise_for_status()
-
-        event_detail = response.json()
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        event_detail = cache.conditional_get('speaker', client, api_path, id_token, header, data=json.dumps(body))
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return event_detail
 
-def create_speaker(speaker_info, id_token):
+def get_speakers_by_ids(speaker_ids, id_token):
+    logger.debug("models.speaker.get_speakers_by_ids called.")
+
+    # リクエスト内で取得済みの登壇者は再取得しない
+    memo = g.setdefault('speaker_memo', {})
+    speaker_ids = {x for x in speaker_ids if x is not None}
+    missing = [x for x in speaker_ids if x not in memo]
+
+    if missing and current_app.config['SPEAKER_BULK_LOOKUP']:
+        speakers, missing = _get_speakers_bulk(missing, id_token)
+        memo.update(speakers)
+
+    if missing:
+        # 一括取得を使わない場合・一括取得で得られなかった場合は個別に取得
+        results = fanout.gather(
+            {x: partial(get_speaker_detail, x, id_token) for x in missing},
+            return_exceptions=True,
+        )
+        for speaker_id, result in results.items():
+            if isinstance(result, Exception):
+                logger.debug("speaker lookup failed: speaker_id={}, error={}".format(speaker_id, result))
+                continue
+
+            memo[speaker_id] = result
+
+    return {x: memo[x] for x in speaker_ids if x in memo}
+
+def _get_speakers_bulk(speaker_ids, id_token):
+    # (取得できた登壇者, 個別取得が必要な ID) を返す
+
+    client = _get_client()
+    api_path = LIST_PATH
+    header = _create_header(id_token)
+    params = _bulk_params(speaker_ids)
+
+    try:
+        # 取得
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.get(api_path, headers=header, params=params)
+
+        return _pick_speakers(read_json(response), speaker_ids)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        return {}, list(speaker_ids)
+
+def _detail_path(speaker_id):
+
+    return '{}/{}'.format(LIST_PATH, speaker_id)
+
+def _list_params(limit=None, cursor=None):
+
+    params = {}
+    if limit:
+        params['limit'] = limit
+    if cursor:
+        params['cursor'] = cursor
+
+    return params
+
+def _bulk_params(speaker_ids):
+
+    return {'speaker_id': sorted(speaker_ids, key=str)}
+
+def _page_from(page):
+    # バックエンドのページング結果 {"items": [...], "next_cursor": ...} を (items, next_cursor) にする
+    if not isinstance(page, Mapping):
+        return page, None
+
+    return page.get('items', []), page.get('next_cursor')
+
+def _slice_page(speakers, limit, cursor):
+    # ページング未対応バックエンド: 全件 (キャッシュ) から切り出し、cursor は先頭からの件数
+    offset = int(cursor) if cursor else 0
+    if offset < 0:
+        raise ValueError("invalid cursor: {}".format(cursor))
+
+    speakers = list(speakers)
+    next_cursor = str(offset + limit) if offset + limit < len(speakers) else None
+
+    return speakers[offset:offset + limit], next_cursor
+
+def _pick_speakers(payload, speaker_ids):
+    # 一覧 [...] / ページング {"items": [...], "next_cursor": ...} のどちらの形式にも対応
+    # 絞り込み未対応のバックエンドでは全件が返るためこちらで抽出
+    more = False
+    if isinstance(payload, Mapping):
+        more = payload.get('next_cursor') is not None
+        payload = payload.get('items')
+
+    if not isinstance(payload, list):
+        logger.warning("unexpected speaker list: {}".format(type(payload).__name__))
+        return {}, list(speaker_ids)
+
+    wanted = set(speaker_ids)
+    speakers = {x['speaker_id']: x for x in payload if isinstance(x, Mapping) and x.get('speaker_id') in wanted}
+
+    # 続きのページがある場合、含まれなかった登壇者は個別に取得
+    remaining = [x for x in speaker_ids if x not in speakers] if more else []
+
+    return speakers, remaining
+
+def create_speaker(speaker_info, id_token, invalidate=True):
     logger.debug("models.speaker.create_event called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/speaker/'
+    client = _get_client()
+    api_path = LIST_PATH + '/'
     header = _create_header(id_token)
     body = speaker_info
 
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.post(base_url + api_path, headers=header, data=json.dumps(body))
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.post(api_path, headers=header, data=json.dumps(body))
         response.raise_for_status()
+        if invalidate:
+            cache.invalidate('speaker', LIST_PATH)
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return None
 
-def update_speaker(speaker_info, id_token):
+def update_speaker(speaker_info, id_token, invalidate=True):
     logger.debug("models.speaker.update_speaker called.")
 
     speaker_id = speaker_info['speaker_id']
-    base_url = _create_base_url()
-    api_path = '/api/v1/speaker/{}'.format(speaker_id)
+    client = _get_client()
+    api_path = _detail_path(speaker_id)
     header = _create_header(id_token)
     body = speaker_info
 
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.put(base_url + api_path, headers=header, data=json.dumps(body))
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.put(api_path, headers=header, data=json.dumps(body))
         response.raise_for_status()
+        if invalidate:
+            cache.invalidate('speaker', LIST_PATH)
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
     return None
 
+def bulk_write_speakers(speaker_infos, id_token, max_concurrency=None):
+    logger.debug("models.speaker.bulk_write_speakers called.")
+
+    # speaker_id の有るものは更新、無いものは登録。結果は入力順に None (成功) または例外
+    calls = {}
+    for index, speaker_info in enumerate(speaker_infos):
+        write = update_speaker if speaker_info.get('speaker_id') is not None else create_speaker
+        calls[index] = partial(write, speaker_info, id_token, invalidate=False)
+
+    results = fanout.gather(calls, return_exceptions=True, max_concurrency=max_concurrency)
+
+    # キャッシュの破棄は一括で1回 (失敗した書き込みも反映済みの可能性があるため常に)
+    if results:
+        cache.invalidate('speaker', LIST_PATH)
+
+    return [results[index] for index in range(len(speaker_infos))]
+
 def delete_speaker(speaker_id, id_token):
     logger.debug("models.event.delete_speaker called.")
 
-    base_url = _create_base_url()
-    api_path = '/api/v1/speaker/{}'.format(speaker_id)
+    client = _get_client()
+    api_path = _detail_path(speaker_id)
     header = _create_header(id_token)
 
     try:
         # 取得
-        logger.debug("request_url: {}".format(base_url + api_path))
-        response = requests.delete(base_url + api_path, headers=header)
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.delete(api_path, headers=header)
         response.raise_for_status()
+        cache.invalidate('speaker', LIST_PATH)
 
     except Exception as e:
         logger.debug(e)
-        logger.debug("traceback:" + traceback.format_exc())
+        logger.debug("traceback:", exc_info=True)
 
         raise
 
@@ -141,16 +281,11 @@ def delete_speaker(speaker_id, id_token):
 def _create_header(id_token):
     # ヘッダ情報
     header = {
-        'Content-Type': 'application/json',
         'Authorization': 'Bearer {}'.format(id_token),
     }
 
     return header
 
-def _create_base_url():
-
-    protocol = os.environ['SERVICE_SPEAKER_PROTOCOL']
-    host = os.environ['SERVICE_SPEAKER_HOST']
-    port = os.environ['SERVICE_SPEAKER_PORT']
+def _get_client():
 
-    return protocol + '://' + host + ':' + port
+    return get_client('speaker')
@@ -0,0 +1,176 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import asyncio
+import json
+
+from flask import current_app
+from logging import getLogger
+
+from . import aio
+from . import cache
+from .client import read_json
+from .speaker import (
+    LIST_PATH, _bulk_params, _create_header, _detail_path, _list_params, _page_from, _pick_speakers, _slice_page,
+)
+
+logger = getLogger(__name__)
+
+# models.speaker の async 版 (ASYNC_VIEWS = True のとき aio.run() 経由で呼び出す)
+
+
+async def get_speakers(id_token, limit=None, cursor=None):
+    logger.debug("models.speaker_async.get_speakers called.")
+
+    client = _get_client()
+    api_path = LIST_PATH
+    header = _create_header(id_token)
+    params = _list_params(limit, cursor)
+
+    async def load():
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        return read_json(await client.get(api_path, headers=header, params=params))
+
+    speakers = {}
+    try:
+        # 取得 (キャッシュ経由)
+        speakers = await cache.read_through_async('speaker', api_path, id_token, load, params=params)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+    return speakers
+
+async def get_speaker_page(id_token, limit, cursor=None):
+    logger.debug("models.speaker_async.get_speaker_page called.")
+
+    if current_app.config['SPEAKER_PAGINATION']:
+        return _page_from(await get_speakers(id_token, limit=limit, cursor=cursor))
+
+    return _slice_page(await get_speakers(id_token), limit, cursor)
+
+async def get_speaker_detail(speaker_id, id_token):
+    logger.debug("models.speaker_async.get_speaker_detail called.")
+
+    client = _get_client()
+    api_path = _detail_path(speaker_id)
+    header = _create_header(id_token)
+
+    speaker_detail = {}
+    try:
+        # 取得
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        speaker_detail = await cache.conditional_get_async('speaker', client, api_path, id_token, header)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        raise
+
+    return speaker_detail
+
+async def get_speakers_by_ids(speaker_ids, id_token, memo=None):
+    logger.debug("models.speaker_async.get_speakers_by_ids called.")
+
+    # memo: リクエスト単位の取得済み登壇者 (イベントループ上では flask.g を使えないため呼び出し側から渡す)
+    memo = {} if memo is None else memo
+    speaker_ids = {x for x in speaker_ids if x is not None}
+    missing = [x for x in speaker_ids if x not in memo]
+
+    if missing and current_app.config['SPEAKER_BULK_LOOKUP']:
+        speakers, missing = await _get_speakers_bulk(missing, id_token)
+        memo.update(speakers)
+
+    if missing:
+        # 一括取得を使わない場合・一括取得で得られなかった場合は個別に取得
+        results = await asyncio.gather(
+            *[get_speaker_detail(x, id_token) for x in missing],
+            return_exceptions=True,
+        )
+        for speaker_id, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.debug("speaker lookup failed: speaker_id={}, error={}".format(speaker_id, result))
+                continue
+
+            memo[speaker_id] = result
+
+    return {x: memo[x] for x in speaker_ids if x in memo}
+
+async def _get_speakers_bulk(speaker_ids, id_token):
+    # (取得できた登壇者, 個別取得が必要な ID) を返す
+
+    client = _get_client()
+    api_path = LIST_PATH
+    header = _create_header(id_token)
+    params = _bulk_params(speaker_ids)
+
+    try:
+        # 取得
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = await client.get(api_path, headers=header, params=params)
+
+        return _pick_speakers(read_json(response), speaker_ids)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        return {}, list(speaker_ids)
+
+async def create_speaker(speaker_info, id_token):
+    logger.debug("models.speaker_async.create_speaker called.")
+
+    await _write('POST', LIST_PATH + '/', speaker_info, id_token)
+
+    return None
+
+async def update_speaker(speaker_info, id_token):
+    logger.debug("models.speaker_async.update_speaker called.")
+
+    speaker_id = speaker_info['speaker_id']
+    await _write('PUT', _detail_path(speaker_id), speaker_info, id_token)
+
+    return None
+
+async def delete_speaker(speaker_id, id_token):
+    logger.debug("models.speaker_async.delete_speaker called.")
+
+    await _write('DELETE', _detail_path(speaker_id), None, id_token)
+
+    return None
+
+async def _write(method, api_path, body, id_token):
+
+    client = _get_client()
+    header = _create_header(id_token)
+    content = json.dumps(body) if body is not None else None
+
+    try:
+        # 更新
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = await client.request(method, api_path, headers=header, content=content)
+        response.raise_for_status()
+        await cache.invalidate_async('speaker', LIST_PATH)
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        raise
+
+def _get_client():
+
+    return aio.get_client('speaker')
@@ -0,0 +1,314 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import base64
+import json
+import threading
+import time
+
+from flask import current_app, session
+from logging import getLogger
+
+from .client import ConcurrencyLimitError, get_client
+
+try:
+    import jwt
+except ImportError: # 署名検証に必要 (未導入時は有効期限のみ確認)
+    jwt = None
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'token_manager'
+
+# 同じ refresh_token による更新を並行リクエスト間で1回にまとめる際の結果保持時間
+REFRESH_RESULT_TTL = 30 # (s)
+
+
+class TokenError(Exception):
+    pass
+
+
+class JwksCache:
+    # Keycloak の公開鍵 (JWKS) を ttl 秒毎に取り直す。未知の kid は min_interval 秒に1回まで即時再取得
+
+    def __init__(self, ttl=300, min_interval=10):
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        with self._lock:
+            if self._fetched_at is None or now - self._fetched_at >= self.ttl:
+                self._fetch(now)
+            elif kid not in self._keys and now - self._fetched_at >= self.min_interval:
+                self._fetch(now)
+
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise TokenError("unknown signing key: {}".format(kid))
+
+        return key
+
+    def _fetch(self, now):
+        client = get_client('oidc')
+        api_path = '/realms/{}/protocol/openid-connect/certs'.format(current_app.config['OIDC_REALM'])
+
+        try:
+            response = client.get(api_path)
+            response.raise_for_status()
+            keys = {}
+            for x in response.json()['keys']:
+                if x.get('use', 'sig') == 'sig' and 'kid' in x:
+                    try:
+                        # アルゴリズムはトークンのヘッダではなく鍵の指定に従う
+                        keys[x['kid']] = (jwt.PyJWK(x).key, x.get('alg', 'RS256'))
+                    except jwt.exceptions.PyJWKError:
+                        # 未対応のアルゴリズムは無視
+                        continue
+
+            self._keys = keys
+            logger.debug("jwks fetched: kids={}".format(list(keys)))
+
+        except ConcurrencyLimitError:
+            # Keycloak が混雑中で手持ちの鍵も無ければ 503 (次の要求で再取得)
+            if not self._keys:
+                raise
+            logger.warning("jwks fetch skipped: keycloak busy")
+
+        except Exception as e:
+            # 取得に失敗した場合は手持ちの鍵を使い続ける
+            logger.warning("jwks fetch failed: {}".format(e))
+
+        self._fetched_at = now
+
+
+class TokenManager:
+
+    def __init__(self, realm, client_id, client_secret, jwks, refresh_margin=60, leeway=30, issuer=None):
+        self.realm = realm
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.jwks = jwks
+        self.refresh_margin = refresh_margin
+        self.leeway = leeway
+        self.issuer = issuer
+        self._refresh_results = {}
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+
+    def decode(self, id_token):
+        # 署名・有効期限・aud を検証して claims を返す
+        if jwt is None:
+            claims = _decode_unverified(id_token)
+            if claims.get('exp', 0) + self.leeway < time.time():
+                raise TokenError("token expired")
+            return claims
+
+        try:
+            header = jwt.get_unverified_header(id_token)
+            key, algorithm = self.jwks.get_key(header.get('kid'))
+            return jwt.decode(
+                id_token,
+                key,
+                algorithms=[algorithm],
+                audience=self.client_id,
+                issuer=self.issuer,
+                leeway=self.leeway,
+            )
+        except jwt.PyJWTError as e:
+            raise TokenError(str(e))
+
+    def request_token(self, body):
+        # トークンエンドポイント呼び出し (password / refresh_token グラント)
+        client = get_client('oidc')
+        api_path = '/realms/{}/protocol/openid-connect/token'.format(self.realm)
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+        body = dict(body, client_id=self.client_id, client_secret=self.client_secret, scope='openid')
+
+        logger.debug("request_url: {}".format(client.url(api_path)))
+        response = client.post(api_path, headers=headers, data=body)
+        response.raise_for_status()
+
+        return response.json()
+
+    def refresh(self, refresh_token):
+        # 同一ユーザーの並行リクエストが揃って更新しないよう refresh_token 毎に直列化し、結果を共有
+        with self._lock:
+            lock = self._refresh_locks.setdefault(refresh_token, threading.Lock())
+
+        with lock:
+            now = time.monotonic()
+            with self._lock:
+                self._refresh_results = {k: v for k, v in self._refresh_results.items() if v[0] > now}
+                item = self._refresh_results.get(refresh_token)
+            if item is not None:
+                return item[1]
+
+            try:
+                tokens = self.request_token({
+                    'grant_type': 'refresh_token',
+                    'refresh_token': refresh_token,
+                })
+                with self._lock:
+                    self._refresh_results[refresh_token] = (now + REFRESH_RESULT_TTL, tokens)
+            finally:
+                with self._lock:
+                    self._refresh_locks.pop(refresh_token, None)
+
+            return tokens
+
+
+def init_app(app):
+
+    if jwt is None:
+        logger.warning("PyJWT not installed, id_token signature is not verified.")
+
+    app.extensions[EXTENSION_KEY] = TokenManager(
+        app.config['OIDC_REALM'],
+        app.config['OIDC_CLIENT_ID'],
+        app.config['OIDC_CLIENT_SECRET'],
+        JwksCache(app.config['OIDC_JWKS_TTL']),
+        refresh_margin=app.config['OIDC_TOKEN_REFRESH_MARGIN'],
+        leeway=app.config['OIDC_TOKEN_LEEWAY'],
+        issuer=app.config['OIDC_ISSUER'],
+    )
+
+def get_token_manager():
+
+    return current_app.extensions[EXTENSION_KEY]
+
+def login(username, password):
+    # パスワードグラントでトークンを取得し、検証してセッションへ保存
+    logger.debug("models.token.login called.")
+
+    manager = get_token_manager()
+    try:
+        tokens = manager.request_token({
+            'grant_type': 'password',
+            'username': username,
+            'password': password,
+        })
+        store_tokens(tokens)
+
+        return tokens
+
+    except ConcurrencyLimitError:
+        # 認証失敗ではないため、呼び出し元で 503 とする
+        raise
+
+    except Exception as e:
+        logger.debug(e)
+        logger.debug("traceback:", exc_info=True)
+
+        return None
+
+def get_service_token():
+    # サービス用アカウント (WARMUP_USERNAME) の id_token。LOGIN_TYPE = basic の場合は None
+    config = current_app.config
+    if config['LOGIN_TYPE'] != 'keycloak':
+        return None
+    if not config['WARMUP_USERNAME']:
+        raise TokenError("service account not configured (WARMUP_USERNAME)")
+
+    manager = get_token_manager()
+    tokens = manager.request_token({
+        'grant_type': 'password',
+        'username': config['WARMUP_USERNAME'],
+        'password': config['WARMUP_PASSWORD'],
+    })
+    # JWKS の取得も兼ねる
+    manager.decode(tokens['id_token'])
+
+    return tokens['id_token']
+
+def store_tokens(tokens):
+
+    claims = get_token_manager().decode(tokens['id_token'])
+
+    session['id_token'] = tokens['id_token']
+    session['refresh_token'] = tokens.get('refresh_token')
+    # 検証済み claims をセッション単位で保持し、以降のリクエストでは再検証しない
+    session['id_token_claims'] = {
+        'sub': claims.get('sub'),
+        'exp': claims.get('exp'),
+    }
+
+def get_valid_id_token():
+    # 有効な id_token を返す。期限が近ければ refresh_token で更新し、更新できなければ None
+    id_token = session.get('id_token')
+    if not id_token:
+        return None
+
+    manager = get_token_manager()
+    claims = session.get('id_token_claims')
+    if claims is None:
+        try:
+            store_tokens({'id_token': id_token, 'refresh_token': session.get('refresh_token')})
+            claims = session['id_token_claims']
+        except TokenError as e:
+            logger.info("invalid id_token: {}".format(e))
+            claims = {'exp': 0}
+
+    if claims['exp'] - time.time() > manager.refresh_margin:
+        return id_token
+
+    busy = None
+    refresh_token = session.get('refresh_token')
+    if refresh_token:
+        try:
+            store_tokens(manager.refresh(refresh_token))
+            logger.debug("id_token refreshed: sub={}".format(session['id_token_claims']['sub']))
+            return session['id_token']
+
+        except ConcurrencyLimitError as e:
+            logger.info("token refresh deferred: {}".format(e))
+            busy = e
+
+        except Exception as e:
+            logger.info("token refresh failed: {}".format(e))
+
+    # 猶予内であれば期限切れまではそのまま使う
+    if claims['exp'] + manager.leeway > time.time():
+        return id_token
+
+    # Keycloak の混雑で更新できなかった場合はログアウトさせずに 503
+    if busy is not None:
+        raise busy
+
+    clear_tokens()
+
+    return None
+
+def clear_tokens():
+
+    session.pop('id_token', None)
+    session.pop('refresh_token', None)
+    session.pop('id_token_claims', None)
+
+def _decode_unverified(id_token):
+
+    try:
+        payload = id_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+
+        return json.loads(base64.urlsafe_b64decode(payload))
+
+    except Exception:
+        raise TokenError("malformed token")
@@ -0,0 +1,145 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import secrets
+import time
+
+from datetime import datetime, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from logging import getLogger
+from werkzeug.datastructures import CallbackDict
+
+logger = getLogger(__name__)
+
+# Redis に保存する値: {"t": 最終有効期限更新時刻, "d": セッションデータ}
+_serializer = TaggedJSONSerializer()
+
+
+class RedisSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, raw=None, refreshed_at=None):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        # 読み込み時の直列化済みデータ (保存時に比較し、変化が無ければ書き込まない)
+        self.raw = raw
+        self.refreshed_at = refreshed_at
+        self.modified = False
+
+
+class RedisSessionInterface(SessionInterface):
+    # 1リクエストあたりの Redis 操作を GET 1回に抑える
+    #   - データに変化が無ければ SET しない
+    #   - 有効期限の延長は refresh_interval 秒に1回だけ
+    #   - 静的ファイルではセッションを読み込まない
+
+    session_class = RedisSession
+
+    def __init__(self, redis, key_prefix='session:', refresh_interval=300):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.refresh_interval = refresh_interval
+
+    def open_session(self, app, request):
+
+        # URL のマッチングより前に呼ばれるため endpoint ではなくパスで判定
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.session_class()
+
+        sid = self._unsign(app, request.cookies.get(self.get_cookie_name(app)))
+        if sid is None:
+            return self.session_class(sid=self._generate_sid())
+
+        value = self.redis.get(self.key_prefix + sid)
+        if value is None:
+            return self.session_class(sid=sid)
+
+        try:
+            stored = _serializer.loads(value.decode('utf-8'))
+            data = stored['d']
+        except Exception as e:
+            # 別形式 (flask_session など) で保存された値は破棄して新規セッションとする
+            logger.debug("invalid session data: {}".format(e))
+            return self.session_class(sid=self._generate_sid())
+
+        return self.session_class(data, sid=sid, raw=_dumps(data), refreshed_at=stored.get('t'))
+
+    def save_session(self, app, session, response):
+
+        if session.sid is None:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # ログアウトなどで空になった場合は削除
+            if session.raw is not None:
+                self.redis.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        raw = _dumps(dict(session))
+        now = time.time()
+        refresh_due = session.refreshed_at is None or now - session.refreshed_at >= self.refresh_interval
+        if raw == session.raw and not refresh_due:
+            return
+
+        # 有効期限付きセッション (PERMANENT_SESSION_LIFETIME)
+        lifetime = app.permanent_session_lifetime
+        self.redis.set(
+            self.key_prefix + session.sid,
+            _serializer.dumps({'t': now, 'd': dict(session)}),
+            ex=int(lifetime.total_seconds()),
+        )
+
+        response.set_cookie(
+            name,
+            self._sign(app, session.sid),
+            expires=datetime.now(timezone.utc) + lifetime,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _generate_sid(self):
+        return secrets.token_urlsafe(32)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='redis-session', key_derivation='hmac')
+
+    def _sign(self, app, sid):
+        return self._signer(app).sign(sid).decode('utf-8')
+
+    def _unsign(self, app, value):
+        if not value:
+            return None
+
+        try:
+            return self._signer(app).unsign(value).decode('utf-8')
+        except BadSignature:
+            return None
+
+
+def _dumps(data):
+
+    return _serializer.dumps(data)
@@ -71,6 +71,49 @@ function textEntities( text ) {
   return text;
 }
 
+/* -------------------------------------------------- *\
+  条件付きGET (ETag / If-None-Match)
+  前回の ETag を送り、304 の場合は保持している内容を返す
+\* -------------------------------------------------- */
+function getWithValidator( url ) {
+  const storageKey = 'validator:' + url,
+        deferred = $.Deferred();
+  let cached = null;
+  try {
+    cached = JSON.parse( sessionStorage.getItem( storageKey ) );
+  } catch( e ) {
+    cached = null;
+  }
+
+  $.ajax({
+    type: 'GET',
+    url: url,
+    dataType: 'json',
+    headers: ( cached )? {'If-None-Match': cached.etag }: {},
+    async: false
+  })
+  .done(function( data, textStatus, jqXHR ){
+    if ( jqXHR.status === 304 && cached ) {
+      deferred.resolve( cached.data, textStatus, jqXHR );
+      return;
+    }
+    const etag = jqXHR.getResponseHeader('ETag');
+    if ( etag ) {
+      try {
+        sessionStorage.setItem( storageKey, JSON.stringify({'etag': etag, 'data': data }));
+      } catch( e ) {
+        // 保存できない場合は毎回取得
+      }
+    }
+    deferred.resolve( data, textStatus, jqXHR );
+  })
+  .fail(function( jqXHR, textStatus, errorThrown ){
+    deferred.reject( jqXHR, textStatus, errorThrown );
+  });
+
+  return deferred.promise();
+}
+
 /* -------------------------------------------------- *\
   モーダル
 \* -------------------------------------------------- */
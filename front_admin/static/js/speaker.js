@@ -94,7 +94,8 @@ $(function(){
     ]
   };
 
-  $('.blockList').find('.event').not('.nodata').on({
+  // 「さらに表示」で追加した要素にも反応するよう委譲で登録
+  $('.blockList').on({
     'click': function( event ){
       event.stopPropagation();
 
@@ -106,11 +107,7 @@ $(function(){
         return;
       }
 
-      $.ajax({
-        type: 'GET',
-        url: '/speaker/' + event_path,
-        async: false
-      })
+      getWithValidator('/speaker/' + event_path)
       .done((data, textStatus, jqXHR) => {
 
         var updateEventData = data;
@@ -149,7 +146,7 @@ $(function(){
         alert('データ読み込みに失敗しました。');
       });
     }
-  });
+  }, '.event:not(.nodata)');
 
   // 個別削除ボタン
   const deleteModalData = {
@@ -165,18 +162,14 @@ $(function(){
     ]
   };
 
-  $('.blockList').find('.eventButton').on({
+  $('.blockList').on({
     'click': function( event ){
       event.stopPropagation();
 
       const $event = $( this ).closest('.event'),
             event_path = $event.attr('data-event-path');
 
-      $.ajax({
-        type: 'GET',
-        url: '/speaker/' + event_path,
-        async: false
-      })
+      getWithValidator('/speaker/' + event_path)
       .done((data, textStatus, jqXHR) => {
 
         var deleteEventData = data;
@@ -210,5 +203,42 @@ $(function(){
         alert('データ読み込みに失敗しました。');
       });
     }
+  }, '.eventButton');
+
+  // さらに表示 (次ページを JSON で取得して追加)
+  $('.blockMore').find('.blockMoreButton').on('click', function(){
+    const $b = $( this ),
+          $list = $('.blockList[data-list="paged"]');
+
+    $b.prop('disabled', true);
+    $.ajax({
+      type: 'GET',
+      url: '/speaker/',
+      data: {'cursor': $b.attr('data-cursor'), 'limit': $b.attr('data-limit')},
+      dataType: 'json'
+    })
+    .done((data, textStatus, jqXHR) => {
+
+      $.each(data.items, function(index, item) {
+        $list.append(''
+          + '<li class="blockItem">'
+          +   '<dl class="event" data-event-path="' + textEntities( String( item.event_path ) ) + '">'
+          +     '<dd class="eventDelete"><button class="eventButton" data-type="delete"></button></dd>'
+          +     '<dd class="eventTitle">' + textEntities( item.event_name ) + '</dd>'
+          +   '</dl>'
+          + '</li>');
+      });
+
+      if (data.next_cursor) {
+        $b.attr('data-cursor', data.next_cursor).prop('disabled', false);
+      } else {
+        $b.closest('.blockMore').remove();
+      }
+    })
+    .fail((jqXHR, textStatus, errorThrown) => {
+
+      $b.prop('disabled', false);
+      alert('データ読み込みに失敗しました。');
+    });
   });
 });
@@ -12,8 +12,87 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-from flask import session
+import hashlib
+import json
+
+from flask import Response, abort, current_app, jsonify, request, session, stream_with_context
+from flask_login import logout_user
+
+from ..models import token
+
+STREAM_BUFFER_SIZE = 16
 
 def get_id_token_from_session():
 
-    return session.get('id_token', None)
+    if not session.get('id_token'):
+        return None
+
+    id_token = token.get_valid_id_token()
+    if id_token is None:
+        # 期限切れで更新もできない場合はバックエンドを呼ばずにログイン画面へ
+        logout_user()
+        session.pop('login', None)
+        abort(current_app.login_manager.unauthorized())
+
+    return id_token
+
+def get_page_params():
+    # 一覧の ?limit=&cursor= を取得 (limit は LIST_PAGE_SIZE_MAX で頭打ち)
+    limit = request.args.get('limit', type=int) or current_app.config['LIST_PAGE_SIZE']
+    limit = min(max(limit, 1), current_app.config['LIST_PAGE_SIZE_MAX'])
+    cursor = request.args.get('cursor') or None
+
+    return limit, cursor
+
+def wants_json():
+    # 「さらに表示」からのページ取得は JSON で返す
+    best = request.accept_mimetypes.best_match(['text/html', 'application/json'])
+
+    return best == 'application/json'
+
+def stream_template(template_name, **context):
+    # 一覧の生成を待たずに先頭から順次送信する
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+
+    return Response(stream_with_context(stream))
+
+def etag_json_response(data):
+    # 正規化した JSON (キー順固定) に対する強い ETag を付与し、If-None-Match が一致すれば 304 (本文なし)
+    body = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(body).hexdigest()[:32])
+    # ブラウザに保持させつつ、表示の都度再検証させる
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+    return response.make_conditional(request)
+
+def get_bulk_items():
+    # 一括登録・更新の要求本文 (オブジェクトの JSON 配列、BULK_MAX_ITEMS 件まで)。不正な場合は None
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items or len(items) > current_app.config['BULK_MAX_ITEMS']:
+        return None
+    if not all(isinstance(x, dict) for x in items):
+        return None
+
+    return items
+
+def bulk_response(items, results, id_key):
+    # 入力順に {index, status[, error]} を返す (登録 201 / 更新 204 / 失敗はバックエンドの応答コードか 502)
+    body = []
+    for index, (item, error) in enumerate(zip(items, results)):
+        if error is None:
+            body.append({'index': index, 'status': 204 if item.get(id_key) is not None else 201})
+            continue
+
+        response = getattr(error, 'response', None)
+        body.append({
+            'index': index,
+            'status': response.status_code if response is not None else 502,
+            'error': 'backend error.',
+        })
+
+    return jsonify(results=body)
@@ -15,67 +15,45 @@
 import json
 
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, jsonify
 from flask_login import login_required
-from logging import getLogger
+from logging import DEBUG, getLogger
 
-from . import get_id_token_from_session
+from . import bulk_response, etag_json_response, get_bulk_items, get_id_token_from_session, get_page_params, stream_template, wants_json
 from ..models import event
+from ..models import fanout
 from ..models import speaker
+from ..models.event_index import server_str_to_datetime
 
 event_app = Blueprint("event", __name__, template_folder="templates")
 logger = getLogger(__name__)
 
+# 一覧 (?list=) の種類
+EVENT_LISTS = ('upcoming', 'archive')
+
 @event_app.route("/", methods=["GET"])
 @login_required
 def event_list():
     logger.info("call: event_list")
 
-    user_info = {
-        "name": "Admin",
-    }
+    # 開催予定・アーカイブとも ?list=upcoming|archive&limit=&cursor= でページ単位に返す (cursor は先頭からの件数)
+    # バックエンドの一覧 API は日付での絞り込み・ページングに未対応のため、全件 (キャッシュ) の索引から切り出す
+    limit, cursor = get_page_params()
+    if cursor is not None and (not is_int(cursor) or int(cursor) < 0):
+        logger.info("Invalid request data: cursor={}".format(cursor))
+        return 'invalid cursor.', 400
+    offset = int(cursor) if cursor else 0
 
-    header_data = {
-        "menu_item_list": [
-            {
-                "name": "speaker list",
-                "url_path": "/speaker",
-            },
-            {
-                "name": "seminar list",
-                "url_path": "/seminar",
-            },
-            {
-                "name": "participant list",
-                "url_path": "/participant",
-            },
-        ],
-    }
+    list_name = request.args.get('list', 'archive')
+    if list_name not in EVENT_LISTS:
+        logger.info("Invalid request data: list={}".format(list_name))
+        return 'invalid list.', 400
 
     id_token = get_id_token_from_session()
     events = event.get_events(id_token)
 
-    upcomings = [x for x in events if server_str_to_datetime(x['event_date']) > datetime.now()]
-    upcomings = sorted(upcomings, key=lambda x:x['event_date'], reverse=True)
-    upcomings = [
-        {
-            'event_path': x['event_id'],
-            'event_name': x['event_name']
-        } for x in upcomings
-    ]
-
-    archives = [x for x in events if server_str_to_datetime(x['event_date']) <= datetime.now()]
-    archives = sorted(archives, key=lambda x:x['event_date'], reverse=True)
-    archives = [
-        {
-            'event_path': x['event_id'],
-            'event_name': x['event_name']
-        } for x in archives
-    ]
-
-    return render_template(
-        "event/event.html", upcomings=upcomings, archives=archives, user_info=user_info, header_data=header_data
-    )
+    return event_list_response(events, limit, offset, id_token, list_name)
 
 @event_app.route("/<int:event_id>", methods=["GET"])
 @login_required
@@ -86,7 +64,7 @@ def event_detail(event_id):
     event_detail = event.get_event_detail(event_id, id_token)
     event_detail['event_date'] = exchange_date_to_client(event_detail['event_date'])
 
-    return event_detail
+    return etag_json_response(event_detail)
 
 @event_app.route("/", methods=["POST"])
 @login_required
@@ -101,6 +79,13 @@ def create_event():
 
     return '', 201
 
+@event_app.route("/bulk", methods=["POST"])
+@login_required
+def bulk_events():
+    logger.info("call: bulk_events")
+
+    return bulk_events_response(get_bulk_items())
+
 @event_app.route("/<int:event_id>", methods=["PUT"])
 @login_required
 def update_event(event_id):
@@ -131,6 +116,15 @@ def delete_event(event_id):
 
     return '', 204
 
+@event_app.route("/master/refresh", methods=["POST"])
+@login_required
+def refresh_master():
+    logger.info("call: refresh_master")
+
+    event.refresh_master()
+
+    return '', 202
+
 @event_app.route("/<int:event_id>/timetable", methods=["GET"])
 @login_required
 def timetable(event_id):
@@ -138,9 +132,121 @@ def timetable(event_id):
 
     id_token = get_id_token_from_session()
 
-    # header準備
-    event_detail = event.get_event_detail(event_id, id_token)
+    # マスタは保持済みの版を参照 (I/O 無し)
+    master = event.get_master(id_token)
+
+    # 独立したバックエンド呼び出しを並列に実行
+    results = fanout.gather({
+        'event_detail': partial(event.get_event_detail, event_id, id_token),
+        'tmp_seminars': partial(event.get_timetable, event_id, id_token=id_token),
+    })
+
+    tmp_seminars = results['tmp_seminars']
+    speaker_id_list = [x.get('speaker_id') for x in tmp_seminars]
+    speakers = speaker.get_speakers_by_ids(speaker_id_list, id_token)
+
+    return timetable_response(event_id, results['event_detail'], tmp_seminars, speakers, master)
+
+def bulk_events_response(items):
+
+    if items is None:
+        return 'invalid data.', 400
+
+    # 書き込み前に全件を検証し、1件でも不正なら何も書き込まない
+    params = []
+    errors = []
+    dates = {}
+    for index, item in enumerate(items):
+        param = dict(item)
+        event_id = param.get('event_id')
+        if event_id is not None and (not isinstance(event_id, (int, str)) or not is_int(event_id)):
+            errors.append({'index': index, 'error': 'invalid event_id.'})
+            continue
+
+        # 同じ日時は1回だけ変換
+        event_date = param.get('event_date')
+        try:
+            if event_date not in dates:
+                dates[event_date] = exchange_date_to_server(event_date)
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'error': 'invalid event_date.'})
+            continue
+
+        param['event_date'] = dates[event_date]
+        params.append(param)
+
+    if errors:
+        logger.info("Invalid request data: {}".format(errors))
+        return jsonify(errors=errors), 400
+
+    id_token = get_id_token_from_session()
+    results = event.bulk_write_events(params, id_token, max_concurrency=current_app.config['BULK_MAX_CONCURRENCY'])
+
+    return bulk_response(params, results, 'event_id')
+
+def event_list_response(events, limit, offset, id_token, list_name='archive'):
+
+    user_info = {
+        "name": "Admin",
+    }
 
+    header_data = {
+        "menu_item_list": [
+            {
+                "name": "speaker list",
+                "url_path": "/speaker",
+            },
+            {
+                "name": "seminar list",
+                "url_path": "/seminar",
+            },
+            {
+                "name": "participant list",
+                "url_path": "/participant",
+            },
+        ],
+    }
+
+    index = event.get_event_index(events, id_token)
+    now = datetime.now()
+    lists = {
+        'upcoming': index.upcomings,
+        'archive': index.archives,
+    }
+
+    def page(list_name, offset):
+        # 次ページの有無を判定するため1件多く取得
+        items = lists[list_name](now, offset, limit + 1)
+        next_cursor = str(offset + limit) if len(items) > limit else None
+
+        return (
+            {
+                'event_path': x['event_id'],
+                'event_name': x['event_name']
+            } for x in items[:limit]
+        ), next_cursor
+
+    if wants_json():
+        items, next_cursor = page(list_name, offset)
+        response = jsonify(items=list(items), next_cursor=next_cursor)
+    else:
+        # 画面は各一覧の先頭ページ (アーカイブは従来どおり cursor から)
+        upcomings, upcoming_cursor = page('upcoming', 0)
+        archives, next_cursor = page('archive', offset)
+
+        response = stream_template(
+            "event/event.html", upcomings=upcomings, upcoming_cursor=upcoming_cursor, archives=archives, next_cursor=next_cursor,
+            limit=limit, user_info=user_info, header_data=header_data
+        )
+
+    # 同じ URL で Accept により HTML / JSON を返し分けるため、キャッシュでも区別させる
+    response.vary.add('Accept')
+
+    return response
+
+def timetable_response(event_id, event_detail, tmp_seminars, speakers, master):
+
+    # header準備
     header_data = {
         "event_name": event_detail['event_name'],
         "menu_item_list": [
@@ -156,15 +262,10 @@ def timetable(event_id):
     }
 
     # body準備
-    tmp_seminars = event.get_timetable(event_id, id_token)
-    #speaker_id_list = [x['speaker_id'] for x in tmp_seminars]
-    #speakers = speaker.get_speaker(speaker_id_list)
-    speakers_dict = {}
-    #speakers_dict = { x['speaker_id']: {
-    #                    'speaker_name': x['speaker_name'],
-    #                    'speaker_profile': x['speaker_profile']
-    #                    } for x in speakers}
-    master = event.get_master(id_token)
+    speakers_dict = { speaker_id: {
+                        'speaker_name': x.get('speaker_name', ''),
+                        'speaker_profile': x.get('speaker_profile', '')
+                        } for speaker_id, x in speakers.items()}
 
     seminars = construct_seminar_data(tmp_seminars, speakers_dict)
     timetable = {
@@ -181,11 +282,6 @@ def client_str_to_datetime(datetime_str):
 
     return datetime.strptime(datetime_str, '%Y/%m/%d %H:%M')
 
-def server_str_to_datetime(datetime_str):
-
-    # return datetime.fromisoformat(datetime_str.replace('Z', '+00:00')) # python3.7~
-    return datetime.strptime(datetime_str, '%Y-%m-%dT%H:%M:%S.%fZ') # not %z, because https://bugs.python.org/issue15873
-
 def exchange_date_to_client(datetime_str):
 
     date_obj = server_str_to_datetime(datetime_str)
@@ -203,14 +299,14 @@ def construct_seminar_data(tmp_seminars, speakers_dict):
     seminar = {}
     for item in tmp_seminars:
 
-        # debug
-        logger.debug(json.dumps(item))
+        # debug (DEBUG 無効時は JSON 化しない)
+        if logger.isEnabledFor(DEBUG):
+            logger.debug(json.dumps(item, default=dict))
 
         block_name = item['block_name']
         class_str = str(server_str_to_datetime(item['start_datetime']).hour)
         seminar_title = item['seminar_name']
-        seminar_author = ''
-        #seminar_author = speakers_dict[item['speaker_id']]['speaker_name']
+        seminar_author = speakers_dict.get(item.get('speaker_id'), {}).get('speaker_name', '')
         if item['participated'] == "true":
             seminar_status = 1
         elif item['capacity_over'] == "true":
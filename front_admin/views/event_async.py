@@ -0,0 +1,145 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import asyncio
+
+from flask import Blueprint, g, request
+from flask_login import login_required
+from logging import getLogger
+
+from . import etag_json_response, get_bulk_items, get_id_token_from_session, get_page_params
+from .event import EVENT_LISTS, bulk_events_response, event_list_response, timetable_response, exchange_date_to_client, exchange_date_to_server, is_int
+from ..models import aio
+from ..models import event
+from ..models import event_async
+from ..models import speaker_async
+
+# views.event の async 版 (ASYNC_VIEWS = True のとき create_app で登録)
+event_app = Blueprint("event", __name__, template_folder="templates")
+logger = getLogger(__name__)
+
+@event_app.route("/", methods=["GET"])
+@login_required
+async def event_list():
+    logger.info("call: event_list")
+
+    limit, cursor = get_page_params()
+    if cursor is not None and (not is_int(cursor) or int(cursor) < 0):
+        logger.info("Invalid request data: cursor={}".format(cursor))
+        return 'invalid cursor.', 400
+    offset = int(cursor) if cursor else 0
+
+    list_name = request.args.get('list', 'archive')
+    if list_name not in EVENT_LISTS:
+        logger.info("Invalid request data: list={}".format(list_name))
+        return 'invalid list.', 400
+
+    id_token = get_id_token_from_session()
+    events = await aio.run(event_async.get_events, id_token)
+
+    return event_list_response(events, limit, offset, id_token, list_name)
+
+@event_app.route("/<int:event_id>", methods=["GET"])
+@login_required
+async def event_detail(event_id):
+    logger.info("call: event_detail [event_id={}]".format(event_id))
+
+    id_token = get_id_token_from_session()
+    event_detail = await aio.run(event_async.get_event_detail, event_id, id_token)
+    event_detail['event_date'] = exchange_date_to_client(event_detail['event_date'])
+
+    return etag_json_response(event_detail)
+
+@event_app.route("/", methods=["POST"])
+@login_required
+async def create_event():
+    logger.info("call: create_event")
+
+    param = request.json
+    param['event_date'] = exchange_date_to_server(param['event_date'])
+
+    id_token = get_id_token_from_session()
+    await aio.run(event_async.create_event, param, id_token)
+
+    return '', 201
+
+@event_app.route("/bulk", methods=["POST"])
+@login_required
+def bulk_events():
+    # 一括書き込みは同期版のモデル (fanout のスレッドプールで並列化) を使う
+    logger.info("call: bulk_events")
+
+    return bulk_events_response(get_bulk_items())
+
+@event_app.route("/<int:event_id>", methods=["PUT"])
+@login_required
+async def update_event(event_id):
+    logger.info("call: update_event [event_id={}]".format(event_id))
+
+    param = request.json
+
+    path_event_id = event_id
+    param_event_id = param.get('event_id', None)
+    if is_int(param_event_id) and path_event_id != int(param_event_id):
+        logger.info("Invalid request data: path_event_id={}, param_event_id={}".format(path_event_id, param_event_id))
+        return 'invalid data.', 400
+
+    param['event_date'] = exchange_date_to_server(param['event_date'])
+
+    id_token = get_id_token_from_session()
+    await aio.run(event_async.update_event, param, id_token)
+
+    return '', 204
+
+@event_app.route("/<int:event_id>", methods=["DELETE"])
+@login_required
+async def delete_event(event_id):
+    logger.info("call: delete_event [event_id={}]".format(event_id))
+
+    id_token = get_id_token_from_session()
+    await aio.run(event_async.delete_event, event_id, id_token)
+
+    return '', 204
+
+@event_app.route("/master/refresh", methods=["POST"])
+@login_required
+def refresh_master():
+    logger.info("call: refresh_master")
+
+    # Redis への通知のみのため同期 view のまま
+    event.refresh_master()
+
+    return '', 202
+
+@event_app.route("/<int:event_id>/timetable", methods=["GET"])
+@login_required
+async def timetable(event_id):
+    logger.info("call: timetable")
+
+    id_token = get_id_token_from_session()
+
+    # マスタは保持済みの版を参照 (I/O 無し)
+    master = event.get_master(id_token)
+
+    # 独立したバックエンド呼び出しを同一イベントループ上で並列に実行
+    event_detail, tmp_seminars = await asyncio.gather(
+        aio.run(event_async.get_event_detail, event_id, id_token),
+        aio.run(event_async.get_timetable, event_id, id_token=id_token),
+    )
+
+    speaker_id_list = [x.get('speaker_id') for x in tmp_seminars]
+    memo = g.setdefault('speaker_memo', {})
+    speakers = await aio.run(speaker_async.get_speakers_by_ids, speaker_id_list, id_token, memo)
+
+    return timetable_response(event_id, event_detail, tmp_seminars, speakers, master)
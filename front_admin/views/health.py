@@ -0,0 +1,32 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from flask import Blueprint, jsonify
+from logging import getLogger
+
+from ..models import health
+
+health_app = Blueprint("health", __name__)
+logger = getLogger(__name__)
+
+@health_app.route("/healthz", methods=["GET"])
+def healthz():
+    # readiness: 事前取得の完了と、バックエンドの疎通 (結果は HEALTH_PROBE_TTL 秒再利用)
+
+    readiness = health.get_readiness()
+    response = jsonify(readiness)
+    response.status_code = 200 if readiness['ready'] else 503
+    response.headers['Cache-Control'] = 'no-store'
+
+    return response
@@ -0,0 +1,28 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from flask import Blueprint
+from logging import getLogger
+
+from .. import metrics
+
+metrics_app = Blueprint("metrics", __name__)
+logger = getLogger(__name__)
+
+@metrics_app.route("/metrics", methods=["GET"])
+def scrape():
+
+    data, content_type = metrics.render()
+
+    return data, 200, {'Content-Type': content_type}
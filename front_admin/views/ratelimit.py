@@ -0,0 +1,134 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# view 用の流量制限
+#   @rate_limit('login_ip', client_ip)        : Redis 上のトークンバケット (全ワーカー共通)
+#   ConcurrencyLimitError                     : サービス毎の同時実行数の上限 (models/client.py) を超えた要求は 503
+# 制限値は RATELIMIT_<NAME> / CONCURRENCY_<NAME> で設定する (settings.py)
+
+import functools
+import hashlib
+import math
+import time
+
+from flask import current_app, request
+from logging import getLogger
+
+from ..models.client import ConcurrencyLimitError
+
+logger = getLogger(__name__)
+
+EXTENSION_KEY = 'ratelimit'
+
+# KEYS[1]: バケット ARGV: 補充速度(個/s), 容量, 現在時刻(s), 消費数
+# 戻り値: {許可 1/0, 再試行までの秒数}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+
+return {allowed, tostring(retry_after)}
+"""
+
+
+def init_app(app):
+
+    redis = app.config.get('SESSION_REDIS')
+    if redis is None and app.config['RATELIMIT_ENABLED']:
+        logger.warning("RATELIMIT_ENABLED requires Redis (REDIS_URL), rate limits disabled.")
+
+    app.extensions[EXTENSION_KEY] = {
+        'script': redis.register_script(TOKEN_BUCKET_SCRIPT) if redis is not None else None,
+    }
+    app.register_error_handler(ConcurrencyLimitError, _service_busy)
+
+def client_ip():
+    # プロキシ配下では PROXY_FIX_X_FOR の設定で ProxyFix が remote_addr を置き換える (front_admin/__init__.py)
+    return request.remote_addr or 'unknown'
+
+def form_value(field):
+    # 例: rate_limit('login_user', form_value('username'))
+
+    def key():
+        value = request.form.get(field, '').strip().lower()
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+    return key
+
+def rate_limit(name, key_func, methods=('POST',)):
+    # RATELIMIT_<NAME> = (回数, 秒) : 秒あたり回数の速度で補充、最大で回数分まで連続可
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method in methods and current_app.config['RATELIMIT_ENABLED']:
+                limit, period = current_app.config['RATELIMIT_{}'.format(name.upper())]
+                retry_after = _take(name, key_func(), limit, period)
+                if retry_after is not None:
+                    logger.warning("rate limited: {}".format(name))
+                    return _too_many_requests(retry_after)
+
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def _take(name, key, limit, period):
+    # 許可された場合は None、拒否された場合は再試行までの秒数を返す
+    script = current_app.extensions[EXTENSION_KEY]['script']
+    if script is None:
+        return None
+
+    try:
+        allowed, retry_after = script(
+            keys=['ratelimit:{}:{}'.format(name, key)],
+            args=[limit / period, limit, time.time(), 1],
+        )
+    except Exception as e:
+        # Redis 障害時は制限せずに通す
+        logger.warning("rate limit check failed: {}".format(e))
+        return None
+
+    if allowed:
+        return None
+
+    return float(retry_after)
+
+def _too_many_requests(retry_after):
+
+    return 'too many requests.', 429, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+def _service_busy(e):
+
+    logger.warning("concurrency limited: {}".format(e))
+    return 'service busy.', 503, {'Retry-After': str(max(1, math.ceil(e.retry_after)))}
@@ -12,11 +12,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required
 from logging import getLogger
 
-from . import get_id_token_from_session
+from . import bulk_response, etag_json_response, get_bulk_items, get_id_token_from_session, get_page_params, stream_template, wants_json
 from ..models import speaker
 
 speaker_app = Blueprint("speaker", __name__, template_folder="templates")
@@ -27,39 +27,16 @@ logger = getLogger(__name__)
 def speaker_list():
     logger.info("call: speaker_list")
 
-    user_info = {
-        "name": "Admin",
-    }
-
-    header_data = {
-        "menu_item_list": [
-            {
-                "name": "event list",
-                "url_path": "/event",
-            },
-            {
-                "name": "seminar list",
-                "url_path": "/seminar",
-            },
-            {
-                "name": "participant list",
-                "url_path": "/participant",
-            },
-        ],
-    }
+    limit, cursor = get_page_params()
 
     id_token = get_id_token_from_session()
-    speakers = speaker.get_speakers(id_token)
-    speakers = [
-        {
-            'event_path': x['speaker_id'],
-            'event_name': x['speaker_name']
-        } for x in speakers
-    ]
+    try:
+        speakers, next_cursor = speaker.get_speaker_page(id_token, limit, cursor)
+    except ValueError:
+        logger.info("Invalid request data: cursor={}".format(cursor))
+        return 'invalid cursor.', 400
 
-    return render_template(
-        "speaker/speaker.html", speakers=speakers, user_info=user_info, header_data=header_data
-    )
+    return speaker_list_response(speakers, next_cursor, limit)
 
 @speaker_app.route("/<int:speaker_id>", methods=["GET"])
 @login_required
@@ -70,7 +47,7 @@ def speaker_detail(speaker_id):
     id_token = get_id_token_from_session()
     speaker_detail = speaker.get_speaker_detail(speaker_id, id_token)
 
-    return speaker_detail
+    return etag_json_response(speaker_detail)
 
 @speaker_app.route("/", methods=["POST"])
 @login_required
@@ -84,6 +61,13 @@ def create_speaker():
 
     return '', 201
 
+@speaker_app.route("/bulk", methods=["POST"])
+@login_required
+def bulk_speakers():
+    logger.info("call: bulk_speakers")
+
+    return bulk_speakers_response(get_bulk_items())
+
 @speaker_app.route("/<int:speaker_id>", methods=["PUT"])
 @login_required
 def update_speaker(speaker_id):
@@ -112,6 +96,70 @@ def delete_speaker(speaker_id):
 
     return '', 204
 
+def bulk_speakers_response(items):
+
+    if items is None:
+        return 'invalid data.', 400
+
+    # 書き込み前に全件を検証し、1件でも不正なら何も書き込まない
+    errors = []
+    for index, item in enumerate(items):
+        speaker_id = item.get('speaker_id')
+        if speaker_id is not None and (not isinstance(speaker_id, (int, str)) or not is_int(speaker_id)):
+            errors.append({'index': index, 'error': 'invalid speaker_id.'})
+
+    if errors:
+        logger.info("Invalid request data: {}".format(errors))
+        return jsonify(errors=errors), 400
+
+    id_token = get_id_token_from_session()
+    results = speaker.bulk_write_speakers(items, id_token, max_concurrency=current_app.config['BULK_MAX_CONCURRENCY'])
+
+    return bulk_response(items, results, 'speaker_id')
+
+def speaker_list_response(speakers, next_cursor, limit):
+
+    user_info = {
+        "name": "Admin",
+    }
+
+    header_data = {
+        "menu_item_list": [
+            {
+                "name": "event list",
+                "url_path": "/event",
+            },
+            {
+                "name": "seminar list",
+                "url_path": "/seminar",
+            },
+            {
+                "name": "participant list",
+                "url_path": "/participant",
+            },
+        ],
+    }
+
+    speakers = (
+        {
+            'event_path': x['speaker_id'],
+            'event_name': x['speaker_name']
+        } for x in speakers
+    )
+
+    if wants_json():
+        response = jsonify(items=list(speakers), next_cursor=next_cursor)
+    else:
+        response = stream_template(
+            "speaker/speaker.html", speakers=speakers, next_cursor=next_cursor, limit=limit,
+            user_info=user_info, header_data=header_data
+        )
+
+    # 同じ URL で Accept により HTML / JSON を返し分けるため、キャッシュでも区別させる
+    response.vary.add('Accept')
+
+    return response
+
 def is_int(s):
     try:
         int(s)
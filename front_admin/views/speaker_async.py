@@ -0,0 +1,101 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from flask import Blueprint, request
+from flask_login import login_required
+from logging import getLogger
+
+from . import etag_json_response, get_bulk_items, get_id_token_from_session, get_page_params
+from .speaker import bulk_speakers_response, speaker_list_response, is_int
+from ..models import aio
+from ..models import speaker_async
+
+# views.speaker の async 版 (ASYNC_VIEWS = True のとき create_app で登録)
+speaker_app = Blueprint("speaker", __name__, template_folder="templates")
+logger = getLogger(__name__)
+
+@speaker_app.route("/", methods=["GET"])
+@login_required
+async def speaker_list():
+    logger.info("call: speaker_list")
+
+    limit, cursor = get_page_params()
+
+    id_token = get_id_token_from_session()
+    try:
+        speakers, next_cursor = await aio.run(speaker_async.get_speaker_page, id_token, limit, cursor)
+    except ValueError:
+        logger.info("Invalid request data: cursor={}".format(cursor))
+        return 'invalid cursor.', 400
+
+    return speaker_list_response(speakers, next_cursor, limit)
+
+@speaker_app.route("/<int:speaker_id>", methods=["GET"])
+@login_required
+async def speaker_detail(speaker_id):
+
+    logger.info("call: speaker_detail [speaker_id={}]".format(speaker_id))
+
+    id_token = get_id_token_from_session()
+    speaker_detail = await aio.run(speaker_async.get_speaker_detail, speaker_id, id_token)
+
+    return etag_json_response(speaker_detail)
+
+@speaker_app.route("/", methods=["POST"])
+@login_required
+async def create_speaker():
+    logger.info("call: create_speaker")
+
+    param = request.json
+
+    id_token = get_id_token_from_session()
+    await aio.run(speaker_async.create_speaker, param, id_token)
+
+    return '', 201
+
+@speaker_app.route("/bulk", methods=["POST"])
+@login_required
+def bulk_speakers():
+    # 一括書き込みは同期版のモデル (fanout のスレッドプールで並列化) を使う
+    logger.info("call: bulk_speakers")
+
+    return bulk_speakers_response(get_bulk_items())
+
+@speaker_app.route("/<int:speaker_id>", methods=["PUT"])
+@login_required
+async def update_speaker(speaker_id):
+    logger.info("call: update_speaker [speaker_id={}]".format(speaker_id))
+
+    param = request.json
+
+    path_speaker_id = speaker_id
+    param_speaker_id = param.get('speaker_id', None)
+    if is_int(param_speaker_id) and path_speaker_id != int(param_speaker_id):
+        logger.info("Invalid request data: path_speaker_id={}, param_speaker_id={}".format(path_speaker_id, param_speaker_id))
+        return 'invalid data.', 400
+
+    id_token = get_id_token_from_session()
+    await aio.run(speaker_async.update_speaker, param, id_token)
+
+    return '', 204
+
+@speaker_app.route("/<int:speaker_id>", methods=["DELETE"])
+@login_required
+async def delete_speaker(speaker_id):
+    logger.info("call: delete_speaker [speaker_id={}]".format(speaker_id))
+
+    id_token = get_id_token_from_session()
+    await aio.run(speaker_async.delete_speaker, speaker_id, id_token)
+
+    return '', 204
@@ -0,0 +1,62 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# gunicorn 設定 (環境変数で上書き可)
+#   GUNICORN_BIND           待ち受けアドレス (既定: 0.0.0.0:5000)
+#   GUNICORN_WORKERS        ワーカープロセス数 (既定: CPU数 * 2 + 1)
+#   GUNICORN_THREADS        ワーカー毎のスレッド数 (gthread、既定: 4)
+#   GUNICORN_WORKER_CLASS   sync / gthread / gevent など (既定: gthread)
+#   GUNICORN_WORKER_CONNECTIONS  gevent 時のワーカー毎の同時接続数 (既定: 1000)
+#   GUNICORN_TIMEOUT        ワーカーのタイムアウト秒 (既定: 30)
+#   GUNICORN_MAX_REQUESTS   ワーカーを入れ替えるまでのリクエスト数 (既定: 10000、0 で無効)
+#   GUNICORN_ACCESSLOG      アクセスログ出力先 (既定: 標準出力、空文字で無効)
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+
+# アプリケーションは fork 前に1回だけ読み込む
+preload_app = True
+# スレッド・接続などプロセス毎の資源は fork 前 (master) では作らず post_fork で各ワーカーに作る
+os.environ['DEFER_WORKER_INIT'] = 'true'
+
+# メモリ断片化対策でワーカーを定期的に入れ替え
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+# アクセスログ (空文字で無効)
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+
+
+def post_fork(server, worker):
+    # fork 後のワーカー毎にバックエンド接続プール・スレッド・Redis 接続を作る
+    from front_admin import init_worker
+    from front_admin.log_config import restart_listener
+    from wsgi import app
+
+    restart_listener()
+    init_worker(app)
+
+def child_exit(server, worker):
+    # 終了したワーカーの Prometheus 集計値を破棄
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,129 @@
 # -*- coding: utf-8 -*-
 
+import os
+
 JSON_AS_ASCII=False
+
+# バックエンドサービス接続先
+SERVICE_EVENT_PROTOCOL = os.environ.get('SERVICE_EVENT_PROTOCOL', 'http')
+SERVICE_EVENT_HOST = os.environ.get('SERVICE_EVENT_HOST')
+SERVICE_EVENT_PORT = os.environ.get('SERVICE_EVENT_PORT', '80')
+
+SERVICE_SPEAKER_PROTOCOL = os.environ.get('SERVICE_SPEAKER_PROTOCOL', 'http')
+SERVICE_SPEAKER_HOST = os.environ.get('SERVICE_SPEAKER_HOST')
+SERVICE_SPEAKER_PORT = os.environ.get('SERVICE_SPEAKER_PORT', '80')
+
+SERVICE_OIDC_PROTOCOL = os.environ.get('OIDC_SERVER_PROTOCOL', 'http')
+SERVICE_OIDC_HOST = os.environ.get('OIDC_SERVER_HOST')
+SERVICE_OIDC_PORT = os.environ.get('OIDC_SERVER_PORT', '80')
+
+# バックエンド接続プール (SERVICE_EVENT_POOL_MAXSIZE などでサービス個別に上書き可)
+SERVICE_POOL_CONNECTIONS = 10
+SERVICE_POOL_MAXSIZE = 10
+
+# バックエンド呼び出しのタイムアウト・リトライ・サーキットブレーカー (SERVICE_EVENT_READ_TIMEOUT などでサービス個別に上書き可)
+SERVICE_CONNECT_TIMEOUT = 3.05 # (s)
+SERVICE_READ_TIMEOUT = 10 # (s)
+SERVICE_RETRIES = 2 # GET のみ
+SERVICE_RETRY_BACKOFF = 0.1 # (s)
+SERVICE_RETRY_BACKOFF_MAX = 1.0 # (s)
+SERVICE_BREAKER_FAILURES = 5 # 連続失敗回数で open
+SERVICE_BREAKER_RESET_TIMEOUT = 30 # (s) open から half_open までの時間
+SERVICE_SINGLEFLIGHT = True # 同一内容 (パス・クエリ・認可ヘッダ) の同時 GET を1回の呼び出しにまとめる
+
+# バックエンド応答キャッシュ (get_events / get_speakers / get_timetable)
+CACHE_ENABLED = True
+CACHE_TTL = 60 # (s)
+CACHE_MAXSIZE = 256
+CACHE_STALE_WHILE_REVALIDATE = 60 # (s) TTL 経過後この間は保持分を返しつつ裏で再取得
+CACHE_STALE_IF_ERROR = 600 # (s) TTL 経過後この間は取得失敗時に保持分を返す
+
+# 応答キャッシュのレプリカ間共有 (L2: SESSION_REDIS 上に保持、更新時の無効化は pub/sub で全レプリカの L1 に通知)
+CACHE_SHARED_ENABLED = True
+CACHE_SHARED_PREFIX = 'front_admin:cache:'
+CACHE_SHARED_RETRY_INTERVAL = 30 # (s) Redis 障害時に L2 を使わない時間・購読の再接続間隔
+
+# バックエンド並列呼び出しの最大スレッド数
+FANOUT_MAX_WORKERS = 16
+
+# 登壇者の一括取得 (True: GET /api/v1/speaker?speaker_id=... / False: 詳細APIを並列取得)
+SPEAKER_BULK_LOOKUP = False
+
+# 一覧のページサイズ (?limit= の既定値と上限)
+LIST_PAGE_SIZE = 50
+LIST_PAGE_SIZE_MAX = 200
+
+# 登壇者一覧の limit/cursor をバックエンドへ渡す (False: 取得した全件をこちらで切り出し)
+SPEAKER_PAGINATION = False
+
+# event / speaker の view を async 版に切り替える (Flask[async] と httpx が必要)
+ASYNC_VIEWS = False
+
+# Prometheus メトリクス (/metrics、prometheus_client が必要。複数プロセス時は PROMETHEUS_MULTIPROC_DIR を設定)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+
+# マスタデータの取得元 (static: 固定値 / backend: GET /api/v1/master をワーカー毎に保持し、参照時は I/O 無し)
+MASTER_SOURCE = os.environ.get('MASTER_SOURCE', 'static')
+MASTER_REFRESH_INTERVAL = 3600 # (s) backend: 経過後の参照時にバックグラウンドで再取得 (ETag があれば If-None-Match)
+MASTER_RETRY_INTERVAL = 30 # (s) backend: 取得失敗時の再試行間隔
+
+# 起動時の共通データ (JWKS・マスタ) の事前取得 (ワーカー毎にバックグラウンドで実行、完了まで /healthz は 503)
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'false').lower() == 'true'
+WARMUP_USERNAME = os.environ.get('WARMUP_USERNAME') # LOGIN_TYPE = keycloak の場合のサービス用アカウント (事前取得と MASTER_SOURCE = backend の初回取得)
+WARMUP_PASSWORD = os.environ.get('WARMUP_PASSWORD')
+WARMUP_TIMEOUT = 120 # (s) バックエンドの応答を待つ上限 (超えた場合は事前取得せずに終了)
+WARMUP_RETRY_INTERVAL = 5 # (s)
+
+# /healthz のバックエンド疎通確認 (500 未満の応答があれば疎通ありとみなす)
+HEALTH_PROBE_PATH = '/'
+HEALTH_PROBE_TIMEOUT = 2 # (s)
+HEALTH_PROBE_TTL = 10 # (s) 確認結果の再利用時間
+
+# プロセス毎の資源 (接続プール・スレッド) を create_app では作らず、呼び出し側で init_worker を呼ぶ (gunicorn.conf.py が設定)
+DEFER_WORKER_INIT = os.environ.get('DEFER_WORKER_INIT', 'false').lower() == 'true'
+
+# ログイン方式 (basic / keycloak)
+LOGIN_TYPE = os.environ.get('LOGIN_TYPE', 'basic')
+
+# セッション保存先 (flask_session: Flask-Session / redis: 変更時のみ書き込む独自実装 front_admin/redis_session.py / cookie: 署名付き Cookie)
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'flask_session')
+SESSION_REDIS_URL = os.environ.get('REDIS_URL')
+SESSION_REDIS_MAX_CONNECTIONS = 20 # ワーカープロセス毎
+SESSION_REDIS_POOL_TIMEOUT = 5 # (s) 接続が空くまでの待ち時間
+SESSION_REFRESH_INTERVAL = 300 # (s) redis: 有効期限の延長間隔
+
+# OIDC (Keycloak) クライアント設定と id_token の検証・更新
+OIDC_REALM = os.environ.get('OIDC_REALM')
+OIDC_CLIENT_ID = os.environ.get('OIDC_CLIENT_ID')
+OIDC_CLIENT_SECRET = os.environ.get('OIDC_CLIENT_SECRET')
+OIDC_ISSUER = os.environ.get('OIDC_ISSUER') # 指定時のみ iss を検証
+OIDC_JWKS_TTL = 300 # (s) 公開鍵の再取得間隔
+OIDC_TOKEN_REFRESH_MARGIN = 60 # (s) 有効期限のこの秒数前から refresh_token で更新
+OIDC_TOKEN_LEEWAY = 30 # (s) 時刻ずれの許容
+
+# 前段のリバースプロキシ (Ingress など) の段数。X-Forwarded-For の右からこの段数目を接続元 IP とする (0: 使わない)
+# プロキシを経由しない構成で 1 以上にすると接続元を詐称できるため、実際の段数と合わせること
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
+
+# 流量制限 (front_admin/views/ratelimit.py)
+RATELIMIT_ENABLED = True
+RATELIMIT_LOGIN_IP = (20, 60) # (回数, 秒) IPアドレス毎
+RATELIMIT_LOGIN_USER = (5, 60) # (回数, 秒) ユーザー名毎
+CONCURRENCY_OIDC = 8 # Keycloak への同時要求数 (ログイン・トークン更新・JWKS、Redis 上で全ワーカー・レプリカ合計。Redis が無い場合はワーカー毎)
+CONCURRENCY_WAIT = 0.1 # (s) 空きを待つ時間 (超えたら 503)
+CONCURRENCY_LEASE = 30 # (s) 解放されなかった枠 (プロセス停止など) を回収するまでの時間
+
+# python3 -m front_admin.assets でビルドした static/dist を使う (未ビルドの場合は元のファイル)
+ASSETS_USE_BUNDLES = True
+
+# 応答の動的圧縮 (brotli 未導入時は gzip のみ)
+COMPRESS_ENABLED = True
+COMPRESS_MIN_SIZE = 1024 # (bytes) 逐次送信の応答は常に圧縮
+COMPRESS_MIMETYPES = ['text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript']
+COMPRESS_LEVEL = 6 # gzip
+COMPRESS_BR_QUALITY = 4 # brotli (0-11、動的圧縮のため低め)
+COMPRESS_EXCLUDE_BLUEPRINTS = [] # 圧縮しない blueprint 名 (例: 'speaker')
+
+# POST /event/bulk, /speaker/bulk
+BULK_MAX_ITEMS = 500 # 1回の要求で受け付ける件数
+BULK_MAX_CONCURRENCY = 4 # バックエンドへの同時書き込み数
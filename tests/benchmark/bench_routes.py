@@ -0,0 +1,237 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 全ルートのベンチマーク (バックエンドはスタブ、Redis 不要)
+#   $ python -m tests.benchmark.bench_routes --duration 5 --concurrency 8 --output result.json
+#   $ python -m tests.benchmark.bench_routes --baseline result.json        # 前回結果との比較
+#   $ python -m tests.benchmark.bench_routes --set ASYNC_VIEWS=true --set CACHE_ENABLED=false
+#
+# ルート毎に duration 秒間 concurrency 本で呼び出し、p50/p95/p99 と rps を表示する。
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+import jinja2
+import requests
+
+from werkzeug.serving import make_server
+
+from .stats import format_table, run_load
+from .stubs import StubServices
+
+# (名前, メソッド, パス, オプション)  パス中の {event_id} / {speaker_id} はスタブのデータ件数から決める
+ROUTES = [
+    ('login form', 'GET', '/login_o', {}),
+    ('login', 'POST', '/login_o', {'data': {'username': 'bench', 'password': 'bench'}}),
+    ('basic login form', 'GET', '/login_b', {}),
+    ('basic login', 'POST', '/login_b', {'data': {'username': 'admin', 'password': 'password'}}),
+    ('event list', 'GET', '/event/', {}),
+    ('event list page (json)', 'GET', '/event/?cursor=50&limit=50', {'headers': {'Accept': 'application/json'}}),
+    ('event detail', 'GET', '/event/{event_id}', {}),
+    ('event detail (304)', 'GET', '/event/{event_id}', {'etag': True}),
+    ('timetable', 'GET', '/event/{event_id}/timetable', {}),
+    ('event create', 'POST', '/event/', {'json': {'event_name': 'bench', 'event_date': '2030/01/01 10:00'}}),
+    ('event update', 'PUT', '/event/{event_id}', {'json': {'event_id': '{event_id}', 'event_name': 'bench', 'event_date': '2030/01/01 10:00'}}),
+    ('event delete', 'DELETE', '/event/{event_id}', {}),
+    ('master refresh', 'POST', '/event/master/refresh', {}),
+    ('event bulk (20)', 'POST', '/event/bulk', {'json': [{'event_name': 'bench {}'.format(i), 'event_date': '2030/01/01 10:00'} for i in range(20)]}),
+    ('speaker list', 'GET', '/speaker/', {}),
+    ('speaker list page (json)', 'GET', '/speaker/?cursor=50&limit=50', {'headers': {'Accept': 'application/json'}}),
+    ('speaker detail', 'GET', '/speaker/{speaker_id}', {}),
+    ('speaker detail (304)', 'GET', '/speaker/{speaker_id}', {'etag': True}),
+    ('speaker create', 'POST', '/speaker/', {'json': {'speaker_name': 'bench', 'speaker_profile': 'bench'}}),
+    ('speaker update', 'PUT', '/speaker/{speaker_id}', {'json': {'speaker_id': '{speaker_id}', 'speaker_name': 'bench', 'speaker_profile': 'bench'}}),
+    ('speaker delete', 'DELETE', '/speaker/{speaker_id}', {}),
+    ('speaker bulk (20)', 'POST', '/speaker/bulk', {'json': [{'speaker_name': 'bench {}'.format(i), 'speaker_profile': 'bench'} for i in range(20)]}),
+    ('seminar', 'GET', '/seminar/', {}),
+    ('mst_seminar', 'GET', '/mst_seminar/', {}),
+    ('participant', 'GET', '/participant/', {}),
+    ('logout', 'GET', '/logout', {}),
+    ('metrics', 'GET', '/metrics', {}),
+    ('healthz', 'GET', '/healthz', {}),
+]
+
+# このツリーに無いテンプレートの代替 (view とモデルの処理を計測するため)
+FALLBACK_TEMPLATES = {
+    'event/timetable.html': '{{ header_data|tojson }}{{ timetable|tojson }}',
+    'seminar/seminar.html': '{{ data|tojson }}',
+    'mst_seminar/mst_seminar.html': '{{ data|tojson }}',
+    'participant/participant.html': '{{ data|tojson }}',
+}
+
+# 計測対象外 (静的ファイル)
+EXCLUDED_ENDPOINTS = ('static', 'assets.dist')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='front_admin route benchmark')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--seminars', type=int, default=20, help='seminars per timetable')
+    parser.add_argument('--speakers', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.005, help='stub latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random stub latency (s)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--routes', default=None, help='regex on route names')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='test_config override (JSON value)')
+    parser.add_argument('--output', default=None, help='write results as JSON')
+    parser.add_argument('--baseline', default=None, help='compare with a previous --output file')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # アクセスログ (werkzeug) は出さない
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    with StubServices(args.events, args.seminars, args.speakers, args.latency, args.jitter) as stubs:
+        app = create_bench_app(stubs, _parse_overrides(args.set))
+        uncovered = uncovered_routes(app)
+        if uncovered:
+            # ルート追加時は ROUTES も更新する (計測漏れのまま結果を比較しない)
+            parser.exit(1, 'not benchmarked (add to ROUTES): {}\n'.format(', '.join(uncovered)))
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = 'http://127.0.0.1:{}'.format(server.server_port)
+
+        ids = {
+            'event_id': args.events // 2,
+            'speaker_id': args.speakers // 2,
+        }
+        rows = []
+        for name, method, path, options in ROUTES:
+            if args.routes and not re.search(args.routes, name):
+                continue
+            if path == '/metrics' and not app.config['METRICS_ENABLED']:
+                continue
+
+            path, options = _resolve(path, options, ids)
+            session_factory = _session_factory(base_url, path if options.pop('etag', False) else None)
+            result = run_load(base_url, path, args.concurrency, args.duration, session_factory, method, **options)
+            rows.append((name, result))
+            print('{:<32} done'.format(name), file=sys.stderr)
+
+        server.shutdown()
+
+    print(format_table(rows, name_title='route'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({name: x for name, x in rows}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print()
+            print(format_comparison(json.load(f), rows))
+
+def create_bench_app(stubs, overrides=None):
+    from front_admin import create_app
+
+    test_config = {
+        'SECRET_KEY': 'bench',
+        'LOGIN_TYPE': 'keycloak',
+        # Redis 無しで動かす
+        'SESSION_BACKEND': 'cookie',
+        'SESSION_REDIS_URL': None,
+        'RATELIMIT_ENABLED': False,
+        'CACHE_SHARED_ENABLED': False,
+    }
+    test_config.update(stubs.config())
+    test_config.update(overrides or {})
+
+    app = create_app(test_config)
+    app.jinja_loader = jinja2.ChoiceLoader([app.jinja_loader, jinja2.DictLoader(FALLBACK_TEMPLATES)])
+
+    return app
+
+def format_comparison(baseline, rows):
+
+    header = '{:<32} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}'.format(
+        'route', 'p50 base', 'p50 now', 'diff', 'rps base', 'rps now', 'diff')
+    lines = [header, '-' * len(header)]
+    for name, x in rows:
+        base = baseline.get(name)
+        if base is None:
+            continue
+        lines.append('{:<32} {:>10.2f} {:>10.2f} {:>7.1f}% {:>10.1f} {:>10.1f} {:>7.1f}%'.format(
+            name,
+            base['p50_ms'], x['p50_ms'], _change(base['p50_ms'], x['p50_ms']),
+            base['rps'], x['rps'], _change(base['rps'], x['rps']),
+        ))
+
+    return '\n'.join(lines)
+
+def _change(before, after):
+
+    return (after - before) / before * 100 if before else 0.0
+
+def _session_factory(base_url, etag_path=None):
+    # スレッド毎に Keycloak スタブ経由でログインしたセッションを作る
+
+    def factory():
+        session = requests.Session()
+        response = session.post(base_url + '/login_o', data={'username': 'bench', 'password': 'bench'}, allow_redirects=False)
+        if response.status_code != 302:
+            raise RuntimeError('login failed: {}'.format(response.status_code))
+
+        if etag_path:
+            # 取得済みの ETag を送る (304 の経路を計測)
+            etag = session.get(base_url + etag_path).headers.get('ETag')
+            session.headers['If-None-Match'] = etag
+
+        return session
+
+    return factory
+
+def _resolve(path, options, ids):
+
+    options = json.loads(json.dumps(options))
+    if isinstance(options.get('json'), dict):
+        options['json'] = {k: v.format(**ids) if isinstance(v, str) else v for k, v in options['json'].items()}
+
+    return path.format(**ids), options
+
+def _parse_overrides(items):
+
+    overrides = {}
+    for item in items:
+        key, value = item.split('=', 1)
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+
+    return overrides
+
+def uncovered_routes(app):
+    # ROUTES に無いルートを "METHOD /rule" で返す (ルート追加時の更新漏れ防止)
+    covered = {(method, re.sub(r'\?.*$', '', path)) for _, method, path, _ in ROUTES}
+    uncovered = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in EXCLUDED_ENDPOINTS:
+            continue
+        pattern = re.sub(r'<(?:\w+:)?(\w+)>', r'{\1}', rule.rule)
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, pattern) not in covered:
+                uncovered.append('{} {}'.format(method, rule.rule))
+
+    return uncovered
+
+
+if __name__ == '__main__':
+    main()
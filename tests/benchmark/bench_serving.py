@@ -0,0 +1,104 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 起動方式毎のスループット比較 (flask 開発サーバ / gunicorn sync / gthread / gevent)
+#   $ python -m tests.benchmark.bench_serving --concurrency 32 --duration 10
+#
+# バックエンドを呼ばない GET /login_b (テンプレート描画のみ) を対象に、サーバ自体の処理能力を比較する。
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+from .stats import format_table, run_load, wait_until_up
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+MODES = {
+    'flask': {
+        'command': ['flask', 'run', '-h', '127.0.0.1', '-p', '{port}', '--with-threads'],
+        'env': {'FLASK_APP': 'front_admin'},
+    },
+    'gunicorn-sync': {
+        'command': ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        'env': {'GUNICORN_WORKER_CLASS': 'sync'},
+    },
+    'gunicorn-gthread': {
+        'command': ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        'env': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    },
+    'gunicorn-gevent': {
+        'command': ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        'env': {'GUNICORN_WORKER_CLASS': 'gevent'},
+    },
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='flask,gunicorn-sync,gunicorn-gthread')
+    parser.add_argument('--path', default='/login_b')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    rows = []
+    for mode in args.modes.split(','):
+        port = _free_port()
+        process = _start(MODES[mode], port, args.workers, args.threads)
+        try:
+            base_url = 'http://127.0.0.1:{}'.format(port)
+            if not wait_until_up(base_url + args.path):
+                print('{}: server did not start'.format(mode), file=sys.stderr)
+                continue
+
+            # ウォームアップ
+            run_load(base_url, args.path, args.concurrency, 1)
+            rows.append((mode, run_load(base_url, args.path, args.concurrency, args.duration)))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+    print(format_table(rows, name_title='mode'))
+
+def _start(mode, port, workers, threads):
+
+    env = dict(os.environ)
+    env.setdefault('REDIS_URL', 'redis://127.0.0.1:6379/0')
+    env.update({
+        'LOG_LEVEL': 'WARNING',
+        'GUNICORN_BIND': '127.0.0.1:{}'.format(port),
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_THREADS': str(threads),
+        'GUNICORN_ACCESSLOG': '',
+    })
+    env.update(mode['env'])
+    command = [x.format(port=port) for x in mode['command']]
+
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+def _free_port():
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+if __name__ == '__main__':
+    main()
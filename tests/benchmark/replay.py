@@ -0,0 +1,237 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 記録したリクエストを稼働中のインスタンスへ再生する負荷ツール
+#   $ python -m tests.benchmark.replay tests/benchmark/traffic.example.jsonl \
+#         --target http://127.0.0.1:5000 --rate 50 --concurrency 16 --duration 60 --loop
+#
+# 入力は 1行 1リクエストの JSON:
+#   {"method": "GET", "path": "/event/", "headers": {...}, "body": {...}, "ts": 1666000000.123}
+#   method (既定 GET)・headers・body (JSON)・ts (記録時刻、--speed 指定時に間隔を再現) は省略可
+#   path の無い行 (バックログなど別形式の JSONL) は読み飛ばす
+#
+# 各ワーカーは開始時に /login_b でログインしたセッションを使う。
+# --rate / --speed 指定時の応答時間は予定送信時刻から計測する (詰まった分の待ち時間も含む)。
+
+import argparse
+import itertools
+import json
+import queue
+import re
+import sys
+import threading
+import time
+
+import requests
+
+from .stats import format_table, summarize
+
+# /event/12/timetable -> /event/{id}/timetable
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def load_records(path):
+
+    records = []
+    skipped = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                x = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(x, dict) or not isinstance(x.get('path'), str):
+                skipped += 1
+                continue
+
+            records.append({
+                'method': x.get('method', 'GET').upper(),
+                'path': x['path'],
+                'headers': x.get('headers') or {},
+                'json': x.get('body'),
+                'ts': x.get('ts'),
+            })
+
+    return records, skipped
+
+def route_of(record):
+
+    return '{} {}'.format(record['method'], _ID_SEGMENT.sub('/{id}', record['path'].split('?', 1)[0]))
+
+def login(target, username, password):
+
+    session = requests.Session()
+    response = session.post(
+        target + '/login_b',
+        data={'username': username, 'password': password},
+        allow_redirects=False,
+    )
+    # 成功時は一覧へ、失敗時はログイン画面へリダイレクトされる
+    if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+        raise RuntimeError('login failed: {} {}'.format(response.status_code, response.headers.get('Location')))
+
+    return session
+
+
+class Replayer:
+
+    def __init__(self, target, records, concurrency=8, rate=0.0, speed=0.0, duration=None, loop=False,
+                 username='admin', password='password', timeout=30):
+        self.target = target.rstrip('/')
+        self.records = records
+        self.concurrency = concurrency
+        self.rate = rate
+        self.speed = speed
+        self.duration = duration
+        self.loop = loop
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=0 if (rate or speed) else concurrency * 2)
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self._statuses = {}
+
+    def run(self):
+        sessions = [login(self.target, self.username, self.password) for _ in range(self.concurrency)]
+        workers = [threading.Thread(target=self._work, args=(x,), daemon=True) for x in sessions]
+        for t in workers:
+            t.start()
+
+        started = time.perf_counter()
+        self._dispatch(started)
+        for _ in workers:
+            self._queue.put(None)
+        for t in workers:
+            t.join()
+
+        elapsed = time.perf_counter() - started
+        rows = [
+            (route, summarize(self._latencies.get(route, []), self._errors.get(route, 0), elapsed))
+            for route in sorted(set(self._latencies) | set(self._errors))
+        ]
+        total = summarize(
+            [x for values in self._latencies.values() for x in values],
+            sum(self._errors.values()),
+            elapsed,
+        )
+
+        return rows, total, self._statuses
+
+    def _dispatch(self, started):
+        # 送信予定時刻を決めてキューへ積む (--rate: 一定間隔 / --speed: 記録時刻の間隔を再現 / 無指定: 空き次第)
+        records = itertools.cycle(self.records) if self.loop else iter(self.records)
+        first_ts = self.records[0]['ts'] if self.records else None
+        offset = 0.0
+
+        for i, record in enumerate(records):
+            if self.speed and record['ts'] is not None and first_ts is not None:
+                if i and i % len(self.records) == 0:
+                    # 繰り返し時は前回の末尾から続ける
+                    offset += (self.records[-1]['ts'] - first_ts) / self.speed
+                scheduled = started + offset + (record['ts'] - first_ts) / self.speed
+            elif self.rate:
+                scheduled = started + i / self.rate
+            else:
+                scheduled = None
+
+            if self.duration is not None and (scheduled or time.perf_counter()) - started >= self.duration:
+                break
+
+            if scheduled is not None:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self._queue.put((scheduled, record))
+
+    def _work(self, session):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            scheduled, record = item
+            route = route_of(record)
+            start = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                response = session.request(
+                    record['method'],
+                    self.target + record['path'],
+                    headers=record['headers'],
+                    json=record['json'],
+                    allow_redirects=False,
+                    timeout=self.timeout,
+                )
+                response.content
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+
+            latency = time.perf_counter() - start
+            with self._lock:
+                key = (route, status)
+                self._statuses[key] = self._statuses.get(key, 0) + 1
+                if isinstance(status, int) and status < 400:
+                    self._latencies.setdefault(route, []).append(latency)
+                else:
+                    self._errors[route] = self._errors.get(route, 0) + 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='replay recorded requests against a running instance')
+    parser.add_argument('file', nargs='?', default='requests.jsonl')
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0.0, help='requests per second (0: as fast as possible)')
+    parser.add_argument('--speed', type=float, default=0.0, help='replay recorded ts spacing at this speed-up')
+    parser.add_argument('--duration', type=float, default=None, help='stop after seconds')
+    parser.add_argument('--loop', action='store_true', help='repeat the file until --duration')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='password')
+    args = parser.parse_args(argv)
+
+    records, skipped = load_records(args.file)
+    if skipped:
+        print('skipped {} lines without a request path'.format(skipped), file=sys.stderr)
+    if not records:
+        print('no requests to replay in {}'.format(args.file), file=sys.stderr)
+        return 1
+    if args.loop and args.duration is None:
+        parser.error('--loop requires --duration')
+
+    replayer = Replayer(
+        args.target, records,
+        concurrency=args.concurrency, rate=args.rate, speed=args.speed,
+        duration=args.duration, loop=args.loop,
+        username=args.username, password=args.password,
+    )
+    rows, total, statuses = replayer.run()
+
+    print(format_table(rows + [('total', total)], name_title='route'))
+    print()
+    for (route, status), count in sorted(statuses.items(), key=lambda x: (x[0][0], str(x[0][1]))):
+        print('{:<40} {:>20} {:>8}'.format(route, status, count))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
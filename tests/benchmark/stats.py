@@ -0,0 +1,108 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# ベンチマーク共通: 負荷生成と応答時間の集計
+
+import threading
+import time
+
+import requests
+
+
+def percentile(sorted_values, q):
+
+    if not sorted_values:
+        return 0.0
+
+    k = (len(sorted_values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(latencies, errors, elapsed):
+
+    values = sorted(latencies)
+
+    return {
+        'requests': len(values) + errors,
+        'errors': errors,
+        'rps': (len(values) + errors) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+    }
+
+def format_table(rows, name_title='name'):
+    # rows: [(名前, summarize() の結果), ...]
+
+    header = '{:<32} {:>8} {:>7} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        name_title, 'requests', 'errors', 'error%', 'rps', 'p50(ms)', 'p95(ms)', 'p99(ms)')
+    lines = [header, '-' * len(header)]
+    for name, x in rows:
+        error_rate = x['errors'] / x['requests'] * 100 if x['requests'] else 0.0
+        lines.append('{:<32} {:>8} {:>7} {:>7.1f} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            name, x['requests'], x['errors'], error_rate, x['rps'], x['p50_ms'], x['p95_ms'], x['p99_ms']))
+
+    return '\n'.join(lines)
+
+def run_load(base_url, path, concurrency, duration, session_factory=None, method='GET', **kwargs):
+    # concurrency 本のスレッドで duration 秒間リクエストを送り続ける
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        session = session_factory() if session_factory else requests.Session()
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, allow_redirects=False, **kwargs)
+                response.content
+                if response.status_code >= 400:
+                    local_errors += 1
+                    continue
+            except requests.RequestException:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - start)
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+def wait_until_up(url, timeout=30):
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+
+    return False
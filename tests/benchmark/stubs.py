@@ -0,0 +1,283 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# ベンチマーク用のバックエンド代替 (event / speaker / Keycloak)
+# 同一プロセス内のスレッドで HTTP サーバを起動し、件数と応答遅延を指定できる
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+
+from datetime import datetime, timedelta
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wrappers import Request, Response
+
+try:
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+except ImportError: # 未導入時は署名無しの id_token を返す (アプリ側も有効期限のみ確認)
+    jwt = None
+
+REALM = 'bench'
+CLIENT_ID = 'front_admin-bench'
+CLIENT_SECRET = 'bench-secret'
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    # 接続を使い回す (HTTP/1.0 では呼び出し毎に接続し直しになり、計測がそちらに引きずられる)
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class StubServer:
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._server = make_server('127.0.0.1', 0, self._wsgi, threaded=True, request_handler=_KeepAliveHandler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _wsgi(self, environ, start_response):
+        request = Request(environ)
+        self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        status, body = self.handle(request)
+        response = Response(json.dumps(body), status=status, content_type='application/json')
+
+        return response(environ, start_response)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+
+class EventStub(StubServer):
+    # GET/POST /api/v1/event, GET/PUT/DELETE /api/v1/event/<id>, /api/v1/event/<id>/timetable, /api/v1/master
+
+    def __init__(self, events=500, seminars=20, speakers=200, **kwargs):
+        super().__init__(**kwargs)
+        now = datetime.utcnow()
+        # 半数を過去 (アーカイブ)、半数を未来のイベントとする
+        self.events = [
+            {
+                'event_id': i,
+                'event_name': 'event {}'.format(i),
+                'event_date': _server_date(now + timedelta(days=i - events // 2)),
+            }
+            for i in range(1, events + 1)
+        ]
+        self.seminars = seminars
+        self.speakers = speakers
+
+    def handle(self, request):
+        path = request.path.rstrip('/')
+        if path == '/api/v1/master':
+            return 200, {'block': ['A', 'B', 'C', 'D'], 'class': [str(x) for x in range(9, 18)]}
+
+        if path == '/api/v1/event':
+            if request.method == 'POST':
+                return 201, {}
+            return 200, self.events
+
+        match = re.match(r'^/api/v1/event/(\d+)(/timetable)?$', path)
+        if match is None:
+            return 404, {}
+
+        event_id = int(match.group(1))
+        if event_id < 1 or event_id > len(self.events):
+            return 404, {}
+        if match.group(2):
+            return 200, self._timetable(event_id)
+        if request.method in ('PUT', 'DELETE'):
+            return 200, {}
+
+        return 200, self.events[event_id - 1]
+
+    def _timetable(self, event_id):
+        date = _parse_date(self.events[event_id - 1]['event_date'])
+        return [
+            {
+                'seminar_id': event_id * 1000 + i,
+                'seminar_name': 'seminar {}'.format(i),
+                'block_name': 'ABCD'[i % 4],
+                'start_datetime': _server_date(date + timedelta(hours=i // 4)),
+                'speaker_id': (event_id + i) % self.speakers + 1,
+                'participated': 'false',
+                'capacity_over': 'false',
+            }
+            for i in range(self.seminars)
+        ]
+
+
+class SpeakerStub(StubServer):
+    # GET/POST /api/v1/speaker (?speaker_id= / ?limit=&cursor=), GET/PUT/DELETE /api/v1/speaker/<id>
+
+    def __init__(self, speakers=200, **kwargs):
+        super().__init__(**kwargs)
+        self.speakers = [
+            {
+                'speaker_id': i,
+                'speaker_name': 'speaker {}'.format(i),
+                'speaker_profile': 'profile of speaker {}. '.format(i) * 4,
+            }
+            for i in range(1, speakers + 1)
+        ]
+
+    def handle(self, request):
+        path = request.path.rstrip('/')
+        if path == '/api/v1/speaker':
+            if request.method == 'POST':
+                return 201, {}
+
+            ids = request.args.getlist('speaker_id', type=int)
+            if ids:
+                return 200, [self.speakers[x - 1] for x in ids if 0 < x <= len(self.speakers)]
+
+            limit = request.args.get('limit', type=int)
+            if limit:
+                cursor = request.args.get('cursor', 0, type=int)
+                items = self.speakers[cursor:cursor + limit]
+                next_cursor = cursor + limit if cursor + limit < len(self.speakers) else None
+                return 200, {'items': items, 'next_cursor': next_cursor}
+
+            return 200, self.speakers
+
+        match = re.match(r'^/api/v1/speaker/(\d+)$', path)
+        if match is None:
+            return 404, {}
+
+        speaker_id = int(match.group(1))
+        if speaker_id < 1 or speaker_id > len(self.speakers):
+            return 404, {}
+        if request.method in ('PUT', 'DELETE'):
+            return 200, {}
+
+        return 200, self.speakers[speaker_id - 1]
+
+
+class KeycloakStub(StubServer):
+    # POST /realms/<realm>/protocol/openid-connect/token (password / refresh_token), GET .../certs
+
+    def __init__(self, token_lifetime=300, **kwargs):
+        super().__init__(**kwargs)
+        self.token_lifetime = token_lifetime
+        self.kid = 'bench'
+        self._key = None
+        if jwt is not None:
+            self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def handle(self, request):
+        prefix = '/realms/{}/protocol/openid-connect/'.format(REALM)
+        if request.path == prefix + 'certs':
+            return 200, {'keys': [self._jwk()] if self._key is not None else []}
+
+        if request.path != prefix + 'token' or request.method != 'POST':
+            return 404, {}
+
+        form = request.form
+        if form.get('client_id') != CLIENT_ID or form.get('client_secret') != CLIENT_SECRET:
+            return 401, {'error': 'unauthorized_client'}
+
+        grant_type = form.get('grant_type')
+        if grant_type == 'password':
+            username = form.get('username', '')
+        elif grant_type == 'refresh_token':
+            username = form.get('refresh_token', '').split(':', 1)[-1]
+        else:
+            return 400, {'error': 'unsupported_grant_type'}
+
+        return 200, {
+            'access_token': 'access',
+            'id_token': self._id_token(username),
+            'refresh_token': 'refresh:{}'.format(username),
+            'expires_in': self.token_lifetime,
+            'token_type': 'Bearer',
+        }
+
+    def _id_token(self, username):
+        now = int(time.time())
+        claims = {'sub': username, 'aud': CLIENT_ID, 'iat': now, 'exp': now + self.token_lifetime}
+        if self._key is not None:
+            return jwt.encode(claims, self._key, algorithm='RS256', headers={'kid': self.kid})
+
+        return '.'.join([
+            _b64(json.dumps({'alg': 'none'})),
+            _b64(json.dumps(claims)),
+            '',
+        ])
+
+    def _jwk(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self._key.public_key()))
+        jwk.update({'kid': self.kid, 'alg': 'RS256', 'use': 'sig'})
+        return jwk
+
+
+class StubServices:
+
+    def __init__(self, events=500, seminars=20, speakers=200, latency=0.0, jitter=0.0):
+        options = {'latency': latency, 'jitter': jitter}
+        self.event = EventStub(events=events, seminars=seminars, speakers=speakers, **options)
+        self.speaker = SpeakerStub(speakers=speakers, **options)
+        self.keycloak = KeycloakStub(**options)
+
+    def __enter__(self):
+        for x in (self.event, self.speaker, self.keycloak):
+            x.start()
+        return self
+
+    def __exit__(self, *exc):
+        for x in (self.event, self.speaker, self.keycloak):
+            x.stop()
+
+    def config(self):
+        # create_app(test_config=...) に渡す接続先
+        return {
+            'SERVICE_EVENT_HOST': '127.0.0.1',
+            'SERVICE_EVENT_PORT': str(self.event.port),
+            'SERVICE_SPEAKER_HOST': '127.0.0.1',
+            'SERVICE_SPEAKER_PORT': str(self.speaker.port),
+            'SERVICE_OIDC_HOST': '127.0.0.1',
+            'SERVICE_OIDC_PORT': str(self.keycloak.port),
+            'OIDC_REALM': REALM,
+            'OIDC_CLIENT_ID': CLIENT_ID,
+            'OIDC_CLIENT_SECRET': CLIENT_SECRET,
+        }
+
+
+def _server_date(value):
+
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def _parse_date(value):
+
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+def _b64(value):
+
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
@@ -0,0 +1,60 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# 単体テスト共通: バックエンド代替 (tests/benchmark/stubs.py) に接続したアプリと Redis 代替 (fakeredis)
+#   $ python -m pytest -q
+
+import pytest
+
+from tests.benchmark.bench_routes import create_bench_app
+from tests.benchmark.stubs import StubServices
+
+
+@pytest.fixture(scope='session')
+def stubs():
+    with StubServices(events=50, seminars=5, speakers=20) as services:
+        yield services
+
+@pytest.fixture
+def make_app(stubs):
+    # 既定はベンチマークと同じ構成 (keycloak ログイン・Cookie セッション・Redis 無し)
+
+    def make(**overrides):
+        return create_bench_app(stubs, overrides)
+
+    return make
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip('fakeredis')
+
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def fake_redis(redis_server):
+    # 同じ redis_server に接続した FakeRedis 同士はデータを共有する (レプリカ間の共有の確認用)
+    import fakeredis
+
+    return fakeredis.FakeRedis(server=redis_server)
+
+@pytest.fixture
+def lua_redis(fake_redis):
+    # 流量制限・同時実行数の上限は Lua スクリプトを使う (fakeredis では lupa が必要)
+    pytest.importorskip('lupa')
+
+    return fake_redis
+
+def login(client, username='alice'):
+
+    return client.post('/login_o', data={'username': username, 'password': 'x'})
@@ -0,0 +1,94 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import gzip
+import hashlib
+import os
+
+import pytest
+
+from front_admin import assets
+
+
+@pytest.fixture
+def dist_dir(tmp_path, monkeypatch):
+    dist_dir = str(tmp_path / 'dist')
+    monkeypatch.setattr(assets, 'DIST_DIR', dist_dir)
+
+    return dist_dir
+
+@pytest.fixture
+def manifest(dist_dir):
+
+    return assets.build(dist_dir=dist_dir)
+
+def read(dist_dir, filename):
+    with open(os.path.join(dist_dir, filename), 'rb') as f:
+        return f.read()
+
+def test_build_writes_fingerprinted_bundles(dist_dir, manifest):
+    assert set(assets.BUNDLES) <= set(manifest)
+    for name, filename in manifest.items():
+        stem, ext = os.path.splitext(os.path.basename(name))
+        data = read(dist_dir, filename)
+        # ファイル名は内容のハッシュ
+        assert filename == '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+
+    # 同じ内容からは同じ名前
+    assert assets.build(dist_dir=dist_dir) == manifest
+
+def test_build_rewrites_css_references(dist_dir, manifest):
+    css = read(dist_dir, manifest['base.css']).decode('utf-8')
+
+    assert manifest['css/seminar.jpg'] in css
+    assert os.path.exists(os.path.join(dist_dir, manifest['css/seminar.jpg']))
+
+def test_build_precompresses_large_text_files(dist_dir, manifest):
+    filename = manifest['base.js']
+
+    assert gzip.decompress(read(dist_dir, filename + '.gz')) == read(dist_dir, filename)
+    assert not os.path.exists(os.path.join(dist_dir, manifest['css/seminar.jpg'] + '.gz'))
+
+def test_templates_use_bundles_from_manifest(make_app, manifest):
+    app = make_app(ASSETS_USE_BUNDLES=True)
+    with app.test_request_context():
+        assert assets.asset_urls('event.js') == ['/static/dist/' + manifest['event.js']]
+
+def test_templates_use_sources_without_bundles(make_app, manifest):
+    app = make_app(ASSETS_USE_BUNDLES=False)
+    with app.test_request_context():
+        assert assets.asset_urls('event.js') == ['/static/js/event.js', '/static/js/datepicker.js']
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip', 'gzip'),
+    ('br, gzip', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('', None),
+])
+def test_dist_serves_precompressed_files(make_app, dist_dir, manifest, accept, encoding):
+    if assets.brotli is None and encoding == 'br':
+        encoding = 'gzip'
+    client = make_app(ASSETS_USE_BUNDLES=True).test_client()
+    filename = manifest['base.js']
+
+    response = client.get('/static/dist/' + filename, headers={'Accept-Encoding': accept})
+
+    assert response.status_code == 200
+    assert response.content_encoding == encoding
+    assert response.data == read(dist_dir, filename + assets.ENCODING_SUFFIXES.get(encoding, ''))
+    assert response.mimetype in ('text/javascript', 'application/javascript')
+    assert response.cache_control.immutable
+    assert 'Accept-Encoding' in response.vary
+    response.close()
@@ -0,0 +1,68 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+from tests.conftest import login
+
+pytest.importorskip('httpx')
+pytest.importorskip('asgiref')
+
+JSON = {'Accept': 'application/json'}
+
+
+@pytest.fixture
+def clients(make_app):
+    # 同じバックエンド代替に接続した同期版・async 版の view
+    clients = []
+    for async_views in (False, True):
+        client = make_app(ASYNC_VIEWS=async_views).test_client()
+        login(client)
+        clients.append(client)
+
+    return clients
+
+def test_async_views_are_registered(clients):
+    views = clients[1].application.view_functions
+
+    assert views['event.event_list'].__module__ == 'front_admin.views.event_async'
+    assert views['speaker.speaker_list'].__module__ == 'front_admin.views.speaker_async'
+
+@pytest.mark.parametrize('url', [
+    '/event/?list=upcoming&limit=5',
+    '/event/?cursor=5&limit=5',
+    '/event/3',
+    '/event/3/timetable',
+    '/speaker/?limit=5',
+    '/speaker/4',
+])
+def test_async_views_match_sync_views(clients, url):
+    sync_response, async_response = [x.get(url, headers=JSON) for x in clients]
+
+    assert async_response.status_code == sync_response.status_code == 200
+    assert async_response.data == sync_response.data
+
+@pytest.mark.parametrize('url', ['/event/?cursor=-1', '/event/?list=past', '/speaker/?cursor=x'])
+def test_async_views_reject_invalid_params(clients, url):
+    assert clients[1].get(url, headers=JSON).status_code == 400
+
+def test_async_writes_reach_backend(clients, stubs):
+    client = clients[1]
+    calls = stubs.speaker.calls
+
+    response = client.put('/speaker/3', json={'speaker_id': 3, 'speaker_name': 'renamed'})
+    assert response.status_code == 204
+    assert client.put('/speaker/3', json={'speaker_id': 4}).status_code == 400
+    assert client.delete('/speaker/3').status_code == 204
+    assert stubs.speaker.calls == calls + 2
@@ -0,0 +1,34 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+from tests.benchmark import bench_routes
+
+
+@pytest.mark.parametrize('overrides', [
+    {},
+    {'ASYNC_VIEWS': True},
+    {'LOGIN_TYPE': 'basic', 'METRICS_ENABLED': True},
+])
+def test_every_route_is_benchmarked(make_app, overrides):
+    assert bench_routes.uncovered_routes(make_app(**overrides)) == []
+
+def test_uncovered_route_fails_the_run(make_app, monkeypatch):
+    monkeypatch.setattr(bench_routes, 'ROUTES', [x for x in bench_routes.ROUTES if x[0] != 'healthz'])
+
+    assert bench_routes.uncovered_routes(make_app()) == ['GET /healthz']
+    with pytest.raises(SystemExit) as e:
+        bench_routes.main(['--events', '10', '--speakers', '10', '--latency', '0'])
+    assert e.value.code == 1
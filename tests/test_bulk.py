@@ -0,0 +1,138 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+from tests.conftest import login
+
+JSON = {'Accept': 'application/json'}
+
+
+class Writes(list):
+    # バックエンドへの書き込み (メソッド, パス, 本文) と同時実行数の最大値を記録する
+
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, handle):
+        def record(request):
+            if request.method == 'GET':
+                return handle(request)
+            with self._lock:
+                self.append((request.method, request.path, request.get_json(silent=True)))
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            try:
+                # 並列度を確認できるよう少し待つ
+                time.sleep(0.01)
+                return handle(request)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        return record
+
+@pytest.fixture
+def writes(stubs, monkeypatch):
+    writes = Writes()
+    for stub in (stubs.event, stubs.speaker):
+        monkeypatch.setattr(stub, 'handle', writes.wrap(stub.handle))
+
+    return writes
+
+@pytest.fixture
+def client(make_app):
+    client = make_app(BULK_MAX_ITEMS=20, BULK_MAX_CONCURRENCY=2).test_client()
+    login(client)
+
+    return client
+
+def test_event_bulk_creates_and_updates(client, writes):
+    response = client.post('/event/bulk', json=[
+        {'event_name': 'new', 'event_date': '2030/01/01 10:00'},
+        {'event_id': 3, 'event_name': 'renamed', 'event_date': '2030/01/01 10:00'},
+        {'event_id': '9999', 'event_name': 'missing', 'event_date': '2030/01/01 10:00'},
+    ])
+
+    assert response.status_code == 200
+    assert response.json['results'] == [
+        {'index': 0, 'status': 201},
+        {'index': 1, 'status': 204},
+        {'index': 2, 'status': 404, 'error': 'backend error.'},
+    ]
+    assert sorted((x[0], x[1]) for x in writes) == [
+        ('POST', '/api/v1/event/'),
+        ('PUT', '/api/v1/event/3'),
+        ('PUT', '/api/v1/event/9999'),
+    ]
+    # 日時はバックエンドの形式に変換して送る
+    assert {x[2]['event_date'] for x in writes} == {'2030-01-01T10:00:00.000000+00:00'}
+
+def test_event_bulk_validates_before_writing(client, writes):
+    response = client.post('/event/bulk', json=[
+        {'event_name': 'ok', 'event_date': '2030/01/01 10:00'},
+        {'event_name': 'bad date', 'event_date': 'tomorrow'},
+        {'event_id': 'x', 'event_name': 'bad id', 'event_date': '2030/01/01 10:00'},
+    ])
+
+    assert response.status_code == 400
+    assert [x['index'] for x in response.json['errors']] == [1, 2]
+    assert writes == []
+
+def test_speaker_bulk_creates_and_updates(client, writes):
+    response = client.post('/speaker/bulk', json=[
+        {'speaker_name': 'new'},
+        {'speaker_id': 2, 'speaker_name': 'renamed'},
+    ])
+
+    assert response.status_code == 200
+    assert [x['status'] for x in response.json['results']] == [201, 204]
+    assert sorted((x[0], x[1]) for x in writes) == [('POST', '/api/v1/speaker/'), ('PUT', '/api/v1/speaker/2')]
+
+def test_speaker_bulk_validates_before_writing(client, writes):
+    response = client.post('/speaker/bulk', json=[{'speaker_name': 'ok'}, {'speaker_id': [1]}])
+
+    assert response.status_code == 400
+    assert response.json['errors'] == [{'index': 1, 'error': 'invalid speaker_id.'}]
+    assert writes == []
+
+@pytest.mark.parametrize('url', ['/event/bulk', '/speaker/bulk'])
+@pytest.mark.parametrize('body', [{'speaker_name': 'x'}, [], ['x'], [{}] * 21])
+def test_bulk_rejects_invalid_body(client, writes, url, body):
+    assert client.post(url, json=body).status_code == 400
+    assert writes == []
+
+def test_bulk_writes_are_bounded(client, writes):
+    response = client.post('/speaker/bulk', json=[{'speaker_name': 'x{}'.format(x)} for x in range(10)])
+
+    assert [x['status'] for x in response.json['results']] == [201] * 10
+    assert writes.max_active == 2
+
+def test_bulk_invalidates_list_once(client, stubs, writes):
+    client.get('/speaker/', headers=JSON)
+    calls = stubs.speaker.calls
+
+    # 一覧はキャッシュから返る
+    client.get('/speaker/', headers=JSON)
+    assert stubs.speaker.calls == calls
+
+    client.post('/speaker/bulk', json=[{'speaker_name': 'x'}, {'speaker_name': 'y'}])
+    client.get('/speaker/', headers=JSON)
+    assert stubs.speaker.calls == calls + 3
@@ -0,0 +1,226 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+
+import pytest
+
+from requests import Response
+
+from front_admin.models import cache
+from front_admin.models.cache import TTLCache
+from front_admin.models.client import get_client
+
+
+class Loader:
+
+    def __init__(self, value=None):
+        self.calls = 0
+        self.error = None
+        self.value = value if value is not None else {'items': [1, 2]}
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class ETagClient:
+    # ETag を返すバックエンドの代替 (If-None-Match が一致すれば 304)
+
+    def __init__(self, etag='"v1"'):
+        self.etag = etag
+        self.sent = []
+
+    def get(self, api_path, headers=None, **kwargs):
+        self.sent.append(headers)
+        response = Response()
+        response.headers['ETag'] = self.etag
+        if headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = b'{"speaker_id": 3}'
+        return response
+
+def test_generation_is_per_service():
+    local = TTLCache(ttl=60, maxsize=10)
+    event_generation = local.generation('event')
+    speaker_generation = local.generation('speaker')
+
+    local.invalidate('speaker')
+
+    assert local.generation('event') == event_generation
+    assert local.generation('speaker') != speaker_generation
+
+    # 取得中に無効化された結果は書き込まない
+    local.set(('speaker', '/api/v1/speaker', '', 'alice'), 'old', generation=speaker_generation)
+    local.set(('event', '/api/v1/event', '', 'alice'), 'new', generation=event_generation)
+    assert local.get(('speaker', '/api/v1/speaker', '', 'alice')) is None
+    assert local.get(('event', '/api/v1/event', '', 'alice')) == 'new'
+
+def test_clear_discards_loads_of_every_service():
+    local = TTLCache(ttl=60, maxsize=10)
+    generation = local.generation('event')
+
+    local.clear()
+    local.set(('event', '/api/v1/event', '', 'alice'), 'old', generation=generation)
+
+    assert len(local) == 0
+
+def test_read_through_caches_until_invalidated(make_app):
+    app = make_app()
+    loader = Loader()
+    with app.test_request_context():
+        first = cache.read_through('event', '/api/v1/event', 'token', loader)
+        second = cache.read_through('event', '/api/v1/event', 'token', loader)
+
+        assert loader.calls == 1
+        assert first is second
+
+        # 他サービスの無効化では再取得しない
+        cache.invalidate('speaker', '/api/v1/speaker')
+        cache.read_through('event', '/api/v1/event', 'token', loader)
+        assert loader.calls == 1
+
+        cache.invalidate('event', '/api/v1/event')
+        cache.read_through('event', '/api/v1/event', 'token', loader)
+        assert loader.calls == 2
+
+def test_read_through_returns_frozen_value(make_app):
+    app = make_app()
+    with app.test_request_context():
+        value = cache.read_through('event', '/api/v1/event', 'token', Loader())
+
+        assert value == {'items': (1, 2)}
+        # 全ての要求で共有するため書き換えられない
+        with pytest.raises(TypeError):
+            value['items'] = []
+
+def test_read_through_serves_stale_if_error(make_app):
+    app = make_app(CACHE_TTL=0, CACHE_STALE_WHILE_REVALIDATE=0, CACHE_STALE_IF_ERROR=60)
+    loader = Loader()
+    with app.test_request_context():
+        value = cache.read_through('event', '/api/v1/event', 'token', loader)
+
+        loader.error = RuntimeError("backend down")
+        assert cache.read_through('event', '/api/v1/event', 'token', loader) is value
+        assert loader.calls == 2
+        assert 'event' in cache.get_stale_services()
+
+def test_read_through_raises_without_stale_value(make_app):
+    app = make_app(CACHE_TTL=0, CACHE_STALE_WHILE_REVALIDATE=0, CACHE_STALE_IF_ERROR=0)
+    loader = Loader()
+    loader.error = RuntimeError("backend down")
+    with app.test_request_context():
+        with pytest.raises(RuntimeError):
+            cache.read_through('event', '/api/v1/event', 'token', loader)
+
+def test_read_through_revalidates_in_background(make_app):
+    app = make_app(CACHE_TTL=0, CACHE_STALE_WHILE_REVALIDATE=60)
+    loader = Loader()
+    with app.test_request_context():
+        value = cache.read_through('event', '/api/v1/event', 'token', loader)
+        loader.value = {'items': [3]}
+
+        # 保持分を返し、裏で再取得
+        assert cache.read_through('event', '/api/v1/event', 'token', loader) is value
+        deadline = time.monotonic() + 5
+        while loader.calls < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert loader.calls == 2
+
+def test_shared_cache_between_replicas(make_app, fake_redis, redis_server):
+    import fakeredis
+
+    config = {'CACHE_SHARED_ENABLED': True, 'CACHE_TTL': 60}
+    first = make_app(SESSION_REDIS=fake_redis, **config)
+    second = make_app(SESSION_REDIS=fakeredis.FakeRedis(server=redis_server), **config)
+    loader = Loader()
+
+    with first.test_request_context():
+        cache.read_through('event', '/api/v1/event', 'token', loader)
+
+    # 他のレプリカの L1 に無くても L2 から返す
+    with second.test_request_context():
+        assert cache.read_through('event', '/api/v1/event', 'token', loader) == {'items': (1, 2)}
+    assert loader.calls == 1
+
+    # 無効化は L2 の世代を進め、全レプリカで再取得させる
+    with first.test_request_context():
+        cache.invalidate('event', '/api/v1/event')
+    with second.test_request_context():
+        cache.get_cache().clear()
+        cache.read_through('event', '/api/v1/event', 'token', loader)
+    assert loader.calls == 2
+
+def test_derive_reuses_data_for_same_value(make_app):
+    app = make_app()
+    builds = []
+
+    def build(value, previous):
+        builds.append(previous)
+        return len(value['items'])
+
+    with app.test_request_context():
+        value = cache.read_through('event', '/api/v1/event', 'token', Loader())
+        assert cache.derive('event', '/api/v1/event', 'token', 'count', value, build) == 2
+        assert cache.derive('event', '/api/v1/event', 'token', 'count', value, build) == 2
+        assert builds == [None]
+
+        # 値が変われば前回のデータを渡して作り直す
+        other = cache.freeze({'items': [1]})
+        assert cache.derive('event', '/api/v1/event', 'token', 'count', other, build) == 1
+        assert builds == [None, 2]
+
+def test_conditional_get_refetches_on_304_without_cached_body(make_app, stubs, monkeypatch):
+    app = make_app()
+    original = stubs.speaker.handle
+    requests = []
+
+    def handle(request):
+        requests.append(dict(request.headers))
+        if request.headers.get('Cache-Control') != 'no-cache':
+            return 304, {}
+        return original(request)
+
+    monkeypatch.setattr(stubs.speaker, 'handle', handle)
+    with app.test_request_context():
+        client = get_client('speaker')
+        body = cache.conditional_get('speaker', client, '/api/v1/speaker/3', 'token', {'If-None-Match': '"x"'})
+
+    assert body['speaker_id'] == 3
+    assert len(requests) == 2
+    assert 'If-None-Match' not in requests[1]
+
+def test_conditional_get_fails_on_repeated_304(make_app, stubs, monkeypatch):
+    app = make_app()
+    monkeypatch.setattr(stubs.speaker, 'handle', lambda request: (304, {}))
+    with app.test_request_context():
+        client = get_client('speaker')
+        with pytest.raises(ValueError):
+            cache.conditional_get('speaker', client, '/api/v1/speaker/3', 'token', {})
+
+def test_conditional_get_does_not_count_cache_stats(make_app):
+    app = make_app()
+    client = ETagClient()
+    with app.test_request_context():
+        assert cache.conditional_get('speaker', client, '/api/v1/speaker/3', 'token', {}) == {'speaker_id': 3}
+        assert cache.conditional_get('speaker', client, '/api/v1/speaker/3', 'token', {}) == {'speaker_id': 3}
+        stats = cache.get_cache().stats()
+
+    assert 'If-None-Match' not in client.sent[0]
+    assert client.sent[1]['If-None-Match'] == '"v1"'
+    # 再検証用の保持分の参照は一覧キャッシュのヒット率に含めない
+    assert (stats['hits'], stats['misses']) == (0, 0)
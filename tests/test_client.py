@@ -0,0 +1,181 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+import time
+
+import pytest
+import requests
+
+from front_admin.models.client import (
+    CircuitBreaker, CircuitOpenError, ConcurrencyLimiter, ConcurrencyLimitError, ServiceClient, SingleFlight,
+)
+
+
+@pytest.fixture
+def event_client(stubs):
+    breaker = CircuitBreaker('event', failure_threshold=1, reset_timeout=0)
+
+    return ServiceClient('event', 'http://127.0.0.1:{}'.format(stubs.event.port), breaker=breaker)
+
+def test_breaker_opens_and_allows_one_probe():
+    breaker = CircuitBreaker('x', failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    # reset_timeout 経過後は1件だけ試行
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+def test_breaker_fails_fast_while_open(event_client):
+    event_client.breaker.reset_timeout = 60
+    event_client.breaker.record_failure()
+
+    calls = []
+    event_client.session.request = lambda *args, **kwargs: calls.append(args)
+    with pytest.raises(CircuitOpenError):
+        event_client.get('/api/v1/event')
+    assert calls == []
+
+def test_unexpected_error_settles_probe(event_client, monkeypatch):
+    event_client.breaker.record_failure()
+
+    def broken(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("broken")
+
+    monkeypatch.setattr(event_client.session, 'request', broken)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        event_client.get('/api/v1/event')
+
+    # 試行の失敗として記録され、half_open のまま止まらない
+    assert event_client.breaker.state == 'open'
+    assert not event_client.breaker._probing
+
+    monkeypatch.undo()
+    assert event_client.get('/api/v1/event').status_code == 200
+    assert event_client.breaker.state == 'closed'
+
+def test_interrupted_probe_is_released(event_client, monkeypatch):
+    event_client.breaker.record_failure()
+
+    class Interrupted(BaseException):
+        pass
+
+    def interrupted(*args, **kwargs):
+        raise Interrupted()
+
+    monkeypatch.setattr(event_client.session, 'request', interrupted)
+    with pytest.raises(Interrupted):
+        event_client.get('/api/v1/event')
+
+    assert event_client.breaker.state == 'half_open'
+    assert event_client.breaker.allow()
+
+def test_singleflight_coalesces_concurrent_calls():
+    flight = SingleFlight('x')
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', load)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do('key', load)))
+    follower.start()
+    while flight.snapshot()['coalesced'] == 0:
+        time.sleep(0.01)
+    finish.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == [1]
+    assert results == ['value', 'value']
+    assert flight.snapshot() == {'leaders': 1, 'coalesced': 1, 'in_flight': 0}
+
+def test_singleflight_shares_error():
+    flight = SingleFlight('x')
+    started = threading.Event()
+    finish = threading.Event()
+
+    def load():
+        started.set()
+        finish.wait(5)
+        raise ValueError("failed")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', load)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.snapshot()['coalesced'] == 0:
+        time.sleep(0.01)
+    finish.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+    # 失敗後は次の呼び出しで再実行
+    assert flight.do('key', lambda: 'retry') == 'retry'
+
+def test_concurrency_limiter_rejects_quickly():
+    limiter = ConcurrencyLimiter('oidc', 1, wait=0.01)
+    token = limiter.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(ConcurrencyLimitError):
+        limiter.acquire()
+    assert time.monotonic() - start < 1
+
+    limiter.release(token)
+    limiter.release(limiter.acquire())
+
+def test_concurrency_limiter_is_shared_through_redis(lua_redis):
+    # ワーカー・レプリカ毎のインスタンスが Redis 上の枠を共有する
+    first = ConcurrencyLimiter('oidc', 2, redis=lua_redis, wait=0.01, lease=1)
+    second = ConcurrencyLimiter('oidc', 2, redis=lua_redis, wait=0.01, lease=1)
+
+    tokens = [first.acquire(), second.acquire()]
+    with pytest.raises(ConcurrencyLimitError):
+        first.acquire()
+
+    second.release(tokens[0])
+    tokens[0] = first.acquire()
+
+    # 解放されなかった枠は lease 経過後に回収
+    time.sleep(1.1)
+    assert second.acquire() is not None
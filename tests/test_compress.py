@@ -0,0 +1,117 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import gzip
+import zlib
+
+import pytest
+
+from flask import jsonify, stream_with_context
+
+from front_admin import compress
+from tests.conftest import login
+
+ITEMS = [{'event_id': x, 'event_name': 'event {}'.format(x)} for x in range(200)]
+
+
+@pytest.fixture
+def client(make_app):
+    app = make_app(COMPRESS_ENABLED=True, COMPRESS_MIN_SIZE=1024)
+
+    @app.route('/items')
+    def items():
+        return jsonify(items=ITEMS)
+
+    @app.route('/small')
+    def small():
+        return jsonify(items=ITEMS[:1])
+
+    @app.route('/stream')
+    def stream():
+        chunks = ('<p>{}</p>\n'.format(x) for x in range(200))
+        return app.response_class(stream_with_context(chunks), mimetype='text/html')
+
+    return app.test_client()
+
+def decode(response):
+    if response.content_encoding == 'gzip':
+        return gzip.decompress(response.data)
+    if response.content_encoding == 'br':
+        return pytest.importorskip('brotli').decompress(response.data)
+    return response.data
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip', 'gzip'),
+    ('gzip, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+    ('gzip;q=0', None),
+    ('identity', None),
+    ('', None),
+])
+def test_encoding_follows_quality_values(client, accept, encoding):
+    if compress.brotli is None and encoding == 'br':
+        encoding = 'gzip'
+
+    response = client.get('/items', headers={'Accept-Encoding': accept})
+
+    assert response.content_encoding == encoding
+    assert 'Accept-Encoding' in response.vary
+    assert decode(response) == client.get('/items').data
+
+def test_gzip_is_used_without_brotli(client, monkeypatch):
+    monkeypatch.setattr(compress, 'brotli', None)
+
+    assert client.get('/items', headers={'Accept-Encoding': 'br, gzip'}).content_encoding == 'gzip'
+    assert client.get('/items', headers={'Accept-Encoding': 'br'}).content_encoding is None
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.content_encoding is None
+    assert 'Accept-Encoding' in response.vary
+
+def test_streamed_response_is_compressed_per_chunk(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+
+    assert response.content_encoding == 'gzip'
+    assert 'Content-Length' not in response.headers
+    # 各チャンクの終わりで flush するため、受信済みの分だけで展開できる
+    decompressor = zlib.decompressobj(31)
+    first = decompressor.decompress(next(response.response))
+    assert first.startswith(b'<p>0</p>')
+    response.close()
+
+def test_streamed_page_is_compressed(make_app):
+    client = make_app(COMPRESS_ENABLED=True).test_client()
+    login(client)
+
+    plain = client.get('/event/')
+    response = client.get('/event/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.content_encoding == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+
+def test_strong_etag_is_weakened(make_app):
+    client = make_app(COMPRESS_ENABLED=True, COMPRESS_MIN_SIZE=0).test_client()
+    login(client)
+
+    response = client.get('/event/3', headers={'Accept-Encoding': 'gzip'})
+    etag, weak = response.get_etag()
+    assert response.content_encoding == 'gzip'
+    assert weak
+
+    revalidated = client.get('/event/3', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
@@ -0,0 +1,80 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from datetime import datetime, timedelta
+
+from front_admin.models import event_index
+from front_admin.models.event_index import EventIndex
+
+BASE = datetime(2022, 6, 1)
+
+
+def make_event(event_id, days, name=None):
+    date = (BASE + timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    return {'event_id': event_id, 'event_date': date, 'event_name': name or 'event{}'.format(event_id)}
+
+def ids(events):
+    return [x['event_id'] for x in events]
+
+def test_split_and_pages_in_descending_order():
+    index = EventIndex([make_event(x, x) for x in (3, 1, 4, 0, 2)])
+
+    # BASE + 2日 (当日を含む) まではアーカイブ
+    now = BASE + timedelta(days=2)
+    assert index.split(now) == 3
+    assert ids(index.archives(now)) == [2, 1, 0]
+    assert ids(index.archives(now, offset=1, limit=1)) == [1]
+    assert ids(index.upcomings(now)) == [4, 3]
+    assert ids(index.upcomings(now, offset=2)) == []
+    assert ids(index.range(BASE + timedelta(days=1), BASE + timedelta(days=3))) == [1, 2]
+
+def test_rebuild_inserts_changes_in_place(monkeypatch):
+    events = [make_event(x, x) for x in range(5)]
+    index = EventIndex(events)
+
+    # 削除 (1)・日付の変更 (3)・追加 (5)・名前の変更 (0)
+    changed = [make_event(0, 0, 'renamed'), events[2], make_event(3, -1), events[4], make_event(5, 2)]
+    parsed = []
+    original = event_index.server_str_to_datetime
+    monkeypatch.setattr(event_index, 'server_str_to_datetime', lambda x: parsed.append(x) or original(x))
+    rebuilt = index.rebuild(changed)
+
+    # 変更の無いイベントは再解析しない
+    assert len(parsed) == 2
+    assert ids(rebuilt.range(BASE - timedelta(days=10), BASE + timedelta(days=10))) == [3, 0, 2, 5, 4]
+    assert rebuilt.archives(BASE)[0]['event_name'] == 'renamed'
+    # 元の索引は変わらない
+    assert ids(index.upcomings(BASE)) == [4, 3, 2, 1]
+
+def test_rebuild_keeps_order_of_equal_dates():
+    index = EventIndex([make_event(1, 1), make_event(2, 1)])
+    rebuilt = index.rebuild([make_event(1, 1), make_event(2, 1), make_event(3, 1)])
+
+    assert ids(rebuilt.range(BASE, BASE + timedelta(days=2))) == [1, 2, 3]
+
+def test_rebuild_sorts_again_on_many_changes(monkeypatch):
+    monkeypatch.setattr(event_index, 'REBUILD_MAX_INSERTS', 2)
+    index = EventIndex([make_event(0, 0)])
+    events = [make_event(x, -x) for x in range(4)]
+
+    rebuilt = index.rebuild(events)
+    assert ids(rebuilt.upcomings(BASE - timedelta(days=10))) == [0, 1, 2, 3]
+
+def test_rebuild_sorts_again_on_duplicates():
+    index = EventIndex([make_event(0, 0)])
+    rebuilt = index.rebuild([make_event(0, 0), make_event(1, 1), make_event(1, 1)])
+
+    assert len(rebuilt) == 3
+    assert ids(rebuilt.upcomings(BASE - timedelta(days=1))) == [1, 1, 0]
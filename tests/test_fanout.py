@@ -0,0 +1,54 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+
+from functools import partial
+from flask import current_app, has_request_context
+
+from front_admin.models import cache
+from front_admin.models import fanout
+
+
+def test_workers_run_with_app_context_only(make_app):
+    app = make_app()
+    with app.test_request_context():
+        results = fanout.gather({
+            'request': has_request_context,
+            'app': lambda: current_app.name,
+        })
+
+    assert results == {'request': False, 'app': app.name}
+
+def test_stale_marks_reach_the_request(make_app):
+    app = make_app()
+    with app.test_request_context():
+        fanout.gather({'event': partial(cache.mark_stale, 'event')})
+
+        assert cache.get_stale_services() == {'event'}
+
+def test_worker_outlives_the_request(make_app):
+    app = make_app()
+    release = threading.Event()
+
+    def task():
+        release.wait(5)
+        return current_app.config['FANOUT_MAX_WORKERS']
+
+    with app.test_request_context():
+        future = fanout.submit(task)
+
+    # 要求の終了 (teardown) 後もワーカーは動き続ける
+    release.set()
+    assert future.result(5) == app.config['FANOUT_MAX_WORKERS']
@@ -0,0 +1,104 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+
+import pytest
+
+from flask import current_app
+
+from front_admin.models import health
+
+JSON = {'Accept': 'application/json'}
+
+
+@pytest.fixture
+def paths(stubs, monkeypatch):
+    # イベント・登壇者サービスへの要求のパスを記録する
+    paths = []
+    for stub in (stubs.event, stubs.speaker):
+        def handle(request, original=stub.handle):
+            paths.append(request.path)
+            return original(request)
+
+        monkeypatch.setattr(stub, 'handle', handle)
+
+    return paths
+
+def wait_warmup(app):
+    with app.app_context():
+        warmup = current_app.extensions[health.EXTENSION_KEY]
+    deadline = time.monotonic() + 10
+    while not warmup.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    return warmup
+
+def test_healthz_is_ready_when_backends_respond(make_app):
+    client = make_app(WARMUP_ENABLED=False).test_client()
+
+    response = client.get('/healthz')
+
+    assert response.status_code == 200
+    assert response.json['ready']
+    assert response.json['warmup'] == 'disabled'
+    assert sorted(response.json['backends']) == ['event', 'oidc', 'speaker']
+    assert response.headers['Cache-Control'] == 'no-store'
+
+def test_healthz_is_not_ready_when_backend_fails(make_app, stubs, monkeypatch):
+    client = make_app(WARMUP_ENABLED=False, HEALTH_PROBE_TTL=0).test_client()
+    monkeypatch.setattr(stubs.speaker, 'handle', lambda request: (503, {}))
+
+    response = client.get('/healthz')
+
+    assert response.status_code == 503
+    assert response.json['backends']['speaker'] == {'ok': False, 'detail': '503', 'age': 0.0}
+    assert response.json['backends']['event']['ok']
+
+def test_probe_results_are_reused_within_ttl(make_app, paths):
+    client = make_app(WARMUP_ENABLED=False, HEALTH_PROBE_TTL=60).test_client()
+
+    client.get('/healthz')
+    client.get('/healthz')
+
+    assert paths.count('/') == 2
+
+def test_warmup_prefetches_catalog_for_basic_login(make_app, paths):
+    app = make_app(LOGIN_TYPE='basic', WARMUP_ENABLED=True)
+
+    assert wait_warmup(app).state == 'done'
+    assert '/api/v1/event' in paths
+    assert '/api/v1/speaker' in paths
+
+    # 全員が同じ利用者 (anonymous) として共有するため、初期表示はバックエンドを呼ばない
+    client = app.test_client()
+    client.post('/login_b', data={'username': 'admin', 'password': 'password'})
+    del paths[:]
+    assert client.get('/event/').status_code == 200
+    assert client.get('/speaker/').status_code == 200
+    assert paths == []
+
+def test_warmup_skips_catalog_for_keycloak_login(make_app, paths):
+    app = make_app(LOGIN_TYPE='keycloak', WARMUP_ENABLED=True, WARMUP_USERNAME='service', WARMUP_PASSWORD='x')
+
+    assert wait_warmup(app).state == 'done'
+    assert '/api/v1/event' not in paths
+    assert '/api/v1/speaker' not in paths
+
+def test_warmup_times_out_without_backends(make_app, stubs, monkeypatch):
+    monkeypatch.setattr(stubs.event, 'handle', lambda request: (503, {}))
+    app = make_app(LOGIN_TYPE='basic', WARMUP_ENABLED=True, WARMUP_TIMEOUT=0, HEALTH_PROBE_TTL=0)
+
+    assert wait_warmup(app).state == 'timeout'
+    assert app.test_client().get('/healthz').status_code == 503
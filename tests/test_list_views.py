@@ -0,0 +1,78 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+from tests.conftest import login
+
+JSON = {'Accept': 'application/json'}
+
+
+@pytest.fixture
+def client(make_app):
+    client = make_app().test_client()
+    login(client)
+
+    return client
+
+def read_pages(client, url, limit, **params):
+    ids = []
+    cursor = None
+    while True:
+        query = dict(params, limit=limit)
+        if cursor is not None:
+            query['cursor'] = cursor
+        response = client.get(url, query_string=query, headers=JSON)
+        assert response.status_code == 200
+        assert len(response.json['items']) <= limit
+        ids += [x['event_path'] for x in response.json['items']]
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            return ids
+
+def test_event_lists_are_paged(client):
+    upcomings = read_pages(client, '/event/', 7, list='upcoming')
+    archives = read_pages(client, '/event/', 7, list='archive')
+
+    # どちらも日付の降順で、合わせて全件を重複なく返す
+    assert upcomings == sorted(upcomings, reverse=True)
+    assert archives == sorted(archives, reverse=True)
+    assert sorted(upcomings + archives) == list(range(1, 51))
+    assert min(upcomings) > max(archives)
+
+def test_archive_is_default_list(client):
+    default = client.get('/event/', query_string={'limit': 5}, headers=JSON)
+    archive = client.get('/event/', query_string={'list': 'archive', 'limit': 5}, headers=JSON)
+
+    assert default.json == archive.json
+
+@pytest.mark.parametrize('query', [{'cursor': '-1'}, {'cursor': 'x'}, {'list': 'past'}])
+def test_event_list_rejects_invalid_params(client, query):
+    assert client.get('/event/', query_string=query, headers=JSON).status_code == 400
+
+def test_speaker_list_is_paged(client):
+    assert read_pages(client, '/speaker/', 6) == list(range(1, 21))
+
+@pytest.mark.parametrize('cursor', ['-1', 'x'])
+def test_speaker_list_rejects_invalid_cursor(client, cursor):
+    assert client.get('/speaker/', query_string={'cursor': cursor}, headers=JSON).status_code == 400
+
+@pytest.mark.parametrize('url', ['/event/', '/speaker/'])
+@pytest.mark.parametrize('accept', ['text/html', 'application/json'])
+def test_list_varies_on_accept(client, url, accept):
+    response = client.get(url, headers={'Accept': accept})
+
+    assert response.status_code == 200
+    assert response.mimetype == accept
+    assert 'Accept' in response.vary
@@ -0,0 +1,148 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import time
+
+import pytest
+
+from requests import Response
+
+from front_admin.models import master
+from front_admin.models.master import DEFAULT_MASTER, MasterStore
+from tests.conftest import login
+
+MASTER = {'block': ['A', 'B'], 'class': ['9', '10']}
+
+
+class MasterBackend:
+    # /api/v1/master の代替 (etag を指定すると ETag を返し、If-None-Match が一致すれば 304)
+
+    def __init__(self, data=MASTER, etag=None):
+        self.data = data
+        self.etag = etag
+        self.error = None
+        self.sent = []
+
+    def url(self, api_path):
+        return api_path
+
+    def get(self, api_path, headers=None, **kwargs):
+        self.sent.append(headers)
+        if self.error is not None:
+            raise self.error
+
+        response = Response()
+        if self.etag is not None:
+            response.headers['ETag'] = self.etag
+        if self.etag is not None and headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = json.dumps(self.data).encode('utf-8')
+        return response
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = MasterBackend()
+    monkeypatch.setattr(master, 'get_client', lambda name: backend)
+
+    return backend
+
+def digest(data):
+
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def test_static_source_does_not_call_backend(app, backend):
+    snapshot = MasterStore('static').get('token')
+
+    assert snapshot.data == master.cache.freeze(DEFAULT_MASTER)
+    assert snapshot.version == 'static'
+    assert backend.sent == []
+
+def test_version_is_content_hash_and_etag_is_sent(app, backend):
+    backend.etag = '"m1"'
+    store = MasterStore('backend')
+
+    snapshot = store.get('token')
+    assert snapshot.data['block'] == ('A', 'B')
+    assert snapshot.version == digest(MASTER)
+    assert snapshot.etag == '"m1"'
+    assert 'If-None-Match' not in backend.sent[0]
+
+    # 再検証にはバックエンドの ETag のみを送り、304 なら同じ版のまま
+    assert not store.refresh('token')
+    assert backend.sent[1]['If-None-Match'] == '"m1"'
+    current = store.get('token')
+    assert current.data is snapshot.data
+    assert (current.version, current.etag) == (snapshot.version, snapshot.etag)
+
+def test_version_ignores_etag_only_changes(app, backend):
+    backend.etag = '"m1"'
+    store = MasterStore('backend')
+    snapshot = store.get('token')
+
+    backend.etag = '"m2"'
+    assert not store.refresh('token')
+    assert store.get('token').data is snapshot.data
+    assert store.get('token').version == snapshot.version
+    assert store.get('token').etag == '"m2"'
+
+def test_backend_without_etag_is_compared_by_content(app, backend):
+    store = MasterStore('backend')
+    store.get('token')
+
+    assert not store.refresh('token')
+    assert 'If-None-Match' not in backend.sent[1]
+
+    backend.data = dict(MASTER, block=['A'])
+    assert store.refresh('token')
+    assert store.get('token').version == digest(backend.data)
+
+def test_failed_load_serves_default_and_retries(app, backend):
+    backend.error = RuntimeError("backend down")
+    store = MasterStore('backend', retry_interval=0)
+
+    assert store.get('token').data == master.cache.freeze(DEFAULT_MASTER)
+
+    backend.error = None
+    deadline = time.monotonic() + 5
+    while store.get('token').version != digest(MASTER) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.get('token').version == digest(MASTER)
+
+def test_refresh_route_reloads_on_next_access(make_app, backend):
+    app = make_app(MASTER_SOURCE='backend', MASTER_REFRESH_INTERVAL=3600)
+    client = app.test_client()
+    login(client)
+    with app.app_context():
+        store = master.get_master_store()
+        store.get('token')
+    backend.data = dict(MASTER, block=['Z'])
+
+    assert client.post('/event/master/refresh').status_code == 202
+
+    with app.app_context():
+        store.get('token')
+        deadline = time.monotonic() + 5
+        while store.get('token').data['block'] != ('Z',) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.get('token').data['block'] == ('Z',)
@@ -0,0 +1,75 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from front_admin.models.client import get_client
+from front_admin.views import ratelimit
+from tests.conftest import login
+
+
+def test_login_is_rate_limited_per_user(make_app, lua_redis):
+    app = make_app(SESSION_REDIS=lua_redis, RATELIMIT_ENABLED=True, RATELIMIT_LOGIN_USER=(2, 60))
+    client = app.test_client()
+
+    assert login(client, 'alice').status_code == 302
+    assert login(client, 'alice').status_code == 302
+
+    response = login(client, 'alice')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    # 別のユーザー名は制限されない
+    assert login(client, 'bob').status_code == 302
+
+def test_rate_limit_is_skipped_without_redis(make_app):
+    app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_LOGIN_USER=(1, 60))
+    client = app.test_client()
+
+    assert login(client).status_code == 302
+    assert login(client).status_code == 302
+
+def test_rate_limit_passes_when_redis_fails(make_app, lua_redis, monkeypatch):
+    app = make_app(SESSION_REDIS=lua_redis, RATELIMIT_ENABLED=True, RATELIMIT_LOGIN_USER=(1, 60))
+    client = app.test_client()
+
+    def broken(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setitem(app.extensions[ratelimit.EXTENSION_KEY], 'script', broken)
+    assert login(client).status_code == 302
+    assert login(client).status_code == 302
+
+def test_busy_keycloak_returns_503(make_app):
+    app = make_app(CONCURRENCY_OIDC=1)
+    with app.app_context():
+        limiter = get_client('oidc').limiter
+
+    token = limiter.acquire()
+    try:
+        response = login(app.test_client())
+    finally:
+        limiter.release(token)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_client_ip_uses_trusted_forwarded_for(make_app):
+    headers = {'X-Forwarded-For': '192.0.2.1, 198.51.100.7'}
+    environ = {'REMOTE_ADDR': '10.0.0.1'}
+
+    for hops, expected in ((0, '10.0.0.1'), (1, '198.51.100.7'), (2, '192.0.2.1')):
+        app = make_app(PROXY_FIX_X_FOR=hops)
+        app.add_url_rule('/ip', 'ip', ratelimit.client_ip)
+        response = app.test_client().get('/ip', headers=headers, environ_base=environ)
+
+        assert response.get_data(as_text=True) == expected
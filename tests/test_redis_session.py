@@ -0,0 +1,96 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+from flask import session
+
+
+@pytest.fixture
+def app(make_app, fake_redis):
+    app = make_app(SESSION_BACKEND='redis', SESSION_REDIS=fake_redis, SESSION_REFRESH_INTERVAL=300)
+
+    @app.route('/session/<value>', methods=['POST'])
+    def write_session(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/session', methods=['GET'])
+    def read_session():
+        return session.get('value', '')
+
+    @app.route('/session', methods=['DELETE'])
+    def clear_session():
+        session.clear()
+        return ''
+
+    return app
+
+@pytest.fixture
+def writes(fake_redis, monkeypatch):
+    calls = []
+    original = fake_redis.set
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(fake_redis, 'set', counting)
+
+    return calls
+
+def test_session_is_stored_in_redis(app, fake_redis):
+    client = app.test_client()
+    client.post('/session/a')
+
+    assert client.get('/session').get_data(as_text=True) == 'a'
+    assert len(fake_redis.keys('session:*')) == 1
+
+def test_unchanged_session_is_not_written(app, writes):
+    client = app.test_client()
+    client.post('/session/a')
+    assert len(writes) == 1
+
+    client.get('/session')
+    client.post('/session/a')
+    assert len(writes) == 1
+
+    client.post('/session/b')
+    assert len(writes) == 2
+
+def test_expiry_is_extended_after_refresh_interval(app, writes):
+    client = app.test_client()
+    client.post('/session/a')
+
+    app.session_interface.refresh_interval = 0
+    client.get('/session')
+
+    assert len(writes) == 2
+
+def test_cleared_session_is_deleted(app, fake_redis):
+    client = app.test_client()
+    client.post('/session/a')
+    client.delete('/session')
+
+    assert fake_redis.keys('session:*') == []
+    assert client.get('/session').get_data(as_text=True) == ''
+
+def test_forged_cookie_starts_new_session(app, fake_redis):
+    client = app.test_client()
+    client.post('/session/a')
+    sid = fake_redis.keys('session:*')[0].decode('utf-8')[len('session:'):]
+
+    # 署名の無い (改ざんされた) Cookie では既存のセッションを読まない
+    client.set_cookie(app.config['SESSION_COOKIE_NAME'], sid)
+    assert client.get('/session').get_data(as_text=True) == ''
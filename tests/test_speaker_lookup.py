@@ -0,0 +1,85 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+from front_admin.models import speaker
+
+
+@pytest.fixture
+def requests(stubs, monkeypatch):
+    # 登壇者サービスへの要求 (パス, speaker_id の一覧) を記録する
+    original = stubs.speaker.handle
+    sent = []
+
+    def handle(request):
+        sent.append((request.path, request.args.getlist('speaker_id', type=int)))
+        return original(request)
+
+    monkeypatch.setattr(stubs.speaker, 'handle', handle)
+
+    return sent
+
+def lookup(app, speaker_ids):
+    with app.test_request_context():
+        return speaker.get_speakers_by_ids(speaker_ids, 'token')
+
+def test_bulk_lookup_uses_one_request(make_app, requests):
+    app = make_app(SPEAKER_BULK_LOOKUP=True)
+
+    speakers = lookup(app, [3, 1, None, 3, 99])
+
+    assert sorted(speakers) == [1, 3]
+    assert speakers[3]['speaker_name'] == 'speaker 3'
+    assert requests == [('/api/v1/speaker', [1, 3, 99])]
+
+def test_lookup_is_memoized_per_request(make_app, requests):
+    app = make_app(SPEAKER_BULK_LOOKUP=True)
+    with app.test_request_context():
+        speaker.get_speakers_by_ids([1, 2], 'token')
+        speakers = speaker.get_speakers_by_ids([2, 3], 'token')
+
+    assert sorted(speakers) == [2, 3]
+    assert requests == [('/api/v1/speaker', [1, 2]), ('/api/v1/speaker', [3])]
+
+def test_lookup_without_bulk_fetches_each_speaker(make_app, requests):
+    app = make_app(SPEAKER_BULK_LOOKUP=False)
+
+    assert sorted(lookup(app, [1, 2, 3])) == [1, 2, 3]
+    assert sorted(x[0] for x in requests) == ['/api/v1/speaker/1', '/api/v1/speaker/2', '/api/v1/speaker/3']
+
+def test_paginated_bulk_response_falls_back_for_remaining_ids(make_app, stubs, requests, monkeypatch):
+    app = make_app(SPEAKER_BULK_LOOKUP=True)
+    handle = stubs.speaker.handle
+
+    def paginated(request):
+        status, body = handle(request)
+        if request.path == '/api/v1/speaker':
+            return status, {'items': body[:1], 'next_cursor': '1'}
+        return status, body
+
+    monkeypatch.setattr(stubs.speaker, 'handle', paginated)
+
+    assert sorted(lookup(app, [1, 2, 3])) == [1, 2, 3]
+    assert requests[0] == ('/api/v1/speaker', [1, 2, 3])
+    assert sorted(x[0] for x in requests[1:]) == ['/api/v1/speaker/2', '/api/v1/speaker/3']
+
+@pytest.mark.parametrize('failure', [(500, {}), (200, {'unexpected': True})])
+def test_failed_bulk_lookup_falls_back_per_id(make_app, stubs, requests, monkeypatch, failure):
+    app = make_app(SPEAKER_BULK_LOOKUP=True)
+    handle = stubs.speaker.handle
+    monkeypatch.setattr(stubs.speaker, 'handle', lambda request: failure if request.path == '/api/v1/speaker' else handle(request))
+
+    assert sorted(lookup(app, [1, 2])) == [1, 2]
+    assert sorted(x[0] for x in requests) == ['/api/v1/speaker/1', '/api/v1/speaker/2']
@@ -0,0 +1,104 @@
+#   Copyright 2022 NEC Corporation
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+
+import pytest
+
+from flask import session
+
+from front_admin.models import token
+from front_admin.models.client import ConcurrencyLimitError, get_client
+
+
+@pytest.fixture
+def app(make_app):
+
+    return make_app()
+
+def expire_in(seconds):
+    # 更新の判定はセッションに保持した claims の exp で行う
+    session['id_token_claims'] = dict(session['id_token_claims'], exp=time.time() + seconds)
+
+def test_login_stores_verified_tokens(app):
+    with app.test_request_context():
+        assert token.login('alice', 'x') is not None
+        assert session['id_token_claims']['sub'] == 'alice'
+        assert token.get_valid_id_token() == session['id_token']
+
+def test_login_failure_returns_none(app, stubs, monkeypatch):
+    monkeypatch.setattr(stubs.keycloak, 'handle', lambda request: (401, {'error': 'invalid_grant'}))
+    with app.test_request_context():
+        assert token.login('alice', 'wrong') is None
+        assert 'id_token' not in session
+
+def test_token_is_refreshed_before_expiry(app, stubs):
+    with app.test_request_context():
+        token.login('alice', 'x')
+        expire_in(10)
+
+        calls = stubs.keycloak.calls
+        new = token.get_valid_id_token()
+
+        assert stubs.keycloak.calls == calls + 1
+        assert new == session['id_token']
+        assert session['id_token_claims']['exp'] > time.time() + 60
+
+def test_concurrent_refreshes_are_coalesced(app, stubs):
+    with app.test_request_context():
+        token.login('alice', 'x')
+        manager = token.get_token_manager()
+
+        calls = stubs.keycloak.calls
+        first = manager.refresh(session['refresh_token'])
+        second = manager.refresh(session['refresh_token'])
+
+        assert stubs.keycloak.calls == calls + 1
+        assert first is second
+
+def test_refresh_failure_keeps_token_within_leeway(app, stubs, monkeypatch):
+    with app.test_request_context():
+        token.login('alice', 'x')
+        id_token = session['id_token']
+        expire_in(-5)
+
+        monkeypatch.setattr(stubs.keycloak, 'handle', lambda request: (500, {}))
+        assert token.get_valid_id_token() == id_token
+
+def test_refresh_failure_after_expiry_clears_session(app, stubs, monkeypatch):
+    with app.test_request_context():
+        token.login('alice', 'x')
+        expire_in(-3600)
+
+        monkeypatch.setattr(stubs.keycloak, 'handle', lambda request: (500, {}))
+        assert token.get_valid_id_token() is None
+        assert 'id_token' not in session
+
+def test_busy_keycloak_does_not_log_out(app):
+    with app.test_request_context():
+        token.login('alice', 'x')
+        expire_in(-3600)
+
+        limiter = get_client('oidc').limiter
+        held = [limiter.acquire() for _ in range(limiter.limit)]
+        try:
+            with pytest.raises(ConcurrencyLimitError):
+                token.get_valid_id_token()
+        finally:
+            for x in held:
+                limiter.release(x)
+
+        # 混雑が解消すれば更新できる
+        assert 'id_token' in session
+        assert token.get_valid_id_token() == session['id_token']